@@ -11,28 +11,39 @@
 
 import streamlit as st
 import ezdxf
+import shapely
 from shapely.geometry import LineString, Polygon, Point
 from shapely import affinity
 from shapely.ops import polygonize
 import math
+import matplotlib
+matplotlib.use('Agg')  # 비대화형 백엔드 (서버 렌더링 전용)
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 import tempfile
 import os
 import io
 import base64
+import hashlib
+import pickle
+import shutil
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # 상수 임포트
 from constants import (
-    FABRIC_MAP, FABRIC_COLORS, DEFAULT_FABRIC_COLOR, DEFAULT_FABRIC_NAME,
-    SIZE_ORDER, SIZE_ORDER_LIST, MIN_PATTERN_AREA, BASE_SIZE_PREFIXES,
-    GRAINLINE_KEYWORDS, GRAINLINE_LAYER_NUMBERS, UNIT_SCALE_INCH_TO_MM,
+    FABRIC_MAP, FABRIC_MAP_UPPER, FABRIC_COLORS, DEFAULT_FABRIC_COLOR, DEFAULT_FABRIC_NAME,
+    SIZE_ORDER, SIZE_ORDER_LIST, MIN_PATTERN_AREA, BASE_SIZE_PREFIX_TUPLE,
+    GRAINLINE_KEYWORDS, GRAINLINE_LAYER_NUMBERS, UNIT_SCALE_INCH_TO_MM, UNIT_SCALE_INCH_TO_CM,
+    YARDS_PER_METER, FLATTEN_DISTANCE,
     get_fabric_color, size_sort_key, get_fabric_name
 )
 
 # 네스팅 엔진 임포트
-from nesting_engine import NestingEngine, create_nesting_visualization
+from nesting_engine import NestingEngine, Placement, create_nesting_visualization
 
 # 형상 시그니처 DB (수량 추천/학습)
 try:
@@ -49,12 +60,22 @@ except ImportError:
     SPARROW_AVAILABLE = False
 
 
+# 블록명 끝의 사이즈 접미사 (BLK_1_XS, 앞판_M 등)
+_BLOCK_SIZE_RE = re.compile(r'^([0-9]*X{1,2}L?|[SML]|XS|\d{2,3})$', re.IGNORECASE)
+_SCAN_SIZE_RE = re.compile(r'^([0-9]*X{1,3}L?|[SML]|XS|\d{2,3})$', re.IGNORECASE)  # 스캔 단계는 XXXL까지 허용
+_PAREN_RE = re.compile(r'\([^)]*\)')
+# 그레인라인 레이어 키워드 (부분 일치, 대문자 레이어명 대상)
+_GRAIN_RE = re.compile('|'.join(map(re.escape, GRAINLINE_KEYWORDS)))
+_HANGUL_RE = re.compile('[\uac00-\ud7a3]')  # 한글 음절 포함 여부
+# ANNOTATION에서 패턴명으로 쓰지 않는 원단 키워드 (대문자)
+_ANNOTATION_FABRIC_KEYWORDS = frozenset(['LINING', 'SHELL', 'INTERLINING', '안감', '겉감', '심지'])
+
+
 def extract_english_size(size_val):
     """
     사이즈 문자열에서 영문/숫자 부분만 추출
     예: "S축적용" → "S", "XL축적용" → "XL", "M축적용" → "M"
     """
-    import re
     if not size_val:
         return size_val
     # 앞부분의 영문/숫자만 추출 (0X, XL, S, M, L, 2XL, 85, 90 등)
@@ -64,6 +85,246 @@ def extract_english_size(size_val):
     return size_val
 
 
+# Sparrow 허용 회전각(0/90/180/270) → (cos, sin) 룩업 테이블
+_ROT_LUT = {0: (1.0, 0.0), 90: (0.0, 1.0), 180: (-1.0, 0.0), 270: (0.0, -1.0)}
+
+
+def _transform_sparrow_points(points, rotation, tx, ty):
+    """
+    Sparrow 배치 결과(회전 + 이동)를 좌표에 적용하고 시각화 좌표계로 교환합니다.
+    Sparrow 좌표계 (입력 교환 후): X=마카길이, Y=원단폭
+    출력시 다시 교환: X=원단폭, Y=마카길이
+
+    0°/180°는 회전 연산 없이 부호만 바꿔 이동합니다.
+
+    Returns:
+        (N, 2) ndarray
+    """
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    x, y = pts[:, 0], pts[:, 1]
+
+    if rotation == 0:
+        rx, ry = x, y
+    elif rotation == 180:
+        rx, ry = -x, -y
+    else:
+        # 90°/270°는 정확한 정수 계수 사용 (삼각함수 오차 없음)
+        lut = _ROT_LUT.get(rotation % 360)
+        if lut is not None:
+            cos_r, sin_r = lut
+        else:
+            cos_r = math.cos(math.radians(rotation))
+            sin_r = math.sin(math.radians(rotation))
+        # 회전 (원점 기준)
+        rx = x * cos_r - y * sin_r
+        ry = x * sin_r + y * cos_r
+
+    # 이동 후 좌표 교환: Sparrow(X=길이, Y=폭) → 시각화(X=폭, Y=길이)
+    return np.column_stack((ry + ty, rx + tx))
+
+
+def _prepare_pattern(p, buffer_cm, allow_mirror):
+    """
+    패턴 1개의 Sparrow 입력 형상 준비 (버퍼 적용 + 좌표 교환 + 미러링)
+
+    패턴 간 의존성이 없어 스레드 풀에서 병렬 실행됩니다 (GEOS buffer는 GIL 해제).
+
+    Returns:
+        (coords_variants, orig_variants, gl_variants) - 각각 (원본, 미러링) 2-튜플
+    """
+    coords = list(p['coords_cm'])
+    # 닫힌 폴리곤으로 변환
+    if coords[0] != coords[-1]:
+        coords = coords + [coords[0]]
+
+    # 원본 좌표 저장 (버퍼 적용 전)
+    original_coords = coords.copy()
+
+    # 패턴별 상하좌우 버퍼 (mm -> cm)
+    buf_top_cm = p.get('buffer_top', 0) / 10
+    buf_bottom_cm = p.get('buffer_bottom', 0) / 10
+    buf_left_cm = p.get('buffer_left', 0) / 10
+    buf_right_cm = p.get('buffer_right', 0) / 10
+    has_directional_buffer = (buf_top_cm > 0 or buf_bottom_cm > 0 or buf_left_cm > 0 or buf_right_cm > 0)
+
+    # 버퍼 적용 (패턴별 상하좌우 또는 전역 둘레 버퍼)
+    from shapely.geometry import Polygon as ShapelyPolygon
+    poly = ShapelyPolygon(coords)
+
+    if has_directional_buffer:
+        # 상하좌우 개별 버퍼 적용 (affine 변환 사용)
+        # 패턴을 상하좌우 방향으로 확장
+        from shapely import affinity
+
+        minx, miny, maxx, maxy = poly.bounds
+        width = maxx - minx
+        height = maxy - miny
+
+        if width > 0 and height > 0:
+            # 중심점 계산
+            cx = (minx + maxx) / 2
+            cy = (miny + maxy) / 2
+
+            # 확장 비율 계산 (버퍼를 포함한 새로운 크기)
+            new_width = width + buf_left_cm + buf_right_cm
+            new_height = height + buf_top_cm + buf_bottom_cm
+            scale_x = new_width / width
+            scale_y = new_height / height
+
+            # 스케일 적용 (중심 기준)
+            scaled_poly = affinity.scale(poly, xfact=scale_x, yfact=scale_y, origin=(cx, cy))
+
+            # 비대칭 버퍼 보정 (좌우/상하 버퍼가 다를 경우 이동)
+            offset_x = (buf_right_cm - buf_left_cm) / 2
+            offset_y = (buf_top_cm - buf_bottom_cm) / 2
+            buffered_poly = affinity.translate(scaled_poly, xoff=offset_x, yoff=offset_y)
+
+            if buffered_poly.is_valid and not buffered_poly.is_empty:
+                if buffered_poly.geom_type == 'Polygon':
+                    coords = list(buffered_poly.exterior.coords)
+                else:
+                    # MultiPolygon인 경우 가장 큰 폴리곤 사용
+                    largest = max(buffered_poly.geoms, key=lambda g: g.area)
+                    coords = list(largest.exterior.coords)
+    elif buffer_cm > 0:
+        # 전역 둘레 버퍼 (기존 방식)
+        buffered_poly = poly.buffer(buffer_cm, join_style=2)  # join_style=2: mitre (각진 모서리)
+        if buffered_poly.is_valid and not buffered_poly.is_empty:
+            coords = list(buffered_poly.exterior.coords)
+
+    # 좌표 변환: DXF(X=폭, Y=길이) → Sparrow(X=길이, Y=폭)
+    # 입력시 X와 Y를 교환하여 Sparrow가 올바르게 처리하도록 함
+    swapped_coords = [(y, x) for x, y in coords]
+    swapped_original = [(y, x) for x, y in original_coords]  # 원본도 변환
+
+    # 좌우 미러링된 좌표 생성 (Y축 반전) - 좌/우 패턴 짝 배치용
+    # Sparrow 좌표계: X=마카길이, Y=원단폭
+    # Y축 반전 = 원단폭 방향으로 뒤집기 = 좌우 마주보기
+    ys = [c[1] for c in swapped_coords]
+    center_y = (min(ys) + max(ys)) / 2
+    mirrored_coords = [(x, 2 * center_y - y) for x, y in swapped_coords]
+    mirrored_original = [(x, 2 * center_y - y) for x, y in swapped_original]  # 원본도 미러링
+
+    # 그레인라인 좌표 변환 (Sparrow 좌표계)
+    grainline_cm = p.get('grainline_cm')
+    swapped_grainline = None
+    mirrored_grainline = None
+    if grainline_cm:
+        gl_start, gl_end = grainline_cm
+        # DXF(X,Y) → Sparrow(Y,X) 좌표 교환
+        swapped_grainline = ((gl_start[1], gl_start[0]), (gl_end[1], gl_end[0]))
+        # 미러링된 그레인라인 (Y축 반전)
+        mirrored_grainline = (
+            (gl_start[1], 2 * center_y - gl_start[0]),
+            (gl_end[1], 2 * center_y - gl_end[0])
+        )
+
+    # 좌우 마주 보기 옵션 (180도 회전과 독립)
+    # 짝수 수량: 원본, 홀수 수량: 미러링 → q & 1로 인덱싱
+    if allow_mirror:
+        coords_variants = (swapped_coords, mirrored_coords)
+        orig_variants = (swapped_original, mirrored_original)
+        gl_variants = (swapped_grainline, mirrored_grainline)
+    else:
+        coords_variants = (swapped_coords,) * 2
+        orig_variants = (swapped_original,) * 2
+        gl_variants = (swapped_grainline,) * 2
+
+    return coords_variants, orig_variants, gl_variants
+
+
+def poly_coords_cm(poly):
+    """
+    폴리곤 외곽 좌표(mm, 닫는 점 제외)를 cm 튜플 리스트로 변환
+    shapely.get_coordinates로 한 번에 꺼내 NumPy로 나눕니다. (정점별 파이썬 루프 없음)
+    """
+    coords = shapely.get_coordinates(poly.exterior)[:-1] / 10
+    return list(map(tuple, coords.tolist()))
+
+
+def grainline_to_cm(grainline_info):
+    """그레인라인 ((x1, y1), (x2, y2)) mm 좌표를 cm로 변환 (없으면 None)"""
+    if not grainline_info:
+        return None
+    gl = np.asarray(grainline_info, dtype=np.float64) / 10
+    return (tuple(gl[0].tolist()), tuple(gl[1].tolist()))
+
+
+def nesting_columns(df):
+    """
+    네스팅 데이터 수집용 열(수량, 구분, 버퍼 상/하/좌/우 mm)을 파이썬 리스트로 반환
+    패턴 루프에서 df.loc[idx] 행 Series를 만들지 않고 위치 인덱스로 바로 읽기 위함 (버퍼 열이 없으면 0)
+    """
+    cols = {'수량': df['수량'].tolist(), '구분': df['구분'].tolist()}
+    for c in ("버퍼_상", "버퍼_하", "버퍼_좌", "버퍼_우"):
+        cols[c] = df[c].tolist() if c in df.columns else [0] * len(df)
+    return cols
+
+
+def get_base_pattern_data(patterns, df, fabric, all_sizes, selected_sizes):
+    """
+    재네스팅/자동 최적화용 원단별 패턴 데이터 (선택된 사이즈만, 벌수 적용 전)
+    각 항목: coords_cm, base_quantity(상세리스트 수량), pattern_id, area_cm2, grainline_cm,
+             buffer_top/bottom/left/right, size_name
+    patterns 리스트와 df 내용(행 해시)이 그대로면 (원단, 선택 사이즈)별로 세션에 저장된 목록을 재사용합니다.
+    (회전/미러링은 패턴 튜플을 새로 만들므로 객체 비교로 감지) 반환 목록은 읽기 전용으로 사용
+    """
+    # id()는 재사용될 수 있으므로 리스트 참조를 함께 저장해 객체 동일성(is)으로 비교
+    sig = (len(patterns), _hash_frame(df))
+    cache = st.session_state.get('_pat_cache')
+    if cache is None or cache['patterns'] is not patterns or cache['sig'] != sig:
+        cache = {'patterns': patterns, 'sig': sig, 'data': {}}
+        st.session_state._pat_cache = cache
+
+    key = (fabric, tuple(selected_sizes or ()))
+    hit = cache['data'].get(key)
+    if hit is not None and all(patterns[i] is ref for i, ref in hit[0]):
+        return hit[1]
+
+    fabric_indices = np.flatnonzero(
+        (df['원단'].to_numpy()[:len(patterns)] == fabric)
+        & selected_size_mask(get_pattern_arrays(patterns)['size'], all_sizes, selected_sizes)
+    ).tolist()
+
+    nest_cols = nesting_columns(df)
+    base_pattern_data = []
+    for idx in fabric_indices:
+        poly = patterns[idx][0]
+        size_name = patterns[idx][3]
+        base_id = str(nest_cols['구분'][idx])[:12] if nest_cols['구분'][idx] else f"P{idx+1}"
+        base_pattern_data.append({
+            'coords_cm': poly_coords_cm(poly),
+            'base_quantity': int(nest_cols['수량'][idx]),
+            'pattern_id': f"{base_id}\n{size_name[:4]}" if size_name else base_id,
+            'area_cm2': poly.area / 100,
+            'grainline_cm': grainline_to_cm(patterns[idx][7]),  # 그레인라인 좌표도 cm로 변환
+            # 패턴별 상하좌우 버퍼 (mm)
+            'buffer_top': nest_cols['버퍼_상'][idx],
+            'buffer_bottom': nest_cols['버퍼_하'][idx],
+            'buffer_left': nest_cols['버퍼_좌'][idx],
+            'buffer_right': nest_cols['버퍼_우'][idx],
+            'size_name': size_name,
+        })
+
+    cache['data'][key] = ([(i, patterns[i]) for i in fabric_indices], base_pattern_data)
+    return base_pattern_data
+
+
+def with_quantity(p, quantity):
+    """get_base_pattern_data 항목에 수량을 적용한 네스팅 입력 딕셔너리"""
+    return {
+        'coords_cm': p['coords_cm'],
+        'quantity': quantity,
+        'pattern_id': p['pattern_id'],
+        'area_cm2': p['area_cm2'],
+        'grainline_cm': p['grainline_cm'],
+        'buffer_top': p['buffer_top'],
+        'buffer_bottom': p['buffer_bottom'],
+        'buffer_left': p['buffer_left'],
+        'buffer_right': p['buffer_right']
+    }
+
+
 def run_sparrow_nesting(pattern_data, width_cm, time_limit, allow_rotation, spacing, allow_mirror=False, buffer_mm=0, allow_90_rotation=False, seed=42, pattern_order="default"):
     """
     Sparrow 네스팅 실행
@@ -104,95 +365,16 @@ def run_sparrow_nesting(pattern_data, width_cm, time_limit, allow_rotation, spac
     original_shapes = {}  # id -> 원본 좌표 (Sparrow 좌표계)
     grainline_data = {}  # id -> 그레인라인 좌표 (Sparrow 좌표계)
 
-    for p in sorted_pattern_data:
-        coords = list(p['coords_cm'])
-        # 닫힌 폴리곤으로 변환
-        if coords[0] != coords[-1]:
-            coords = coords + [coords[0]]
-
-        # 원본 좌표 저장 (버퍼 적용 전)
-        original_coords = coords.copy()
-
-        # 패턴별 상하좌우 버퍼 (mm -> cm)
-        buf_top_cm = p.get('buffer_top', 0) / 10
-        buf_bottom_cm = p.get('buffer_bottom', 0) / 10
-        buf_left_cm = p.get('buffer_left', 0) / 10
-        buf_right_cm = p.get('buffer_right', 0) / 10
-        has_directional_buffer = (buf_top_cm > 0 or buf_bottom_cm > 0 or buf_left_cm > 0 or buf_right_cm > 0)
-
-        # 버퍼 적용 (패턴별 상하좌우 또는 전역 둘레 버퍼)
-        from shapely.geometry import Polygon as ShapelyPolygon, box
-        from shapely.ops import unary_union
-        poly = ShapelyPolygon(coords)
-
-        if has_directional_buffer:
-            # 상하좌우 개별 버퍼 적용 (affine 변환 사용)
-            # 패턴을 상하좌우 방향으로 확장
-            from shapely import affinity
-
-            minx, miny, maxx, maxy = poly.bounds
-            width = maxx - minx
-            height = maxy - miny
-
-            if width > 0 and height > 0:
-                # 중심점 계산
-                cx = (minx + maxx) / 2
-                cy = (miny + maxy) / 2
-
-                # 확장 비율 계산 (버퍼를 포함한 새로운 크기)
-                new_width = width + buf_left_cm + buf_right_cm
-                new_height = height + buf_top_cm + buf_bottom_cm
-                scale_x = new_width / width
-                scale_y = new_height / height
-
-                # 스케일 적용 (중심 기준)
-                scaled_poly = affinity.scale(poly, xfact=scale_x, yfact=scale_y, origin=(cx, cy))
-
-                # 비대칭 버퍼 보정 (좌우/상하 버퍼가 다를 경우 이동)
-                offset_x = (buf_right_cm - buf_left_cm) / 2
-                offset_y = (buf_top_cm - buf_bottom_cm) / 2
-                buffered_poly = affinity.translate(scaled_poly, xoff=offset_x, yoff=offset_y)
-
-                if buffered_poly.is_valid and not buffered_poly.is_empty:
-                    if buffered_poly.geom_type == 'Polygon':
-                        coords = list(buffered_poly.exterior.coords)
-                    else:
-                        # MultiPolygon인 경우 가장 큰 폴리곤 사용
-                        largest = max(buffered_poly.geoms, key=lambda g: g.area)
-                        coords = list(largest.exterior.coords)
-        elif buffer_cm > 0:
-            # 전역 둘레 버퍼 (기존 방식)
-            buffered_poly = poly.buffer(buffer_cm, join_style=2)  # join_style=2: mitre (각진 모서리)
-            if buffered_poly.is_valid and not buffered_poly.is_empty:
-                coords = list(buffered_poly.exterior.coords)
-
-        # 좌표 변환: DXF(X=폭, Y=길이) → Sparrow(X=길이, Y=폭)
-        # 입력시 X와 Y를 교환하여 Sparrow가 올바르게 처리하도록 함
-        swapped_coords = [(y, x) for x, y in coords]
-        swapped_original = [(y, x) for x, y in original_coords]  # 원본도 변환
-
-        # 좌우 미러링된 좌표 생성 (Y축 반전) - 좌/우 패턴 짝 배치용
-        # Sparrow 좌표계: X=마카길이, Y=원단폭
-        # Y축 반전 = 원단폭 방향으로 뒤집기 = 좌우 마주보기
-        ys = [c[1] for c in swapped_coords]
-        center_y = (min(ys) + max(ys)) / 2
-        mirrored_coords = [(x, 2 * center_y - y) for x, y in swapped_coords]
-        mirrored_original = [(x, 2 * center_y - y) for x, y in swapped_original]  # 원본도 미러링
-
-        # 그레인라인 좌표 변환 (Sparrow 좌표계)
-        grainline_cm = p.get('grainline_cm')
-        swapped_grainline = None
-        mirrored_grainline = None
-        if grainline_cm:
-            gl_start, gl_end = grainline_cm
-            # DXF(X,Y) → Sparrow(Y,X) 좌표 교환
-            swapped_grainline = ((gl_start[1], gl_start[0]), (gl_end[1], gl_end[0]))
-            # 미러링된 그레인라인 (Y축 반전)
-            mirrored_grainline = (
-                (gl_start[1], 2 * center_y - gl_start[0]),
-                (gl_end[1], 2 * center_y - gl_end[0])
-            )
+    # 패턴별 형상 준비 (버퍼/교환/미러링) - 패턴 수가 적으면 스레드 오버헤드가 더 큼
+    prepare = partial(_prepare_pattern, buffer_cm=buffer_cm, allow_mirror=allow_mirror)
+    if len(sorted_pattern_data) < 4:
+        prepared = [prepare(p) for p in sorted_pattern_data]
+    else:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            prepared = list(pool.map(prepare, sorted_pattern_data))
 
+    # 아이템 ID는 입력 순서대로 부여 (순차 처리)
+    for p, (coords_variants, orig_variants, gl_variants) in zip(sorted_pattern_data, prepared):
         # 수량만큼 아이템 생성
         for q in range(p['quantity']):
             unique_id = f"{p['pattern_id']}_{item_idx}"
@@ -204,15 +386,10 @@ def run_sparrow_nesting(pattern_data, width_cm, time_limit, allow_rotation, spac
             if allow_90_rotation:
                 orientations.extend([90, 270])
 
-            # 좌우 마주 보기 옵션 (180도 회전과 독립)
-            if allow_mirror:
-                use_coords = mirrored_coords if (q % 2 == 1) else swapped_coords
-                use_original = mirrored_original if (q % 2 == 1) else swapped_original
-                use_grainline = mirrored_grainline if (q % 2 == 1) else swapped_grainline
-            else:
-                use_coords = swapped_coords
-                use_original = swapped_original
-                use_grainline = swapped_grainline
+            variant = q & 1
+            use_coords = coords_variants[variant]
+            use_original = orig_variants[variant]
+            use_grainline = gl_variants[variant]
 
             # 원본 좌표 저장
             original_shapes[unique_id] = use_original
@@ -269,69 +446,30 @@ def run_sparrow_nesting(pattern_data, width_cm, time_limit, allow_rotation, spac
             rotation = 0
             # 180도 회전 취소를 위해 translation 보정
             # 패턴 중심 기준으로 180도 역회전 필요
-            xs = [c[0] for c in buffered_shape]
-            ys = [c[1] for c in buffered_shape]
-            cx = (min(xs) + max(xs)) / 2
-            cy = (min(ys) + max(ys)) / 2
+            arr = np.asarray(buffered_shape, dtype=np.float64).reshape(-1, 2)
+            cx, cy = (arr.min(axis=0) + arr.max(axis=0)) * 0.5
             # 원래 회전 중심에서의 오프셋 계산 후 역보정
             tx = tx + 2 * cx
             ty = ty + 2 * cy
 
-        # 회전 및 이동 적용하여 최종 좌표 계산
-        # Sparrow 좌표계 (입력 교환 후): X=마카길이, Y=원단폭
-        # 출력시 다시 교환: X=원단폭, Y=마카길이
-        cos_r = math.cos(math.radians(rotation))
-        sin_r = math.sin(math.radians(rotation))
-
-        # 버퍼 적용된 좌표 변환
-        transformed_coords = []
-        for x, y in buffered_shape:
-            # 회전 (원점 기준)
-            rx = x * cos_r - y * sin_r
-            ry = x * sin_r + y * cos_r
-            # 이동
-            px = rx + tx
-            py = ry + ty
-            # 좌표 교환: Sparrow(X=길이, Y=폭) → 시각화(X=폭, Y=길이)
-            transformed_coords.append((py, px))
-
-        # 원본 좌표 변환 (버퍼 전)
-        original_transformed = []
-        for x, y in original_shape:
-            # 회전 (원점 기준)
-            rx = x * cos_r - y * sin_r
-            ry = x * sin_r + y * cos_r
-            # 이동
-            px = rx + tx
-            py = ry + ty
-            # 좌표 교환: Sparrow(X=길이, Y=폭) → 시각화(X=폭, Y=길이)
-            original_transformed.append((py, px))
+        # 회전 및 이동 적용하여 최종 좌표 계산 (버퍼 적용 좌표 / 원본 좌표)
+        transformed_coords = _transform_sparrow_points(buffered_shape, rotation, tx, ty)
+        original_transformed = _transform_sparrow_points(original_shape, rotation, tx, ty)
 
         # 그레인라인 좌표 변환
         grainline_transformed = None
         if placed.id in grainline_data:
-            gl_start, gl_end = grainline_data[placed.id]
-            transformed_gl = []
-            for x, y in [gl_start, gl_end]:
-                # 회전 (원점 기준)
-                rx = x * cos_r - y * sin_r
-                ry = x * sin_r + y * cos_r
-                # 이동
-                px = rx + tx
-                py = ry + ty
-                # 좌표 교환: Sparrow(X=길이, Y=폭) → 시각화(X=폭, Y=길이)
-                transformed_gl.append((py, px))
-            grainline_transformed = (transformed_gl[0], transformed_gl[1])
-
-        placements.append({
-            'pattern_id': placed.id,
-            'x': ty,  # Sparrow Y → 시각화 X (폭 방향)
-            'y': tx,  # Sparrow X → 시각화 Y (길이 방향)
-            'rotation': rotation,
-            'coords': transformed_coords,  # 버퍼 적용된 좌표
-            'original_coords': original_transformed,  # 원본 좌표 (버퍼 전)
-            'grainline': grainline_transformed  # 그레인라인 좌표
-        })
+            grainline_transformed = _transform_sparrow_points(grainline_data[placed.id], rotation, tx, ty)
+
+        placements.append(Placement(
+            pattern_id=placed.id,
+            x=ty,  # Sparrow Y → 시각화 X (폭 방향)
+            y=tx,  # Sparrow X → 시각화 Y (길이 방향)
+            rotation=rotation,
+            coords=transformed_coords,  # 버퍼 적용된 좌표
+            original_coords=original_transformed,  # 원본 좌표 (버퍼 전)
+            grainline=grainline_transformed  # 그레인라인 좌표
+        ))
 
     return {
         'success': True,
@@ -340,7 +478,7 @@ def run_sparrow_nesting(pattern_data, width_cm, time_limit, allow_rotation, spac
         'used_length': used_length_cm * 10,  # cm -> mm (호환성)
         'used_length_mm': used_length_cm * 10,  # mm (시각화용)
         'used_length_cm': used_length_cm,
-        'used_length_yd': used_length_cm / 100 * 1.09361,
+        'used_length_yd': used_length_cm / 100 * YARDS_PER_METER,
         'efficiency': round(efficiency, 1),
         'placements': placements,
         'sparrow_mode': True,
@@ -348,27 +486,55 @@ def run_sparrow_nesting(pattern_data, width_cm, time_limit, allow_rotation, spac
     }
 
 
-def create_sparrow_visualization(result, sheet_width_cm):
-    """Sparrow 네스팅 결과 시각화"""
-    import matplotlib.pyplot as plt
-    import matplotlib.patches as patches
-    from matplotlib.path import Path
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_sparrow(pattern_digest, width_cm, time_limit, allow_rotation, spacing, allow_mirror, buffer_mm,
+                    allow_90_rotation, seed, pattern_order, _pattern_data):
+    """
+    run_sparrow_nesting 결과 캐시 (패턴 digest + 파라미터 기준)
+    _pattern_data는 해시 대상에서 제외 (pattern_digest로 대체)
+    """
+    return run_sparrow_nesting(_pattern_data, width_cm, time_limit, allow_rotation, spacing,
+                               allow_mirror, buffer_mm, allow_90_rotation, seed, pattern_order)
+
+
+def run_sparrow_nesting_cached(pattern_data, width_cm, time_limit, allow_rotation, spacing, allow_mirror=False, buffer_mm=0, allow_90_rotation=False, seed=42, pattern_order="default"):
+    """
+    캐시를 거치는 Sparrow 네스팅 실행
+    입력이 동일하면 Streamlit 리런 시 솔버를 다시 돌리지 않고 캐시된 결과를 반환합니다.
+    (결과 딕셔너리만 캐시 - Matplotlib Figure는 캐시하지 않음)
+    """
+    pattern_digest = hashlib.blake2b(pickle.dumps(pattern_data, protocol=5), digest_size=16).hexdigest()
+    return _cached_sparrow(pattern_digest, width_cm, time_limit, allow_rotation, spacing, allow_mirror,
+                           buffer_mm, allow_90_rotation, seed, pattern_order, pattern_data)
+
+
+@st.cache_resource(show_spinner=False)
+def _pick_korean_font():
+    """한글 폰트 선택 (크로스 플랫폼) - 리런마다 폰트 목록을 다시 훑지 않도록 프로세스당 1회만 실행"""
     import matplotlib.font_manager as fm
     import platform
 
-    # 한글 폰트 설정 (크로스 플랫폼)
     if platform.system() == 'Windows':
-        plt.rcParams['font.family'] = 'Malgun Gothic'
-    else:
-        # Linux: NanumGothic 우선, 없으면 DejaVu Sans
-        available_fonts = [f.name for f in fm.fontManager.ttflist]
-        if 'NanumGothic' in available_fonts:
-            plt.rcParams['font.family'] = 'NanumGothic'
-        elif 'Nanum Gothic' in available_fonts:
-            plt.rcParams['font.family'] = 'Nanum Gothic'
-        else:
-            plt.rcParams['font.family'] = 'DejaVu Sans'
-    plt.rcParams['axes.unicode_minus'] = False
+        return 'Malgun Gothic'
+    # Linux: NanumGothic 우선, 없으면 DejaVu Sans
+    available_fonts = {f.name for f in fm.fontManager.ttflist}
+    if 'NanumGothic' in available_fonts:
+        return 'NanumGothic'
+    elif 'Nanum Gothic' in available_fonts:
+        return 'Nanum Gothic'
+    return 'DejaVu Sans'
+
+
+_KOREAN_FONT = _pick_korean_font()
+plt.rcParams['font.family'] = _KOREAN_FONT
+plt.rcParams['axes.unicode_minus'] = False
+
+
+def create_sparrow_visualization(result, sheet_width_cm, selected_sizes=None):
+    """Sparrow 네스팅 결과 시각화 (selected_sizes 미지정 시 세션 상태에서 조회)"""
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as patches
+    from matplotlib.path import Path
 
     if not result.get('success'):
         return None
@@ -391,8 +557,9 @@ def create_sparrow_visualization(result, sheet_width_cm):
     colors = plt.cm.Set3(range(12))
 
     # 사이즈 개수 확인
-    all_sizes = st.session_state.get('all_sizes', [])
-    selected_sizes = st.session_state.get('selected_sizes', all_sizes)
+    if selected_sizes is None:
+        all_sizes = st.session_state.get('all_sizes', [])
+        selected_sizes = st.session_state.get('selected_sizes', all_sizes)
     has_multiple_sizes = len(selected_sizes) >= 2
 
     if has_multiple_sizes:
@@ -404,23 +571,23 @@ def create_sparrow_visualization(result, sheet_width_cm):
             size_color_map[size[:4]] = colors[i % len(colors)]  # 잘린 버전도 매핑
     else:
         # 사이즈 1개: 같은 패턴은 같은 색상
-        unique_patterns = list(set(p['pattern_id'].split('\n')[0] for p in result['placements']))
+        unique_patterns = list(set(p.pattern_id.split('\n')[0] for p in result['placements']))
         pattern_color_map = {name: colors[i % len(colors)] for i, name in enumerate(unique_patterns)}
 
     # 패턴 그리기
     for i, p in enumerate(result['placements']):
-        coords = p['coords']  # 버퍼 적용된 좌표
-        original_coords = p.get('original_coords', [])  # 원본 좌표
+        coords = p.coords  # 버퍼 적용된 좌표 (N, 2)
+        original_coords = p.original_coords  # 원본 좌표 (N, 2)
 
-        if coords:
+        if len(coords):
             # coords는 이미 배치된 좌표
-            xs = [c[0] for c in coords]
-            ys = [c[1] for c in coords]
+            xs = coords[:, 0]
+            ys = coords[:, 1]
 
             # 색상 결정
             if has_multiple_sizes:
                 # 사이즈별 색상 (pattern_id 형식: "패턴명\n사이즈_인덱스")
-                parts = p['pattern_id'].split('\n')
+                parts = p.pattern_id.split('\n')
                 if len(parts) > 1:
                     # "사이즈_인덱스"에서 사이즈만 추출 (마지막 _인덱스 제거)
                     size_with_idx = parts[1].strip()
@@ -431,24 +598,24 @@ def create_sparrow_visualization(result, sheet_width_cm):
                 color = size_color_map.get(size_part, colors[i % len(colors)])
             else:
                 # 패턴별 색상
-                pattern_name = p['pattern_id'].split('\n')[0]
+                pattern_name = p.pattern_id.split('\n')[0]
                 color = pattern_color_map.get(pattern_name, colors[0])
 
             # 버퍼 적용 여부 확인 (원본 좌표가 있고 버퍼 좌표와 다르면 버퍼 적용됨)
-            has_buffer = original_coords and coords != original_coords
+            has_buffer = len(original_coords) > 0 and not np.array_equal(coords, original_coords)
 
             # 버퍼가 있으면 버퍼 영역(실선 테두리) + 원본 패턴(진한 색) 표시
             if has_buffer:
                 # 버퍼 영역 (실선 테두리, 연한 배경)
-                ax.fill(xs, ys, alpha=0.2, facecolor=color, edgecolor='#333333', linewidth=1.0, linestyle='-')
+                ax.fill(xs, ys, alpha=0.2, facecolor=color, edgecolor='#333333', linewidth=1.0, linestyle='-', rasterized=True)
 
                 # 원본 패턴 (진한 색, 실선 테두리)
-                orig_xs = [c[0] for c in original_coords]
-                orig_ys = [c[1] for c in original_coords]
-                ax.fill(orig_xs, orig_ys, alpha=0.7, facecolor=color, edgecolor='black', linewidth=0.5)
+                orig_xs = original_coords[:, 0]
+                orig_ys = original_coords[:, 1]
+                ax.fill(orig_xs, orig_ys, alpha=0.7, facecolor=color, edgecolor='black', linewidth=0.5, rasterized=True)
             else:
                 # 버퍼 없으면 기존대로 표시
-                ax.fill(xs, ys, alpha=0.7, facecolor=color, edgecolor='black', linewidth=0.5)
+                ax.fill(xs, ys, alpha=0.7, facecolor=color, edgecolor='black', linewidth=0.5, rasterized=True)
 
             # 패턴 ID 표시 (중심점 계산 - Shapely centroid 사용)
             from shapely.geometry import Polygon as ShapelyPoly
@@ -457,11 +624,10 @@ def create_sparrow_visualization(result, sheet_width_cm):
                 centroid = poly_shape.centroid
                 cx, cy = centroid.x, centroid.y
             except:
-                cx = sum(xs) / len(xs)
-                cy = sum(ys) / len(ys)
+                cx, cy = coords.mean(axis=0)
             # 패턴ID에서 패턴이름 + 사이즈 표시
             # pattern_id 형식: "인덱스:패턴이름\n사이즈_수량인덱스"
-            raw_id = p['pattern_id']
+            raw_id = p.pattern_id
             parts = raw_id.split('\n')
             # 첫 번째 줄에서 "인덱스:" 제거하고 패턴이름 추출
             first_line = parts[0]
@@ -480,8 +646,8 @@ def create_sparrow_visualization(result, sheet_width_cm):
             ax.text(cx, cy, label, ha='center', va='center', fontsize=4, fontweight='bold')
 
             # 그레인라인 표시 (검정 실선, 크기 50%)
-            grainline = p.get('grainline')
-            if grainline:
+            grainline = p.grainline
+            if grainline is not None:
                 gl_start, gl_end = grainline
                 # 그레인라인 크기를 50%로 축소 (중심점 기준)
                 cx_gl = (gl_start[0] + gl_end[0]) / 2
@@ -507,6 +673,29 @@ def create_sparrow_visualization(result, sheet_width_cm):
     plt.tight_layout()
     return fig
 
+
+def _placements_digest(result, sheet_width_cm):
+    """배치 결과 다이제스트 (패턴 ID + 회전 + 좌표 bbox) - PNG 캐시 키"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((sheet_width_cm, result.get('used_length_cm'))).encode())
+    for p in result.get('placements', []):
+        mn = p.coords.min(axis=0) if len(p.coords) else (0.0, 0.0)
+        mx = p.coords.max(axis=0) if len(p.coords) else (0.0, 0.0)
+        h.update(repr((p.pattern_id, p.rotation, tuple(mn), tuple(mx))).encode())
+    return h.hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _render_png(digest, _result, sheet_width_cm, sizes_tuple):
+    """Sparrow 시각화를 PNG 바이트로 렌더링 (다이제스트가 같으면 리런 시 Matplotlib 작업 생략)"""
+    fig = create_sparrow_visualization(_result, sheet_width_cm, selected_sizes=list(sizes_tuple))
+    if fig is None:
+        return None
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=110)
+    plt.close(fig)
+    return buf.getvalue()
+
 # ==============================================================================
 # 1. 페이지 및 스타일 설정 (Configuration & CSS)
 # ==============================================================================
@@ -704,6 +893,98 @@ except: pass
 # 2. 헬퍼 함수 및 유틸리티 (Helpers)
 # ==============================================================================
 
+def _render_one(fabric, result, width_cm, sizes):
+    """
+    원단 1개의 엑셀용 마카 이미지 렌더링 (dpi=75, 90도 시계방향 회전)
+    세션 상태를 읽지 않는 순수 함수
+
+    Returns:
+        (fabric, png_bytes, width_px, height_px) - 렌더링 실패 시 png_bytes=None
+    """
+    if result.get('sparrow_mode'):
+        fig = create_sparrow_visualization(result, width_cm, selected_sizes=list(sizes))
+    else:
+        fig = create_nesting_visualization(result, width_cm)
+    if not fig:
+        return fabric, None, 0, 0
+
+    img_buffer = io.BytesIO()
+    # dpi=75 + tight bbox 생략 (이중 렌더링 방지) - 폭 12인치 Figure 기준 900px로 600px 표시에 충분
+    # 회전용 중간 PNG는 압축하지 않음 (compress_level=0)
+    fig.savefig(img_buffer, format='png', dpi=75, facecolor='white', edgecolor='none',
+                pil_kwargs={'compress_level': 0})
+    img_buffer.seek(0)
+    plt.close(fig)
+
+    # 이미지 90도 시계방향 회전 (PIL 사용)
+    from PIL import Image as PILImage
+    rotated_img = PILImage.open(img_buffer).rotate(-90, expand=True)
+    rotated_buffer = io.BytesIO()
+    rotated_img.save(rotated_buffer, format='PNG')
+
+    width_px, height_px = rotated_img.size
+    return fabric, rotated_buffer.getvalue(), width_px, height_px
+
+
+# 엑셀용 마카 이미지 세션 캐시 최대 개수 (원단 x 배치 결과)
+NESTING_PNG_CACHE_MAX = 16
+
+
+def _render_fabric_pngs(nesting_results, fabric_list):
+    """
+    원단별 엑셀용 마카 이미지 일괄 렌더링
+    배치 결과 지문(패턴 ID/위치/회전 + 원단폭 + 모드)으로 세션 캐시하여 재내보내기 시 재렌더링 생략
+    캐시에 없는 원단만 순차 렌더링 (멀티스레드 서버에서 fork 시 멈출 수 있어 프로세스 풀 사용 안 함)
+    원단별로 예외를 잡아 한 원단이 실패해도 나머지 원단 이미지는 유지합니다.
+
+    Returns:
+        ({fabric: (png_bytes, width_px, height_px)}, {fabric: 예외}) - 실패한 원단은 두 번째 딕셔너리에만 포함
+    """
+    if 'nesting_png_cache' not in st.session_state:
+        st.session_state.nesting_png_cache = {}
+    cache = st.session_state.nesting_png_cache
+
+    # Sparrow 시각화는 선택 사이즈에 따라 색상이 달라짐
+    sizes = tuple(st.session_state.get('selected_sizes', st.session_state.get('all_sizes', [])))
+
+    keys = {}
+    jobs = []
+    for fabric in fabric_list:
+        result = nesting_results[fabric]
+        width_cm = result.get('width_cm', 150)
+        sparrow_mode = result.get('sparrow_mode', False)
+        if sparrow_mode:
+            placement_key = tuple((p.pattern_id, p.x, p.y, p.rotation) for p in result['placements'])
+            sizes_key = sizes
+        else:
+            placement_key = tuple((p['id'], p['x'], p['y'], p['rotation']) for p in result['placements'])
+            sizes_key = ()
+        keys[fabric] = hashlib.blake2b(
+            pickle.dumps((width_cm, sparrow_mode, placement_key, sizes_key)), digest_size=16
+        ).digest()
+        if keys[fabric] not in cache:
+            jobs.append((fabric, result, width_cm, sizes))
+
+    # 세션당 캐시 크기 제한: 오래된 배치 결과부터 제거 (현재 원단 항목은 유지)
+    overflow = len(cache) + len(jobs) - NESTING_PNG_CACHE_MAX
+    if overflow > 0:
+        current = set(keys.values())
+        for old_key in [k for k in cache if k not in current][:overflow]:
+            del cache[old_key]
+
+    errors = {}
+    for job in jobs:
+        try:
+            fabric, png_bytes, width_px, height_px = _render_one(*job)
+        except Exception as e:
+            errors[job[0]] = e
+            continue
+        if png_bytes:
+            cache[keys[fabric]] = (png_bytes, width_px, height_px)
+
+    return {f: cache[keys[f]] for f in fabric_list if keys[f] in cache}, errors
+
+
 def export_nesting_to_excel(nesting_results, timestamp, style_no=None, selected_sizes=None, base_size=None):
     """네스팅 결과를 엑셀로 내보내기 (한 시트에 모든 데이터 순서대로)
 
@@ -715,185 +996,197 @@ def export_nesting_to_excel(nesting_results, timestamp, style_no=None, selected_
         base_size: 기준사이즈
     """
     from io import BytesIO
-    import pandas as pd
-    from openpyxl import Workbook
-    from openpyxl.drawing.image import Image as XLImage
-    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-    from openpyxl.utils.dataframe import dataframe_to_rows
-    import matplotlib.pyplot as plt
+    import xlsxwriter
 
     output = BytesIO()
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "네스팅결과"
-
-    # 스타일 정의
-    header_font = Font(bold=True, size=12)
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font_white = Font(bold=True, size=12, color="FFFFFF")
-    section_font = Font(bold=True, size=14)
-    title_font = Font(bold=True, size=16)
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    wb = xlsxwriter.Workbook(output, {'in_memory': True})
+    ws = wb.add_worksheet("네스팅결과")
+
+    # 스타일 정의 (서식 객체는 1회 생성 후 재사용)
+    header_fmt = wb.add_format({'bold': True, 'font_size': 12})
+    header_white_fmt = wb.add_format({'bold': True, 'font_size': 12, 'font_color': 'white',
+                                      'bg_color': '#4472C4', 'border': 1, 'align': 'center'})
+    section_fmt = wb.add_format({'bold': True, 'font_size': 14})
+    title_fmt = wb.add_format({'bold': True, 'font_size': 16})
+    fabric_fmt = wb.add_format({'bold': True, 'font_size': 11})
+    cell_fmt = wb.add_format({'border': 1, 'align': 'center'})
 
-    current_row = 1
+    # 열 너비 조정
+    ws.set_column(0, 0, 15)
+    ws.set_column(1, 2, 12)
+    ws.set_column(3, 4, 14)
+    ws.set_column(5, 5, 12)
+    ws.set_column(6, 6, 10)
+    ws.set_column(7, 7, 18)
+
+    current_row = 0  # xlsxwriter는 0-based 행 인덱스
 
     # === 0. 제목 정보 섹션 ===
     # 제목은 항상 표시
-    ws.cell(row=current_row, column=1, value="📐 스마트 의류 요척(자동마카) 산출서").font = title_font
+    ws.write(current_row, 0, "📐 스마트 의류 요척(자동마카) 산출서", title_fmt)
     current_row += 1
 
     # 스타일번호 표시
     if style_no and style_no.strip():
-        ws.cell(row=current_row, column=1, value=f"스타일번호: {style_no}").font = header_font
+        ws.write(current_row, 0, f"스타일번호: {style_no}", header_fmt)
         current_row += 1
 
     # 선택 사이즈 표시
     if selected_sizes and len(selected_sizes) > 0:
         size_display = ', '.join(selected_sizes)
         base_display = f" (기준: {base_size})" if base_size else ""
-        ws.cell(row=current_row, column=1, value=f"선택 사이즈: {size_display}{base_display}").font = header_font
+        ws.write(current_row, 0, f"선택 사이즈: {size_display}{base_display}", header_fmt)
         current_row += 1
 
     current_row += 1  # 빈 줄 추가
 
     # === 1. 마카 요약 섹션 ===
-    ws.cell(row=current_row, column=1, value="■ 마카 요약").font = section_font
+    ws.write(current_row, 0, "■ 마카 요약", section_fmt)
     current_row += 1
 
     summary_headers = ['원단', '벌수', '패턴수', '원단폭(cm)', '마카길이(cm)', '요척(YD)', '효율(%)', '작업일시']
-    for col, header in enumerate(summary_headers, 1):
-        cell = ws.cell(row=current_row, column=col, value=header)
-        cell.font = header_font_white
-        cell.fill = header_fill
-        cell.border = thin_border
-        cell.alignment = Alignment(horizontal='center')
+    ws.write_row(current_row, 0, summary_headers, header_white_fmt)
     current_row += 1
 
-    for fabric, result in nesting_results.items():
-        if result.get('success'):
-            # 벌수 계산: 사이즈별 벌수 합계 또는 단일 벌수
-            size_quantities = result.get('size_quantities', {})
-            has_multiple_sizes = result.get('has_multiple_sizes', False)
-            if has_multiple_sizes and size_quantities and selected_sizes:
-                marker_qty = sum(size_quantities.get(s, 1) for s in selected_sizes if size_quantities.get(s, 1) > 0)
-            else:
-                marker_qty = result.get('marker_quantity', 1)
-
-            yield_per_set = result.get('used_length_yd', 0) / marker_qty if marker_qty > 0 else result.get('used_length_yd', 0)
-            row_data = [
-                fabric,
-                marker_qty,
-                f"{result.get('placed_count', 0)}/{result.get('total_count', 0)}",
-                result.get('width_cm', 0),
-                round(result.get('used_length_cm', 0), 1),
-                round(yield_per_set, 2),
-                result.get('efficiency', 0),
-                timestamp
-            ]
-            for col, value in enumerate(row_data, 1):
-                cell = ws.cell(row=current_row, column=col, value=value)
-                cell.border = thin_border
-                cell.alignment = Alignment(horizontal='center')
+    def _marker_qty(result):
+        # 벌수 계산: 사이즈별 벌수 합계 또는 단일 벌수
+        size_quantities = result.get('size_quantities', {})
+        if result.get('has_multiple_sizes', False) and size_quantities and selected_sizes:
+            return sum(size_quantities.get(s, 1) for s in selected_sizes if size_quantities.get(s, 1) > 0)
+        return result.get('marker_quantity', 1)
+
+    summary_df = pd.DataFrame([{
+        '원단': fabric,
+        '벌수': _marker_qty(result),
+        '패턴수': f"{result.get('placed_count', 0)}/{result.get('total_count', 0)}",
+        '원단폭(cm)': result.get('width_cm', 0),
+        '마카길이(cm)': round(result.get('used_length_cm', 0), 1),
+        'used_length_yd': result.get('used_length_yd', 0),
+        '효율(%)': result.get('efficiency', 0),
+    } for fabric, result in nesting_results.items() if result.get('success')],
+        columns=['원단', '벌수', '패턴수', '원단폭(cm)', '마카길이(cm)', 'used_length_yd', '효율(%)'])
+
+    if not summary_df.empty:
+        # 요척 = 마카길이(YD) / 벌수 (벌수 0 이하이면 마카길이 그대로)
+        qty = summary_df['벌수']
+        summary_df.insert(5, '요척(YD)', summary_df['used_length_yd'].where(qty <= 0, summary_df['used_length_yd'] / qty).round(2))
+        summary_df = summary_df.drop(columns='used_length_yd')
+        summary_df['작업일시'] = timestamp
+        for row_data in summary_df.values.tolist():
+            ws.write_row(current_row, 0, row_data, cell_fmt)
             current_row += 1
 
     current_row += 2  # 빈 줄 추가
 
     # === 2. 원단별 마카 이미지 (1열 배치, 90도 회전) ===
-    ws.cell(row=current_row, column=1, value="■ 마카 이미지").font = section_font
+    ws.write(current_row, 0, "■ 마카 이미지", section_fmt)
     current_row += 1
 
     fabric_list = [f for f, r in nesting_results.items() if r.get('success')]
 
+    # 원단별 마카 이미지 렌더링 (세션 캐시 + 캐시에 없는 원단만 순차 렌더링, 실패는 원단별로 표시)
+    rendered, render_errors = _render_fabric_pngs(nesting_results, fabric_list)
+
     # 1개씩 배치 (90도 회전)
     for fabric in fabric_list:
-        result = nesting_results[fabric]
-        ws.cell(row=current_row, column=1, value=f"▷ {fabric}").font = Font(bold=True, size=11)
+        ws.write(current_row, 0, f"▷ {fabric}", fabric_fmt)
         current_row += 1
 
-        try:
-            width_cm = result.get('width_cm', 150)
-            if result.get('sparrow_mode'):
-                fig = create_sparrow_visualization(result, width_cm)
-            else:
-                fig = create_nesting_visualization(result, width_cm)
-
-            if fig:
-                img_buffer = BytesIO()
-                fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight',
-                           facecolor='white', edgecolor='none')
-                img_buffer.seek(0)
-                plt.close(fig)
-
-                # 이미지 90도 시계방향 회전 (PIL 사용)
-                from PIL import Image as PILImage
-                pil_img = PILImage.open(img_buffer)
-                rotated_img = pil_img.rotate(-90, expand=True)
-                rotated_buffer = BytesIO()
-                rotated_img.save(rotated_buffer, format='PNG')
-                rotated_buffer.seek(0)
-
-                img = XLImage(rotated_buffer)
-                orig_width = img.width
-                orig_height = img.height
-                # 세로로 배치되므로 높이 기준으로 크기 조정
-                if orig_height > 0:
-                    target_height = 600  # 세로 크기
-                    img.height = target_height
-                    img.width = int(orig_width * (target_height / orig_height))
-
-                ws.add_image(img, f'A{current_row}')
-                img_rows = int(img.height / 15) + 2
-        except Exception as e:
-            ws.cell(row=current_row, column=1, value=f"오류: {e}")
-            img_rows = 3
+        img_rows = 3
+        if fabric in rendered:
+            png_bytes, orig_width, orig_height = rendered[fabric]
+            # 세로로 배치되므로 높이 기준으로 크기 조정
+            target_height = 600  # 세로 크기
+            scale = target_height / orig_height if orig_height > 0 else 1.0
+            ws.insert_image(current_row, 0, f"marker_{fabric}.png", {
+                'image_data': BytesIO(png_bytes),
+                'x_scale': scale,
+                'y_scale': scale
+            })
+            img_rows = int(orig_height * scale / 15) + 2
+        elif fabric in render_errors:
+            ws.write(current_row, 0, f"오류: {render_errors[fabric]}")
 
         # 마카 이미지 아래로 이동 (간격 1칸)
         current_row += max(img_rows, 10) + 1
 
-    # 열 너비 조정
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 12
-    ws.column_dimensions['C'].width = 12
-    ws.column_dimensions['D'].width = 14
-    ws.column_dimensions['E'].width = 14
-    ws.column_dimensions['F'].width = 12
-    ws.column_dimensions['G'].width = 10
-    ws.column_dimensions['H'].width = 18
-
-    wb.save(output)
+    wb.close()
     output.seek(0)
     return output.getvalue()
 
 
-def get_fabric_color_hex(fabric_name):
-    """원단 이름에 따른 색상 코드를 반환합니다."""
-    return get_fabric_color(fabric_name)
+# 원단 이름에 따른 색상 코드 (constants.get_fabric_color는 lru_cache 적용 - 래퍼 호출 없이 그대로 사용)
+get_fabric_color_hex = get_fabric_color
+
+def _append_line(lines_list, arr):
+    """(N, 2) float64 배열로 LineString 생성 (점 2개 이상일 때만)"""
+    if len(arr) > 1:
+        lines_list.append(LineString(arr))
+
+
+def _extract_line(entity, lines_list, block_cache, flatten_distance):
+    start, end = entity.dxf.start, entity.dxf.end
+    _append_line(lines_list, np.array([(start.x, start.y), (end.x, end.y)], dtype=np.float64))
+
 
-def extract_lines(entity, lines_list):
-    """DXF 엔티티에서 선분 정보를 재귀적으로 추출합니다."""
-    dxftype = entity.dxftype()
+def _extract_polyline(entity, lines_list, block_cache, flatten_distance):
+    points = list(entity.points())
+    if len(points) > 1:
+        _append_line(lines_list, np.array([(p[0], p[1]) for p in points], dtype=np.float64))
+
+
+def _extract_curve(entity, lines_list, block_cache, flatten_distance):
+    path = ezdxf.path.make_path(entity)
+    _append_line(lines_list, np.array([(v.x, v.y) for v in path.flattening(distance=flatten_distance)],
+                                      dtype=np.float64))
+
+
+def _extract_insert(entity, lines_list, block_cache, flatten_distance):
+    # 블록 참조(Insert)일 경우 내부 엔티티 탐색
+    block_name = entity.dxf.name
+    if block_cache is None or entity.mcount > 1 or entity.doc is None:
+        for virtual_entity in entity.virtual_entities():
+            extract_lines(virtual_entity, lines_list, block_cache, flatten_distance)
+        return
+
+    if block_name not in block_cache:
+        block_lines = []
+        for block_entity in entity.doc.blocks[block_name]:
+            extract_lines(block_entity, block_lines, block_cache, flatten_distance)
+        block_cache[block_name] = block_lines
+
+    # 블록 좌표계 → WCS (ezdxf Matrix44는 행 벡터 규약: p' = p @ M)
+    m = entity.matrix44()
+    r0, r1, r3 = m.get_row(0), m.get_row(1), m.get_row(3)
+    matrix = [r0[0], r1[0], r0[1], r1[1], r3[0], r3[1]]
+    for line in block_cache[block_name]:
+        lines_list.append(affinity.affine_transform(line, matrix))
+
+
+# DXF 엔티티 타입 → 선분 추출 함수
+_LINE_HANDLERS = {
+    'LINE': _extract_line,
+    'LWPOLYLINE': _extract_polyline,
+    'POLYLINE': _extract_polyline,
+    'SPLINE': _extract_curve,
+    'ARC': _extract_curve,
+    'CIRCLE': _extract_curve,
+    'ELLIPSE': _extract_curve,
+    'INSERT': _extract_insert,
+}
+
+
+def extract_lines(entity, lines_list, block_cache=None, flatten_distance=FLATTEN_DISTANCE):
+    """
+    DXF 엔티티에서 선분 정보를 재귀적으로 추출합니다.
+    block_cache(dict)를 넘기면 같은 블록의 평탄화 결과(블록 좌표계)를 재사용하고
+    INSERT 변환 행렬만 적용합니다.
+    """
+    handler = _LINE_HANDLERS.get(entity.dxftype())
+    if handler is None:
+        return
     try:
-        if dxftype == 'LINE':
-            start, end = entity.dxf.start, entity.dxf.end
-            lines_list.append(LineString([(start.x, start.y), (end.x, end.y)]))
-        elif dxftype in ['LWPOLYLINE', 'POLYLINE']:
-            points = list(entity.points())
-            if len(points) > 1:
-                lines_list.append(LineString([(p[0], p[1]) for p in points]))
-        elif dxftype in ['SPLINE', 'ARC', 'CIRCLE', 'ELLIPSE']:
-            path = ezdxf.path.make_path(entity)
-            vertices = list(path.flattening(distance=1.0))
-            if len(vertices) > 1:
-                lines_list.append(LineString([(v.x, v.y) for v in vertices]))
-        elif dxftype == 'INSERT':
-            # 블록 참조(Insert)일 경우 내부 엔티티 탐색
-            for virtual_entity in entity.virtual_entities():
-                extract_lines(virtual_entity, lines_list)
+        handler(entity, lines_list, block_cache, flatten_distance)
     except Exception:
         pass # 파싱 불가능한 엔티티는 무시
 
@@ -910,36 +1203,91 @@ def check_is_fold(poly):
         # if abs(p1[1]-p2[1]) < 0.1 and dist > full_w * 0.9: return True, "수평골" (사용자 요청으로 삭제)
     return False, "일반"
 
+def _render_poly_png(poly, fill_color, cx, cy, window, size_px, line_width):
+    """
+    폴리곤 외곽선 + 반투명 채움을 PIL로 직접 래스터화 (투명 배경 PNG 바이트)
+    (cx, cy) 중심의 window×window 영역을 size_px 정사각형에 맞춰 그립니다.
+    """
+    from PIL import Image, ImageDraw, ImageColor
+
+    ss = 2  # 슈퍼샘플링 배율 (축소 시 안티앨리어싱)
+    px = size_px * ss
+    scale = px / window if window > 0 else 1.0
+
+    # 월드 좌표 → 픽셀 좌표 (Y축 반전)
+    coords = np.asarray(poly.exterior.coords)
+    pts = np.column_stack((
+        (coords[:, 0] - (cx - window / 2)) * scale,
+        ((cy + window / 2) - coords[:, 1]) * scale
+    )).ravel().tolist()
+
+    r, g, b = ImageColor.getrgb(fill_color)[:3]
+    img = Image.new('RGBA', (px, px), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.polygon(pts, fill=(r, g, b, 153))  # alpha=0.6
+    draw.line(pts, fill=(0, 0, 0, 255), width=max(1, round(line_width * ss)))
+    img = img.reduce(ss)
+
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', compress_level=1)
+    return buf.getvalue()
+
+
+# 썸네일 Base64 캐시 최대 개수 (st.session_state.thumb_b64_cache: (WKB 다이제스트, 색상) -> data URI)
+# 같은 형상(복사본, 그레이딩 차이 없는 사이즈) + 같은 색상은 인코딩 결과 재사용
+# 모듈 변수는 리런마다 새로 만들어지므로 세션 상태에 보관
+THUMB_B64_CACHE_MAX = 4096
+
+
 def poly_to_base64(poly, fill_color='gray'):
     """Shapely Polygon을 정사각형 썸네일 이미지(Base64)로 변환합니다."""
-    fig, ax = plt.subplots(figsize=(1, 1))
-    x, y = poly.exterior.xy
-    ax.plot(x, y, 'k-', lw=2)
-    ax.fill(x, y, fill_color, alpha=0.6) # 색상 적용 (투명도 약간 높임)
-    ax.axis('off')
+    return poly_to_base64_batch([poly], [fill_color])[0]
+
 
+def poly_to_base64_batch(polys, fill_colors):
+    """
+    여러 폴리곤의 썸네일(Base64)을 한 번에 반환합니다.
+    캐시에 없는 (형상, 색상)만 순차 렌더링합니다. (캐시 키는 WKB 전체 대신 16바이트 다이제스트)
+    """
+    if 'thumb_b64_cache' not in st.session_state:
+        st.session_state.thumb_b64_cache = {}
+    cache = st.session_state.thumb_b64_cache
+
+    keys = [(hashlib.blake2b(poly.wkb, digest_size=16).digest(), color) for poly, color in zip(polys, fill_colors)]
+    uris = {}
+    missing = {}
+    for key, poly in zip(keys, polys):
+        if key not in uris:
+            uris[key] = cache.get(key)
+            if uris[key] is None:
+                missing[key] = poly
+
+    if missing:
+        if len(cache) + len(missing) > THUMB_B64_CACHE_MAX:
+            cache.clear()
+        for key, poly in missing.items():
+            cache[key] = uris[key] = _render_poly_base64(poly, key[1])
+
+    return [uris[key] for key in keys]
+
+
+def _render_poly_base64(poly, fill_color):
+    """poly_to_base64 본체 (폴리곤 + 색상 → PNG data URI)"""
     # 정사각형 비율 맞추기 (Centering)
     minx, miny, maxx, maxy = poly.bounds
     cx, cy = (minx + maxx) / 2, (miny + maxy) / 2
     max_dim = max(maxx - minx, maxy - miny)
     padding = max_dim * 0.1 # 10% 여백
-    span = (max_dim + padding) / 2
 
-    ax.set_xlim(cx - span, cx + span)
-    ax.set_ylim(cy - span, cy + span)
-    ax.set_aspect('equal')
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', transparent=True, bbox_inches='tight', pad_inches=0)
-    plt.close(fig)
+    png_bytes = _render_poly_png(poly, fill_color, cx, cy, max_dim + padding, size_px=100, line_width=3)
 
-    data = base64.b64encode(buf.getvalue()).decode("utf-8")
+    data = base64.b64encode(png_bytes).decode("utf-8")
     return f"data:image/png;base64,{data}"
 
 
 def get_cached_thumbnail(idx, poly, fabric_name, zoom_span, grainline_info=None):
     """
-    썸네일 캐싱 함수: (폴리곤 고유ID, 원단명, zoom_span) 조합으로 캐시 관리
+    썸네일 캐싱 함수: (폴리곤 고유ID, 원단명, zoom_span) 조합으로 캐시 관리 (SVG 문자열 반환)
     원단명 또는 zoom_span이 변경되면 해당 썸네일만 새로 생성
     복사/정렬 후에도 폴리곤 형상으로 정확히 매칭
     패턴 삭제 시 zoom_span 변경으로 자동 재생성
@@ -949,8 +1297,8 @@ def get_cached_thumbnail(idx, poly, fabric_name, zoom_span, grainline_info=None)
     if 'thumbnail_cache' not in st.session_state:
         st.session_state.thumbnail_cache = {}
 
-    # 캐시 키: (폴리곤 면적 + 중심점 해시, 원단명, zoom_span, grainline 유무) - 폴리곤 형상 + 크기 기반 고유 식별
-    poly_id = (round(poly.area, 2), round(poly.centroid.x, 2), round(poly.centroid.y, 2))
+    # 캐시 키: (폴리곤 WKB 해시, 원단명, zoom_span, grainline 유무) - 형상 정확 식별 (미러링 패턴 충돌 없음)
+    poly_id = hash(poly.wkb)
     zoom_key = round(zoom_span, 1)  # zoom_span 변경 감지
     has_grainline = grainline_info is not None
     cache_key = (poly_id, fabric_name, zoom_key, has_grainline)
@@ -959,30 +1307,45 @@ def get_cached_thumbnail(idx, poly, fabric_name, zoom_span, grainline_info=None)
     if cache_key in st.session_state.thumbnail_cache:
         return st.session_state.thumbnail_cache[cache_key]
 
-    # 없으면 새로 생성
-    fig, ax = plt.subplots(figsize=(1, 1))
-    x, y = poly.exterior.xy
-    ax.plot(x, y, 'k-', lw=0.5)
-    ax.fill(x, y, color=get_fabric_color_hex(fabric_name), alpha=0.6)
+    # 없으면 새로 생성 - 래스터화 없이 SVG 문자열로 (st.image가 SVG 마크업을 직접 표시)
+    # 그레인라인은 일괄수정도구 썸네일에서 숨김 처리
+    centroid = poly.centroid
+    half = zoom_span / 2
+    # SVG는 Y축이 아래 방향이므로 Y 부호를 반전
+    pts = ' '.join(f"{x:.1f},{-y:.1f}" for x, y in poly.exterior.coords)
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="72" height="72" '
+        f'viewBox="{centroid.x - half:.1f} {-centroid.y - half:.1f} {zoom_span:.1f} {zoom_span:.1f}">'
+        f'<polygon points="{pts}" fill="{get_fabric_color_hex(fabric_name)}" fill-opacity="0.6" '
+        f'stroke="black" stroke-width="0.5" vector-effect="non-scaling-stroke"/></svg>'
+    )
 
-    # 그레인라인 - 일괄수정도구 썸네일에서는 숨김 처리
-    pass
+    # 캐시에 저장
+    st.session_state.thumbnail_cache[cache_key] = svg
 
-    ax.set_xlim(poly.centroid.x - zoom_span/2, poly.centroid.x + zoom_span/2)
-    ax.set_ylim(poly.centroid.y - zoom_span/2, poly.centroid.y + zoom_span/2)
-    ax.set_aspect('equal')
-    ax.axis('off')
+    return st.session_state.thumbnail_cache[cache_key]
 
-    # BytesIO로 이미지 저장
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', transparent=True, bbox_inches='tight', pad_inches=0, dpi=72)
-    plt.close(fig)
-    buf.seek(0)
 
-    # 캐시에 저장
-    st.session_state.thumbnail_cache[cache_key] = buf.getvalue()
+_COOLWARM = matplotlib.colormaps['coolwarm']
 
-    return st.session_state.thumbnail_cache[cache_key]
+
+def _overlay_size_colors(all_sizes):
+    """
+    사이즈별 오버레이 색상 (coolwarm 그라데이션, rgba 문자열) - 사이즈 목록(tuple)별로 1회 계산
+    (모듈 캐시는 리런마다 초기화되므로 세션 상태에 보관)
+    """
+    cache = st.session_state.setdefault('_overlay_size_colors', {})
+    if all_sizes in cache:
+        return cache[all_sizes]
+    cmap = _COOLWARM.resampled(len(all_sizes) + 1)
+    size_colors = {}
+    for i, size in enumerate(all_sizes):
+        rgba = cmap(i / max(len(all_sizes) - 1, 1))
+        size_colors[size] = f'rgba({int(rgba[0]*255)},{int(rgba[1]*255)},{int(rgba[2]*255)},{rgba[3]})'
+    if len(cache) >= 64:
+        cache.clear()
+    cache[all_sizes] = size_colors
+    return size_colors
 
 
 def create_overlay_visualization(patterns_group, selected_sizes, all_sizes, global_max_dim=None, base_size=None):
@@ -1005,38 +1368,29 @@ def create_overlay_visualization(patterns_group, selected_sizes, all_sizes, glob
         plotly figure
     """
     import plotly.graph_objects as go
-    import matplotlib.pyplot as plt
 
     fig = go.Figure()
 
-    # 사이즈별 색상 (파랑→빨강 그라데이션) - matplotlib colormap 활용
-    size_colors = {}
-    cmap = plt.cm.get_cmap('coolwarm', len(all_sizes) + 1)
-    for i, size in enumerate(all_sizes):
-        rgba = cmap(i / max(len(all_sizes) - 1, 1))
-        # RGBA to hex
-        size_colors[size] = f'rgba({int(rgba[0]*255)},{int(rgba[1]*255)},{int(rgba[2]*255)},{rgba[3]})'
-
-    # 모든 패턴의 경계 계산 (중심 맞추기용)
-    all_bounds = []
-    for p_data in patterns_group:
-        poly = p_data[0]
-        all_bounds.append(poly.bounds)
+    # 사이즈별 색상 (파랑→빨강 그라데이션)
+    size_colors = _overlay_size_colors(tuple(all_sizes))
 
-    if not all_bounds:
+    if not patterns_group:
         return fig
 
+    # 모든 패턴의 경계 계산 (중심 맞추기용) - GEOS 일괄 호출
+    polys = [p_data[0] for p_data in patterns_group]
+    bounds_arr = shapely.bounds(polys)
+
     # 전체 영역 계산
-    min_x = min(b[0] for b in all_bounds)
-    min_y = min(b[1] for b in all_bounds)
-    max_x = max(b[2] for b in all_bounds)
-    max_y = max(b[3] for b in all_bounds)
+    min_x, min_y = bounds_arr[:, :2].min(axis=0)
+    max_x, max_y = bounds_arr[:, 2:].max(axis=0)
 
     center_x = (min_x + max_x) / 2
     center_y = (min_y + max_y) / 2
 
-    # 사이즈 순서대로 그리기 (큰 것부터)
-    sorted_patterns = sorted(patterns_group, key=lambda x: x[0].area, reverse=True)
+    # 사이즈 순서대로 그리기 (큰 것부터) - 면적도 일괄 계산 (안정 정렬로 기존 순서 유지)
+    areas = shapely.area(polys)
+    sorted_patterns = [patterns_group[i] for i in np.argsort(-areas, kind='stable')]
 
     drawn_sizes = set()
 
@@ -1082,7 +1436,7 @@ def create_overlay_visualization(patterns_group, selected_sizes, all_sizes, glob
 
         # 기준사이즈인 경우 내부선(스티치선, 시접선) 표시
         if base_size and size_name == base_size and is_selected:
-            if len(p_data) > 8 and p_data[8]:
+            if p_data[8]:
                 interior_lines = p_data[8]
                 for line_coords in interior_lines:
                     if len(line_coords) >= 2:
@@ -1146,23 +1500,35 @@ def create_overlay_visualization(patterns_group, selected_sizes, all_sizes, glob
     return fig
 
 
-def check_symmetry(poly):
+def check_symmetry(poly, coords=None):
     """
     패턴의 대칭 여부를 판단합니다. (좌우대칭 or 상하대칭)
     원리: 중심축 기준으로 반전시켰을 때 원본과 거의 겹치는지(차집합 면적이 적은지) 확인
+    coords: 미리 꺼낸 외곽 좌표 배열 (classify_pattern_shapes에서 공유)
     """
     try:
+        # 축마다 빠른 판정(중심 기준 반전한 꼭짓점 집합이 원본과 같은지) → GEOS 오차 판정 순서
+        # 좌우 판정이 두 방법 모두 실패한 뒤에만 상하를 판정 (원래 판정 순서 유지)
+        centroid = poly.centroid
+        cx, cy = centroid.x, centroid.y
+        vertices = (np.asarray(poly.exterior.coords) if coords is None else coords)[:-1].tolist()
+        orig_set = {(round(x, 1), round(y, 1)) for x, y in vertices}
+
         # 허용 오차 (전체 면적의 2% 미만 차이면 대칭으로 간주 - 98% 일치)
         tolerance = poly.area * 0.02 
         
         # 1. 좌우 대칭 확인 (Horizontal Reflection)
-        reflected_h = affinity.scale(poly, xfact=-1, origin='centroid')
+        if {(round(2 * cx - x, 1), round(y, 1)) for x, y in vertices} == orig_set:
+            return True, "좌우대칭"
+        reflected_h = affinity.scale(poly, xfact=-1, origin=centroid)
         diff_h = poly.symmetric_difference(reflected_h).area
         if diff_h < tolerance:
             return True, "좌우대칭"
 
         # 2. 상하 대칭 확인 (Vertical Reflection)
-        reflected_v = affinity.scale(poly, yfact=-1, origin='centroid')
+        if {(round(x, 1), round(2 * cy - y, 1)) for x, y in vertices} == orig_set:
+            return True, "상하대칭"
+        reflected_v = affinity.scale(poly, yfact=-1, origin=centroid)
         diff_v = poly.symmetric_difference(reflected_v).area
         if diff_v < tolerance:
             return True, "상하대칭"
@@ -1172,109 +1538,160 @@ def check_symmetry(poly):
         return False, "오류"
 
 
-def check_vertical_straight_edge(poly, min_length_cm=50):
+def check_vertical_straight_edge(poly, min_length_cm=50, coords=None, bounds=None):
     """
     패턴의 세로 직선(좌측/우측)이 특정 길이 이상인지 판별합니다.
     min_length_cm 이상인 세로 직선이 1개라도 있으면 True 반환
     """
     try:
-        coords = list(poly.exterior.coords)
+        if coords is None:
+            coords = np.asarray(poly.exterior.coords)
         if len(coords) < 4:
             return False
 
         min_length_mm = min_length_cm * 10  # cm → mm 변환
+        minx, miny, maxx, maxy = poly.bounds if bounds is None else bounds
+        width = maxx - minx
 
         # 연속된 점들 사이의 세로 직선 확인
-        for i in range(len(coords) - 1):
-            x1, y1 = coords[i]
-            x2, y2 = coords[i + 1]
-
-            # X좌표 변화가 거의 없으면 세로 직선
-            x_diff = abs(x2 - x1)
-            y_length = abs(y2 - y1)
-
-            # X좌표 변화가 전체 폭의 2% 이내이고, 세로 길이가 min_length 이상
-            minx, miny, maxx, maxy = poly.bounds
-            width = maxx - minx
-
-            if x_diff < width * 0.02 and y_length >= min_length_mm:
-                return True
-
-        return False
+        # X좌표 변화가 전체 폭의 2% 이내이고, 세로 길이가 min_length 이상
+        seg = np.abs(np.diff(coords, axis=0))
+        return bool(((seg[:, 0] < width * 0.02) & (seg[:, 1] >= min_length_mm)).any())
     except:
         return False
 
 
-def check_horizontal_straight_edge(poly):
+def check_horizontal_straight_edge(poly, coords=None, bounds=None):
     """
     패턴의 가로 직선(상단/하단)이 1개 이상 있는지 판별합니다.
     상단 또는 하단 중 Y좌표 변화가 1% 이내인 직선이 있으면 True 반환
     """
     try:
-        coords = list(poly.exterior.coords)
+        if coords is None:
+            coords = np.asarray(poly.exterior.coords)
         if len(coords) < 4:
             return False
 
-        minx, miny, maxx, maxy = poly.bounds
+        minx, miny, maxx, maxy = poly.bounds if bounds is None else bounds
         height = maxy - miny
+        ys = coords[:, 1]
 
         # 상단/하단 영역 정의 (전체 높이의 10% 이내)
-        top_threshold = maxy - height * 0.1
-        bottom_threshold = miny + height * 0.1
-
-        top_points = [(x, y) for x, y in coords if y >= top_threshold]
-        bottom_points = [(x, y) for x, y in coords if y <= bottom_threshold]
+        top_ys = ys[ys >= maxy - height * 0.1]
+        bottom_ys = ys[ys <= miny + height * 0.1]
 
-        def is_straight_line(points):
-            if len(points) < 2:
+        def is_straight_line(y_values):
+            if len(y_values) < 2:
                 return False
-            y_values = [p[1] for p in points]
-            y_range = max(y_values) - min(y_values)
-            return y_range < height * 0.01
+            return np.ptp(y_values) < height * 0.01
 
-        return is_straight_line(top_points) or is_straight_line(bottom_points)
+        return bool(is_straight_line(top_ys) or is_straight_line(bottom_ys))
     except:
         return False
 
 
-def check_parallel_edges(poly, similarity_threshold=0.85):
+def check_parallel_edges(poly, similarity_threshold=0.85, coords=None, bounds=None):
     """
     패턴의 상하단 가로선이 평행선인지 판별합니다.
     상하단 가로 길이 비율이 similarity_threshold 이상이면 True 반환
     """
     try:
-        coords = list(poly.exterior.coords)
+        if coords is None:
+            coords = np.asarray(poly.exterior.coords)
         if len(coords) < 4:
             return False
 
-        minx, miny, maxx, maxy = poly.bounds
+        minx, miny, maxx, maxy = poly.bounds if bounds is None else bounds
         height = maxy - miny
+        xs, ys = coords[:, 0], coords[:, 1]
 
         # 상단/하단 영역 정의 (전체 높이의 10% 이내)
-        top_threshold = maxy - height * 0.1
-        bottom_threshold = miny + height * 0.1
-
-        top_points = [(x, y) for x, y in coords if y >= top_threshold]
-        bottom_points = [(x, y) for x, y in coords if y <= bottom_threshold]
+        top_xs = xs[ys >= maxy - height * 0.1]
+        bottom_xs = xs[ys <= miny + height * 0.1]
 
-        def get_edge_length(points):
-            if len(points) < 2:
+        def get_edge_length(x_values):
+            if len(x_values) < 2:
                 return 0
-            x_values = [p[0] for p in points]
-            return max(x_values) - min(x_values)
+            return np.ptp(x_values)
 
-        top_length = get_edge_length(top_points)
-        bottom_length = get_edge_length(bottom_points)
+        top_length = get_edge_length(top_xs)
+        bottom_length = get_edge_length(bottom_xs)
 
         if top_length > 0 and bottom_length > 0:
             similarity = min(top_length, bottom_length) / max(top_length, bottom_length)
-            return similarity >= similarity_threshold
+            return bool(similarity >= similarity_threshold)
 
         return False
     except:
         return False
 
 
+# 형상 기반 수량 추론 규칙 (우선순위 순) - (수량, 구분)
+_SHAPE_RULE_CHOICES = [
+    (1, "BACK"), (1, "BACK YOKE"), (2, "FRONT"), (1, "BACK YOKE HEM"),
+    (1, "BACK BOTTOM"), (4, "FLAP"), (4, "SLEEVE TAB"),
+]
+
+
+def classify_pattern_shapes(polys, bounds, vertical_min_length_cm=35, parallel_threshold=0.85):
+    """
+    형상 기반 수량 추론(규칙 1~8)을 패턴 배열 단위로 일괄 적용합니다.
+    치수 조건은 불리언 마스크로 한 번에 계산하고, 비용이 큰 직선/평행 판별은
+    앞 규칙에 걸리지 않고 치수 조건을 통과한 패턴에만 수행합니다.
+
+    Args:
+        polys: Shapely Polygon 시퀀스
+        bounds: (N, 4) bounds 배열 (mm)
+
+    Returns:
+        (수량 배열, 구분 배열)
+    """
+    n = len(polys)
+    if n == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=object)
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(n, 4)
+    w = (bounds[:, 2] - bounds[:, 0]) / 10
+    h = (bounds[:, 3] - bounds[:, 1]) / 10
+    coords = [np.asarray(p.exterior.coords) for p in polys]
+    sym_kind = np.array([check_symmetry(p, coords=c)[1] for p, c in zip(polys, coords)], dtype=object)
+    sym_lr = sym_kind == "좌우대칭"
+    sym_ud = sym_kind == "상하대칭"
+
+    def lazy_mask(candidates, check):
+        """candidates인 패턴에만 check(i)를 호출한 불리언 마스크"""
+        mask = np.zeros(n, dtype=bool)
+        for i in np.flatnonzero(candidates):
+            mask[i] = check(i)
+        return mask
+
+    # 1. 좌우대칭 + 가로≥50cm + 세로≥45cm → BACK, 1개
+    r1 = sym_lr & (w >= 50) & (h >= 45)
+    # 2. 좌우대칭 + 가로≥50cm + 세로≥20cm + 세로<45cm → BACK YOKE, 1개
+    r2 = sym_lr & (w >= 50) & (h >= 20) & (h < 45)
+    taken = r1 | r2
+    # 3. 가로≥25cm + 세로≥40cm + 세로직선(≥35cm) 1개 이상 → FRONT, 2개
+    r3 = lazy_mask(~taken & (w >= 25) & (h >= 40), lambda i: check_vertical_straight_edge(
+        polys[i], vertical_min_length_cm, coords=coords[i], bounds=tuple(bounds[i])))
+    taken |= r3
+    # 4. 좌우대칭 + 가로≥45cm + 세로≤15cm + 가로직선 1개 → BACK YOKE HEM, 1개
+    r4 = lazy_mask(~taken & sym_lr & (w >= 45) & (h <= 15), lambda i: check_horizontal_straight_edge(
+        polys[i], coords=coords[i], bounds=tuple(bounds[i])))
+    taken |= r4
+    # 5. 좌우대칭 + 가로≥50cm + 세로≤10cm + 평행선(85%) → BACK BOTTOM, 1개
+    r5 = lazy_mask(~taken & sym_lr & (w >= 50) & (h <= 10), lambda i: check_parallel_edges(
+        polys[i], parallel_threshold, coords=coords[i], bounds=tuple(bounds[i])))
+    # 6. 좌우대칭 + 가로≤25cm + 세로≤15cm → FLAP, 4개
+    r6 = sym_lr & (w <= 25) & (h <= 15)
+    # 7. 상하대칭 + 가로≤26cm + 세로≤12cm → SLEEVE TAB, 4개
+    r7 = sym_ud & (w <= 26) & (h <= 12)
+
+    # 8. 나머지 → 확인, 2개
+    conds = [r1, r2, r3, r4, r5, r6, r7]
+    counts = np.select(conds, [c for c, _ in _SHAPE_RULE_CHOICES], default=2)
+    descs = np.select(conds, [np.full(n, d, dtype=object) for _, d in _SHAPE_RULE_CHOICES], default="확인")
+    return counts, descs
+
+
 # ==============================================================================
 # 3. 핵심 로직: DXF 처리 (Core Logic)
 # ==============================================================================
@@ -1283,31 +1700,24 @@ from shapely.ops import polygonize, linemerge
 
 # ... (기존 extract_lines 함수는 그대로 유지하거나 필요시 수정) ...
 
-@st.cache_data
 def extract_style_no(file_path):
     """DXF 파일에서 스타일번호를 추출합니다."""
     try:
+        # 태그 스트림 스캔 우선 (엔티티 DOM/OBJECTS 섹션 로딩 생략, 실패 시 전체 파싱)
         try:
-            doc = ezdxf.readfile(file_path, encoding='cp949')
-        except:
-            doc = ezdxf.readfile(file_path)
-
-        msp = doc.modelspace()
-
-        for entity in msp:
-            if entity.dxftype() == 'INSERT':
-                block = doc.blocks.get(entity.dxf.name)
-                for be in block:
-                    if be.dxftype() == 'TEXT':
-                        text = be.dxf.text
-                        text_upper = text.upper()
-                        # 스타일번호: S/#..., M/#... 형식 (대소문자 무시)
-                        if text_upper.startswith('ANNOTATION:') and '/#' in text:
-                            val = text.split(':', 1)[1].strip()
-                            # S/#5535-731 → 5535-731
-                            if '/#' in val:
-                                return val.split('/#')[1]
-                break  # 첫 번째 블록에서만 추출
+            _, insert_names, block_texts = _scan_dxf_tags(file_path)
+        except Exception:
+            _, insert_names, block_texts = _scan_dxf_doc(file_path)
+
+        for name in insert_names[:1]:  # 첫 번째 블록에서만 추출
+            for text in block_texts.get(name, ()):
+                text_upper = text.upper()
+                # 스타일번호: S/#..., M/#... 형식 (대소문자 무시)
+                if text_upper.startswith('ANNOTATION:') and '/#' in text:
+                    val = text.split(':', 1)[1].strip()
+                    # S/#5535-731 → 5535-731
+                    if '/#' in val:
+                        return val.split('/#')[1]
     except:
         pass
     return ""
@@ -1394,75 +1804,64 @@ def detect_grainline(block, return_coords=False, polygon=None):
         return_coords=False: angle (그레인라인 각도) 또는 None
         return_coords=True: (angle, start, end) 또는 (None, None, None)
     """
-    import math
-
-    candidate_lines = []
+    # 후보 선분 수집 (x1, y1, x2, y2) + 그레인라인 레이어 여부
+    segments = []
+    layer_flags = []
 
     for entity in block:
+        dxftype = entity.dxftype()
+        if dxftype == 'LINE':
+            start = entity.dxf.start
+            end = entity.dxf.end
+            seg = (start.x, start.y, end.x, end.y)
+        elif dxftype == 'LWPOLYLINE' and not entity.closed:
+            # 열린 폴리라인도 그레인라인일 수 있음
+            pts = list(entity.get_points())
+            if len(pts) != 2:  # 2점 직선만
+                continue
+            seg = (pts[0][0], pts[0][1], pts[1][0], pts[1][1])
+        else:
+            continue
+
         layer_name = str(entity.dxf.layer).upper() if hasattr(entity.dxf, 'layer') else ''
 
         # 레이어명으로 그레인라인 감지 (키워드 또는 숫자 레이어)
         is_grainline_layer = (
-            any(kw in layer_name for kw in GRAINLINE_KEYWORDS) or
+            _GRAIN_RE.search(layer_name) is not None or
             layer_name in GRAINLINE_LAYER_NUMBERS
         )
+        segments.append(seg)
+        layer_flags.append(is_grainline_layer)
 
-        if entity.dxftype() == 'LINE':
-            start = entity.dxf.start
-            end = entity.dxf.end
-            dx = end.x - start.x
-            dy = end.y - start.y
-            length = math.sqrt(dx*dx + dy*dy)
+    best = None
+    if segments:
+        seg_arr = np.asarray(segments, dtype=np.float64)
+        dx = seg_arr[:, 2] - seg_arr[:, 0]
+        dy = seg_arr[:, 3] - seg_arr[:, 1]
+        length = np.hypot(dx, dy)
+        valid = length > 1  # 최소 길이 필터
+        is_gl = np.asarray(layer_flags, dtype=bool) & valid
+
+        # 그레인라인 우선순위:
+        # 1. 그레인라인 레이어에 있는 선 중 가장 긴 선
+        # 2. 그레인라인 레이어가 없으면 독립 LINE 중 가장 긴 것 (100단위 이상)
+        best_idx = None
+        if is_gl.any():
+            best_idx = int(np.argmax(np.where(is_gl, length, -1.0)))
+        else:
+            long_mask = valid & (length >= 100)
+            if long_mask.any():
+                best_idx = int(np.argmax(np.where(long_mask, length, -1.0)))
 
-            if length > 1:  # 최소 길이 필터
+        if best_idx is not None:
+            x1, y1, x2, y2 = seg_arr[best_idx].tolist()
+            best = {
                 # 각도 계산 (수평 기준, -180 ~ 180)
-                angle = math.degrees(math.atan2(dy, dx))
-                candidate_lines.append({
-                    'angle': angle,
-                    'length': length,
-                    'is_grainline_layer': is_grainline_layer,
-                    'start': (start.x, start.y),
-                    'end': (end.x, end.y)
-                })
-
-        elif entity.dxftype() == 'LWPOLYLINE' and not entity.closed:
-            # 열린 폴리라인도 그레인라인일 수 있음
-            pts = list(entity.get_points())
-            if len(pts) == 2:  # 2점 직선
-                start, end = pts[0], pts[1]
-                dx = end[0] - start[0]
-                dy = end[1] - start[1]
-                length = math.sqrt(dx*dx + dy*dy)
-                if length > 1:
-                    angle = math.degrees(math.atan2(dy, dx))
-                    candidate_lines.append({
-                        'angle': angle,
-                        'length': length,
-                        'is_grainline_layer': is_grainline_layer,
-                        'start': (start[0], start[1]),
-                        'end': (end[0], end[1])
-                    })
-
-    if not candidate_lines:
-        # 후보 라인이 없으면 좌우대칭 체크
-        if polygon and is_symmetric_polygon(polygon):
-            return get_center_vertical_grainline(polygon) if return_coords else 90.0
-        return (None, None, None) if return_coords else None
-
-    # 그레인라인 우선순위:
-    # 1. 그레인라인 레이어에 있는 선
-    # 2. 그 중 가장 긴 선
-    grainline_layer_lines = [l for l in candidate_lines if l['is_grainline_layer']]
-
-    best = None
-    if grainline_layer_lines:
-        # 그레인라인 레이어에서 가장 긴 선
-        best = max(grainline_layer_lines, key=lambda x: x['length'])
-    else:
-        # 그레인라인 레이어가 없으면 독립 LINE 중 가장 긴 것 사용 (100단위 이상)
-        long_lines = [l for l in candidate_lines if l['length'] >= 100]
-        if long_lines:
-            best = max(long_lines, key=lambda x: x['length'])
+                'angle': math.degrees(math.atan2(dy[best_idx], dx[best_idx])),
+                'length': float(length[best_idx]),
+                'start': (x1, y1),
+                'end': (x2, y2)
+            }
 
     # 좌우대칭 패턴인 경우: 결선이 중심에서 벗어났으면 중심 수직선 사용
     if best and polygon and is_symmetric_polygon(polygon):
@@ -1489,16 +1888,17 @@ def detect_grainline(block, return_coords=False, polygon=None):
     return (None, None, None) if return_coords else None
 
 
-def rotate_polygon_to_vertical_grain(poly, grainline_angle):
+def rotate_polygon_to_vertical_grain(poly, grainline_angle, return_matrix=False):
     """
     폴리곤을 그레인라인이 수직(90도)이 되도록 회전합니다.
 
     Args:
         poly: Shapely Polygon
         grainline_angle: 현재 그레인라인 각도 (도)
+        return_matrix: True면 적용한 affine 행렬도 반환 (그레인라인/내부선 재사용용)
 
     Returns:
-        회전된 Shapely Polygon
+        (회전된 Polygon, 회전 각도) 또는 return_matrix=True면 (Polygon, 회전 각도, 행렬 또는 None)
     """
     from shapely import affinity
 
@@ -1522,49 +1922,55 @@ def rotate_polygon_to_vertical_grain(poly, grainline_angle):
         rotation_needed += 180
 
     if abs(rotation_needed) < 1:  # 이미 수직에 가까움
-        return poly, 0
+        return (poly, 0, None) if return_matrix else (poly, 0)
 
-    # 중심점 기준 회전
-    rotated = affinity.rotate(poly, rotation_needed, origin='centroid')
-    return rotated, rotation_needed
+    # 중심점 기준 회전 - 행렬을 직접 구성해 affine_transform 1회로 적용
+    rad = math.radians(rotation_needed)
+    c, s = math.cos(rad), math.sin(rad)
+    cx, cy = poly.centroid.coords[0]
+    matrix = (c, -s, s, c, cx - c * cx + s * cy, cy - s * cx - c * cy)
+    rotated = affinity.affine_transform(poly, matrix)
+    return (rotated, rotation_needed, matrix) if return_matrix else (rotated, rotation_needed)
 
 
-def rotate_grainline_coords(start, end, rotation_angle, origin):
-    """
-    그레인라인 좌표를 회전시킵니다.
+def apply_affine_to_points(points, matrix):
+    """Shapely affine 행렬 (a, b, d, e, xoff, yoff)을 좌표 목록에 일괄 적용 → [(x, y), ...]"""
+    a, b, d, e, xoff, yoff = matrix
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    out = pts @ np.array([[a, d], [b, e]]) + (xoff, yoff)
+    return [tuple(pt) for pt in out.tolist()]
 
-    Args:
-        start: (x, y) 시작점
-        end: (x, y) 끝점
-        rotation_angle: 회전 각도 (도)
-        origin: (x, y) 회전 중심점
 
-    Returns:
-        (new_start, new_end) 회전된 좌표
+def build_line_index(msp):
     """
-    import math
-
-    if abs(rotation_angle) < 1:
-        return start, end
-
-    rad = math.radians(rotation_angle)
-    cos_a = math.cos(rad)
-    sin_a = math.sin(rad)
-    ox, oy = origin
+    모델스페이스 LINE 엔티티의 공간 인덱스 (중점 STRtree)를 만듭니다.
+    레거시 DXF에서 패턴마다 전체 LINE을 훑지 않도록 파일당 1회 생성합니다.
 
-    def rotate_point(px, py):
-        dx = px - ox
-        dy = py - oy
-        new_x = ox + dx * cos_a - dy * sin_a
-        new_y = oy + dx * sin_a + dy * cos_a
-        return (new_x, new_y)
+    Returns:
+        {'segments': (N, 4) ndarray, 'is_grainline_layer': (N,) bool, 'midpoints': Point 배열, 'tree': STRtree}
+    """
+    segments = []
+    layer_flags = []
+    for entity in msp:
+        if entity.dxftype() != 'LINE':
+            continue
+        layer_name = entity.dxf.layer.upper() if hasattr(entity.dxf, 'layer') else ''
+        start = entity.dxf.start
+        end = entity.dxf.end
+        segments.append((start.x, start.y, end.x, end.y))
+        layer_flags.append(_GRAIN_RE.search(layer_name) is not None)
 
-    new_start = rotate_point(start[0], start[1])
-    new_end = rotate_point(end[0], end[1])
-    return new_start, new_end
+    seg_arr = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    midpoints = shapely.points((seg_arr[:, :2] + seg_arr[:, 2:]) / 2)
+    return {
+        'segments': seg_arr,
+        'is_grainline_layer': np.asarray(layer_flags, dtype=bool),
+        'midpoints': midpoints,
+        'tree': shapely.STRtree(midpoints),
+    }
 
 
-def detect_grainline_for_polygon(msp, poly):
+def detect_grainline_for_polygon(msp, poly, line_index=None):
     """
     모델스페이스에서 특정 폴리곤 내부 또는 근처에 있는 그레인라인을 감지합니다.
     레거시 DXF 파일용 (블록 없이 모델스페이스에 직접 그려진 패턴)
@@ -1572,184 +1978,267 @@ def detect_grainline_for_polygon(msp, poly):
     Args:
         msp: ezdxf 모델스페이스
         poly: Shapely Polygon (대상 패턴)
+        line_index: build_line_index() 결과 (None이면 새로 생성)
 
     Returns:
         angle: 그레인라인의 각도 (도)
         None: 그레인라인을 찾지 못한 경우
     """
     import math
-    from shapely.geometry import Point, LineString
 
-    candidate_lines = []
+    if line_index is None:
+        line_index = build_line_index(msp)
 
-    # 폴리곤 바운딩박스 확장 (근처 선 검색용)
+    # 폴리곤 바운딩박스 확장 (근처 선 검색용) - STRtree로 후보 중점만 조회
     bounds = poly.bounds
     margin = 50  # 50단위 여유
-    search_bounds = (bounds[0] - margin, bounds[1] - margin,
-                     bounds[2] + margin, bounds[3] + margin)
+    search_box = shapely.box(bounds[0] - margin, bounds[1] - margin,
+                             bounds[2] + margin, bounds[3] + margin)
+    idxs = np.sort(line_index['tree'].query(search_box))
+
+    if len(idxs):
+        # 폴리곤 내부 또는 근처에 있는지 확인 (내부면 거리 0)
+        idxs = idxs[shapely.distance(poly, line_index['midpoints'][idxs]) < margin]
+
+    if len(idxs):
+        seg = line_index['segments'][idxs]
+        dx = seg[:, 2] - seg[:, 0]
+        dy = seg[:, 3] - seg[:, 1]
+        length = np.hypot(dx, dy)
+
+        # 그레인라인 레이어에 있는 선 우선 (가장 긴 선)
+        is_gl = line_index['is_grainline_layer'][idxs] & (length > 1)
+        if is_gl.any():
+            best = int(np.argmax(np.where(is_gl, length, -1.0)))
+            return math.degrees(math.atan2(dy[best], dx[best]))
+
+    # 최종적으로 결선을 찾지 못하면 좌우대칭 체크 (좌우대칭이면 수직(90도) 결선)
+    if is_symmetric_polygon(poly):
+        return 90.0
 
-    for entity in msp:
-        layer_name = entity.dxf.layer.upper() if hasattr(entity.dxf, 'layer') else ''
-        is_grainline_layer = any(kw in layer_name for kw in GRAINLINE_KEYWORDS)
+    return None
 
-        if entity.dxftype() == 'LINE':
-            start = entity.dxf.start
-            end = entity.dxf.end
 
-            # 바운딩박스 내에 있는지 확인
-            mid_x = (start.x + end.x) / 2
-            mid_y = (start.y + end.y) / 2
-            if not (search_bounds[0] <= mid_x <= search_bounds[2] and
-                    search_bounds[1] <= mid_y <= search_bounds[3]):
-                continue
+def preprocessed_dxf_path(file_path):
+    """전처리본 경로 (원본 옆 '<원본>_pre.dxf' - 원본 임시 파일과 함께 삭제)"""
+    root, _ = os.path.splitext(file_path)
+    return f'{root}_pre.dxf'
 
-            # 폴리곤 내부 또는 근처에 있는지 확인
-            mid_point = Point(mid_x, mid_y)
-            if not (poly.contains(mid_point) or poly.distance(mid_point) < margin):
-                continue
 
-            dx = end.x - start.x
-            dy = end.y - start.y
-            length = math.sqrt(dx*dx + dy*dy)
-
-            if length > 1:
-                angle = math.degrees(math.atan2(dy, dx))
-                candidate_lines.append({
-                    'angle': angle,
-                    'length': length,
-                    'is_grainline_layer': is_grainline_layer
-                })
-
-    if not candidate_lines:
-        # 후보 라인이 없으면 좌우대칭 체크
-        if is_symmetric_polygon(poly):
-            return 90.0  # 좌우대칭이면 수직(90도) 결선
-        return None
+def preprocess_dxf_content(file_path, digest=None):
+    """
+    DXF 파일 내용을 전처리하여 특수문자 문제를 해결합니다.
+    블록명에 <&> 등 ezdxf가 처리할 수 없는 문자가 있으면 치환합니다.
+    치환 필요 여부는 파일 내용 해시(digest, 없으면 경로 + 수정시각 + 크기) 기준으로 st.cache_data에 1회만 판별하고,
+    치환본은 preprocessed_dxf_path()에 1회만 기록하여 사이즈 스캔과 패턴 로딩이 같은 파일을 재사용합니다.
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return file_path  # 읽기 실패 시 원본 반환
+    content_key = digest or (file_path, stat.st_mtime_ns, stat.st_size)
+    if not _dxf_needs_preprocess(file_path, content_key):
+        return file_path  # 치환 불필요
 
-    # 그레인라인 레이어에 있는 선 우선
-    grainline_layer_lines = [l for l in candidate_lines if l['is_grainline_layer']]
-    if grainline_layer_lines:
-        best = max(grainline_layer_lines, key=lambda x: x['length'])
-        return best['angle']
+    processed_path = preprocessed_dxf_path(file_path)
+    try:
+        if os.stat(processed_path).st_mtime_ns >= stat.st_mtime_ns:
+            return processed_path  # 이전 단계에서 기록한 치환본 재사용
+    except OSError:
+        pass
 
-    # 최종적으로 결선을 찾지 못하면 좌우대칭 체크
-    if is_symmetric_polygon(poly):
-        return 90.0
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return file_path
 
-    return None
+    # 특수문자 치환 (블록명에서 문제가 되는 문자들)
+    # 바이트 단위 치환 - '<', '&', '>'는 CP949 2바이트 문자의 바이트로 쓰이지 않으므로 안전
+    data = data.replace(b'<&>', b'X')  # <&> → X로 치환
+    data = data.replace(b'<>', b'XX')  # <> → XX로 치환
 
+    # 임시 이름에 쓴 뒤 os.replace로 교체 (디코딩/재인코딩 없이 그대로 기록, 쓰다 만 파일을 읽지 않도록)
+    fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(processed_path), suffix='.part')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(partial_path, processed_path)
+    return processed_path
 
-def preprocess_dxf_content(file_path):
-    """
-    DXF 파일 내용을 전처리하여 특수문자 문제를 해결합니다.
-    블록명에 <&> 등 ezdxf가 처리할 수 없는 문자가 있으면 치환합니다.
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _dxf_needs_preprocess(_file_path, content_key):
+    """특수문자 치환이 필요한지 판별 (content_key는 캐시 키 용도 - 바이트 단위로 확인하여 전체 디코딩 생략)"""
+    try:
+        with open(_file_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False  # 읽기 실패 시 원본 그대로 사용
+    return b'<&>' in data or b'<>' in data
+
+
+def _sniff_dxf_encoding(file_path):
     """
-    import tempfile
-    import os
+    DXF 파일 앞부분(4KB)만 읽어 readfile에 넘길 인코딩을 결정합니다.
 
-    # 파일 읽기 (CP949 우선)
-    content = None
-    for encoding in ['cp949', 'utf-8', 'latin-1']:
-        try:
-            with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-                content = f.read()
-            break
-        except:
-            continue
+    Returns:
+        str 또는 None (None이면 ezdxf 자동 판별 - 바이너리 DXF 등)
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(4096)
+    except OSError:
+        return None
+    if head.startswith(b'AutoCAD Binary DXF'):
+        return None
+    if head.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8'
+    return 'cp949'  # 한글 인코딩(CP949) 우선
 
-    if content is None:
-        return file_path  # 읽기 실패 시 원본 반환
 
-    # 특수문자 치환이 필요한지 확인
-    if '<&>' not in content and '<>' not in content:
-        return file_path  # 치환 불필요
+def _read_dxf(file_path):
+    """인코딩을 한 번만 판별하여 DXF를 읽습니다. (실패 후 전체 재읽기 없음)"""
+    # 앞부분 4KB만 읽으므로 별도 캐시 없이 매번 판별
+    encoding = _sniff_dxf_encoding(file_path)
+    if encoding:
+        return ezdxf.readfile(file_path, encoding=encoding)
+    return ezdxf.readfile(file_path)
 
-    # 특수문자 치환 (블록명에서 문제가 되는 문자들)
-    content = content.replace('<&>', 'X')  # <&> → X로 치환
-    content = content.replace('<>', 'XX')  # <> → XX로 치환
 
-    # 임시 파일로 저장
-    temp_dir = tempfile.gettempdir()
-    temp_filename = os.path.join(temp_dir, f'dxf_preprocessed_{os.path.basename(file_path)}')
-    with open(temp_filename, 'w', encoding='cp949', errors='ignore') as f:
-        f.write(content)
+def _scan_dxf_tags(file_path):
+    """
+    DXF 태그 스트림만 읽어 사이즈 스캔에 필요한 정보를 추출합니다. (엔티티 DOM 생성 없음)
 
-    return temp_filename
+    Returns:
+        (모델스페이스 TEXT 목록, INSERT 블록명 목록, {블록명: 블록 내 TEXT 목록})
+    """
+    from ezdxf.lldxf.tagger import ascii_tags_loader
+
+    msp_texts = []
+    insert_names = []
+    block_texts = {}
+    section = None
+    current_block = None
+    entity = None  # [타입, 그룹코드 2 값, 그룹코드 1 값, 페이퍼스페이스 여부]
+
+    def flush(entity):
+        nonlocal section, current_block
+        if entity is None:
+            return
+        etype, name, text, paperspace = entity
+        if etype == 'SECTION':
+            section = name
+        elif etype == 'ENDSEC':
+            section = None
+        elif etype == 'BLOCK':
+            current_block = name
+            block_texts.setdefault(name, [])
+        elif etype == 'ENDBLK':
+            current_block = None
+        elif section == 'ENTITIES' and not paperspace:
+            if etype == 'TEXT' and text is not None:
+                msp_texts.append(text)
+            elif etype == 'INSERT' and name:
+                insert_names.append(name)
+        elif section == 'BLOCKS' and current_block is not None:
+            if etype == 'TEXT' and text is not None:
+                block_texts[current_block].append(text)
+
+    with open(file_path, 'r', encoding='cp949', errors='ignore') as f:
+        for tag in ascii_tags_loader(f):
+            code = tag.code
+            if code == 0:
+                flush(entity)
+                entity = [tag.value, None, None, False]
+            elif entity is None:
+                continue
+            elif code == 2 and entity[1] is None:
+                entity[1] = tag.value
+            elif code == 1 and entity[2] is None:
+                entity[2] = tag.value
+            elif code == 67:
+                entity[3] = str(tag.value).strip() == '1'
+        flush(entity)
+
+    return msp_texts, insert_names, block_texts
+
+
+def _scan_dxf_doc(file_path):
+    """_scan_dxf_tags와 같은 결과를 ezdxf 전체 파싱으로 얻습니다. (태그 스캔 실패 시 폴백)"""
+    doc = _read_dxf(file_path)
+
+    msp = doc.modelspace()
+    msp_texts = [e.dxf.text for e in msp if e.dxftype() == 'TEXT']
+    insert_names = [e.dxf.name for e in msp if e.dxftype() == 'INSERT']
+    block_texts = {}
+    for name in set(insert_names):
+        try:
+            block_texts[name] = [be.dxf.text for be in doc.blocks.get(name) if be.dxftype() == 'TEXT']
+        except:
+            pass
+    return msp_texts, insert_names, block_texts
 
 
-def scan_dxf_sizes(file_path):
+def scan_dxf_sizes(file_path, digest=None):
     """
     DXF 파일에서 사이즈 목록만 빠르게 스캔합니다.
     전체 파싱 없이 사이즈 정보만 추출하여 선택 UI에 사용합니다.
 
+    Args:
+        file_path: DXF 파일 경로
+        digest: 파일 내용 해시 (전처리 캐시 키, 없으면 경로/수정시각 기준)
+
     Returns:
         tuple: (사이즈 목록, 기준사이즈) - 기준사이즈가 없으면 중간 사이즈
     """
-    import re
-
     sizes = set()
     base_size = None  # 기준사이즈
 
     try:
         # 특수문자 전처리
-        processed_path = preprocess_dxf_content(file_path)
+        processed_path = preprocess_dxf_content(file_path, digest)
 
-        # 한글 인코딩(CP949) 우선 시도
+        # 태그 스트림 스캔 우선 (바이너리 DXF 등 실패 시 전체 파싱)
         try:
-            doc = ezdxf.readfile(processed_path, encoding='cp949')
-        except:
-            doc = ezdxf.readfile(processed_path)
-
-        msp = doc.modelspace()
+            msp_texts, insert_names, block_texts = _scan_dxf_tags(processed_path)
+        except Exception:
+            msp_texts, insert_names, block_texts = _scan_dxf_doc(processed_path)
 
         # 방법 0: modelspace 직접 TEXT에서 기준사이즈 추출
-        for entity in msp:
-            if entity.dxftype() == 'TEXT' and not base_size:
-                text = entity.dxf.text
+        for text in msp_texts:
+            if base_size:
+                break
+            text_upper = text.upper().strip()
+            if text_upper.startswith(BASE_SIZE_PREFIX_TUPLE):
+                base_val = text.split(':', 1)[1].strip().upper()
+                if base_val:
+                    # 영문/숫자만 추출 (예: "M축적용" → "M")
+                    base_size = extract_english_size(base_val)
+
+        # 방법 1: INSERT 블록에서 사이즈 추출
+        for block_name in insert_names:
+            # 블록명에서 사이즈 추출 (예: BLK_1_XS, 앞판_M)
+            if '_' in block_name:
+                _, potential_size = block_name.rsplit('_', 1)
+                if _SCAN_SIZE_RE.match(potential_size):
+                    sizes.add(potential_size.upper())
+
+            # 블록 내 TEXT에서 SIZE: 및 기준사이즈 필드 추출
+            for text in block_texts.get(block_name, []):
                 text_upper = text.upper().strip()
-                for prefix in BASE_SIZE_PREFIXES:
-                    if text_upper.startswith(prefix):
+                if text_upper.startswith('SIZE:'):
+                    size_val = text.split(':', 1)[1].strip()
+                    if size_val:
+                        # 영문/숫자만 추출 (예: "S축적용" → "S")
+                        size_val = extract_english_size(size_val)
+                        sizes.add(size_val.upper())
+                # 기준사이즈 추출 (여러 패턴 지원)
+                elif not base_size:
+                    if text_upper.startswith(BASE_SIZE_PREFIX_TUPLE):
                         base_val = text.split(':', 1)[1].strip().upper()
                         if base_val:
-                            # 영문/숫자만 추출 (예: "M축적용" → "M")
+                            # 영문/숫자만 추출
                             base_size = extract_english_size(base_val)
-                        break
-
-        # 방법 1: INSERT 블록에서 사이즈 추출
-        for entity in msp:
-            if entity.dxftype() == 'INSERT':
-                block_name = entity.dxf.name
-
-                # 블록명에서 사이즈 추출 (예: BLK_1_XS, 앞판_M)
-                if '_' in block_name:
-                    _, potential_size = block_name.rsplit('_', 1)
-                    if re.match(r'^([0-9]*X{1,3}L?|[SML]|XS|\d{2,3})$', potential_size, re.IGNORECASE):
-                        sizes.add(potential_size.upper())
-
-                # 블록 내 TEXT에서 SIZE: 및 기준사이즈 필드 추출
-                try:
-                    block = doc.blocks.get(block_name)
-                    for be in block:
-                        if be.dxftype() == 'TEXT':
-                            text = be.dxf.text
-                            text_upper = text.upper().strip()
-                            if text_upper.startswith('SIZE:'):
-                                size_val = text.split(':', 1)[1].strip()
-                                if size_val:
-                                    # 영문/숫자만 추출 (예: "S축적용" → "S")
-                                    size_val = extract_english_size(size_val)
-                                    sizes.add(size_val.upper())
-                            # 기준사이즈 추출 (여러 패턴 지원)
-                            elif not base_size:
-                                for prefix in BASE_SIZE_PREFIXES:
-                                    if text_upper.startswith(prefix):
-                                        base_val = text.split(':', 1)[1].strip().upper()
-                                        if base_val:
-                                            # 영문/숫자만 추출
-                                            base_size = extract_english_size(base_val)
-                                        break
-                except:
-                    pass
     except Exception as e:
         st.error(f"사이즈 스캔 오류: {e}")
         return [], None
@@ -1765,27 +2254,107 @@ def scan_dxf_sizes(file_path):
     return sorted_sizes, base_size
 
 
-@st.cache_data
-def process_dxf(file_path, selected_sizes=None):
+def _stage_upload(uploaded_file, chunk_size=1 << 20):
+    """
+    업로드 파일을 1MB 단위로 읽어 내용 해시를 구하고, 세션 전용 임시 파일에 업로드당 1회만 기록합니다.
+    (getvalue() 전체 복사 없음 - 사이즈 스캔과 패턴 로딩이 같은 파일을 공유하며,
+     세션마다 고유 파일이므로 다른 세션이 지우거나 덮어쓰지 않음)
+    파일은 업로드가 바뀔 때 discard_staged_upload()로 삭제합니다.
+
+    Returns:
+        (digest, tmp_path) - digest는 st.cache_data 캐시 키 용도
+    """
+    h = hashlib.blake2b(digest_size=8)
+    uploaded_file.seek(0)
+    for chunk in iter(partial(uploaded_file.read, chunk_size), b''):
+        h.update(chunk)
+    digest = h.hexdigest()
+
+    staged = st.session_state.get('staged_upload')
+    if staged is not None and staged[0] == digest and os.path.exists(staged[1]):
+        uploaded_file.seek(0)
+        return staged
+
+    discard_staged_upload()
+    uploaded_file.seek(0)
+    with tempfile.NamedTemporaryFile(prefix='dxf_upload_', suffix='.dxf', delete=False) as f:
+        shutil.copyfileobj(uploaded_file, f, length=chunk_size)
+    uploaded_file.seek(0)
+    st.session_state.staged_upload = (digest, f.name)
+    return digest, f.name
+
+
+def discard_staged_upload():
+    """_stage_upload로 기록한 세션 전용 임시 파일(및 전처리본)을 삭제합니다."""
+    staged = st.session_state.pop('staged_upload', None)
+    if staged is None:
+        return
+    for path in (staged[1], preprocessed_dxf_path(staged[1])):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_scan_sizes(name, size, digest, _tmp_path):
+    """
+    업로드 파일 내용(digest) 기준으로 scan_dxf_sizes 결과를 캐시합니다.
+    (같은 파일 재업로드/리런 시 사이즈 스캔 생략, _tmp_path는 패턴 로딩과 공유하는 세션 임시 파일)
+    """
+    return scan_dxf_sizes(_tmp_path, digest)
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_load_patterns(name, size, digest, _tmp_path, sizes_tuple):
+    """
+    업로드 파일 내용(digest) + 선택 사이즈 기준으로 패턴 로딩 결과를 캐시합니다.
+    (_tmp_path는 사이즈 스캔 때 기록한 세션 임시 파일 - 다시 기록하지 않음)
+
+    Returns:
+        (patterns, 기준사이즈, 스타일번호, {pattern_group: 수량}, {pattern_group: 원단명})
+        - 기준사이즈가 선택되지 않은 경우 기준사이즈 패턴을 별도 로드하여 수량/원단 정보 수집
+    """
+    patterns, detected_base_size = process_dxf(_tmp_path, sizes_tuple, digest)
+    style_no = extract_style_no(_tmp_path)
+
+    base_size_quantities = {}  # {pattern_group: quantity}
+    base_size_fabrics = {}  # {pattern_group: fabric_name}
+    if detected_base_size and (sizes_tuple is None or detected_base_size not in sizes_tuple):
+        # 기준사이즈가 선택되지 않았으므로 별도 로드
+        base_patterns, _ = process_dxf(_tmp_path, (detected_base_size,), digest)
+        for p_data in base_patterns:
+            pattern_group = p_data[4]
+            fabric_name = p_data[2]
+            dxf_quantity = p_data[6]
+            if pattern_group:
+                if dxf_quantity > 0:
+                    base_size_quantities[pattern_group] = dxf_quantity
+                if fabric_name:
+                    base_size_fabrics[pattern_group] = fabric_name
+    return patterns, detected_base_size, style_no, base_size_quantities, base_size_fabrics
+
+
+def process_dxf(file_path, selected_sizes=None, digest=None):
     """
-    DXF 파일을 읽어 (Polygon, 패턴이름, 원단명, 사이즈) 튜플 리스트를 반환합니다.
+    DXF 파일을 읽어 패턴 튜플 리스트를 반환합니다.
     블록(INSERT) 기반으로 처리하여 패턴 누락을 방지합니다.
 
     Args:
         file_path: DXF 파일 경로
         selected_sizes: 선택된 사이즈 목록 (None이면 전체 로딩)
-    """
-    import re
+        digest: 파일 내용 해시 (전처리 캐시 키, 없으면 경로/수정시각 기준)
 
+    Returns:
+        (patterns, ...) - patterns의 각 항목은 항상 9개 필드 튜플:
+        (poly, pattern_name, fabric_name, size_name, pattern_group, piece_name,
+         dxf_quantity, grainline_info 또는 None, interior_lines 또는 [])
+    """
     try:
         # 특수문자 전처리 (블록명에 <&> 등이 있으면 치환)
-        processed_path = preprocess_dxf_content(file_path)
+        processed_path = preprocess_dxf_content(file_path, digest)
 
-        # 한글 인코딩(CP949) 우선 시도
-        try:
-            doc = ezdxf.readfile(processed_path, encoding='cp949')
-        except:
-            doc = ezdxf.readfile(processed_path)
+        doc = _read_dxf(processed_path)
 
         msp = doc.modelspace()
 
@@ -1811,17 +2380,16 @@ def process_dxf(file_path, selected_sizes=None):
             if entity.dxftype() == 'TEXT':
                 text = entity.dxf.text
                 text_upper = text.upper().strip()
-                for prefix in BASE_SIZE_PREFIXES:
-                    if text_upper.startswith(prefix):
-                        base_val = text.split(':', 1)[1].strip()
-                        if base_val and not detected_base_size:
-                            detected_base_size = base_val
-                        break
+                if text_upper.startswith(BASE_SIZE_PREFIX_TUPLE):
+                    base_val = text.split(':', 1)[1].strip()
+                    if base_val and not detected_base_size:
+                        detected_base_size = base_val
             if detected_base_size:
                 break
 
         # 방법 1: INSERT 블록 기반 추출 (YUKA CAD 등)
         insert_count = 0
+        grain_cache = {}  # 블록명 -> detect_grainline 결과 (블록 좌표계, INSERT별 회전 적용 전)
         for entity in msp:
             if entity.dxftype() == 'INSERT':
                 insert_count += 1
@@ -1844,7 +2412,7 @@ def process_dxf(file_path, selected_sizes=None):
                     if '_' in block_name:
                         base_name, potential_size = block_name.rsplit('_', 1)
                         # 사이즈 패턴: S, M, L, XS, XL, XXL, 2XL, 3XL, 0X, 1X, 00X, 85, 90 등
-                        if re.match(r'^([0-9]*X{1,2}L?|[SML]|XS|\d{2,3})$', potential_size, re.IGNORECASE):
+                        if _BLOCK_SIZE_RE.match(potential_size):
                             size_name = potential_size
                             pattern_group = base_name  # 사이즈 앞부분 전체를 그룹으로 사용
                         else:
@@ -1858,40 +2426,28 @@ def process_dxf(file_path, selected_sizes=None):
                         pass
 
                     # 블록 내 가장 큰 닫힌 POLYLINE 선택 + 텍스트 추출
+                    # 닫힌 폴리라인 좌표는 모아두었다가 블록당 1회 일괄 폴리곤 생성
+                    ring_parts = []
                     for be in block:
-                        if be.dxftype() == 'POLYLINE' and be.is_closed:
-                            pts = list(be.points())
-                            if len(pts) >= 3:
-                                coords = [(p[0], p[1]) for p in pts]
-                                poly = Polygon(coords)
-                                # 유효하지 않은 폴리곤은 buffer(0)으로 수정 시도
-                                if not poly.is_valid:
-                                    poly = poly.buffer(0)
-                                if poly.is_valid and poly.area > max_area:
-                                    max_area = poly.area
-                                    max_poly = poly
-                        elif be.dxftype() == 'LWPOLYLINE' and be.closed:
-                            pts = list(be.points())
+                        if (be.dxftype() == 'POLYLINE' and be.is_closed) or (be.dxftype() == 'LWPOLYLINE' and be.closed):
+                            pts = [(p[0], p[1]) for p in be.points()]
                             if len(pts) >= 3:
-                                coords = [(p[0], p[1]) for p in pts]
-                                poly = Polygon(coords)
-                                # 유효하지 않은 폴리곤은 buffer(0)으로 수정 시도
-                                if not poly.is_valid:
-                                    poly = poly.buffer(0)
-                                if poly.is_valid and poly.area > max_area:
-                                    max_area = poly.area
-                                    max_poly = poly
+                                ring_parts.append(np.asarray(pts, dtype=np.float64))
                         elif be.dxftype() == 'TEXT':
                             text = be.dxf.text
 
                             # PIECE NAME / PIECE 필드에서 패턴 번호/이름 추출 (대소문자 무시)
+                            # 'KEY:값' 형식 - 첫 ':' 앞의 키를 한 번만 잘라 비교
                             text_upper = text.upper()
-                            if text_upper.startswith('PIECE NAME:'):
+                            field, has_sep, _ = text_upper.partition(':')
+                            if not has_sep:
+                                pass  # 필드 형식이 아닌 TEXT는 무시
+                            elif field == 'PIECE NAME':
                                 piece_val = text.split(':', 1)[1].strip()
                                 if piece_val:
                                     piece_name = piece_val
                             # TIIP 형식: PIECE: (PIECE NAME: 없이)
-                            elif text_upper.startswith('PIECE:') and not text_upper.startswith('PIECE NAME:'):
+                            elif field == 'PIECE':
                                 piece_val = text.split(':', 1)[1].strip()
                                 if piece_val:
                                     piece_name = piece_val
@@ -1900,46 +2456,44 @@ def process_dxf(file_path, selected_sizes=None):
                                         pattern_name = piece_val
 
                             # QUANTITY 필드에서 원본 수량 추출 (대소문자 무시)
-                            elif text_upper.startswith('QUANTITY:') or text_upper.startswith('QTY:'):
+                            elif field in ('QUANTITY', 'QTY'):
                                 qty_val = text.split(':', 1)[1].strip()
                                 if qty_val and qty_val.isdigit():
                                     dxf_quantity = int(qty_val)
 
                             # SIZE 필드에서 사이즈 추출 (대소문자 무시)
-                            elif text_upper.startswith('SIZE:'):
+                            elif field == 'SIZE':
                                 size_val = text.split(':', 1)[1].strip()
                                 if size_val:
                                     # 영문/숫자만 추출 (예: "S축적용" → "S")
                                     size_name = extract_english_size(size_val)
 
                             # CATEGORY 필드에서 원단명 추출 (대소문자 무시)
-                            elif text_upper.startswith('CATEGORY:'):
+                            elif field == 'CATEGORY':
                                 cat_val = text.split(':', 1)[1].strip()
                                 if cat_val:
                                     # 매핑된 원단명 찾기
-                                    for key, mapped in FABRIC_MAP.items():
-                                        if key.upper() == cat_val.upper() or key == cat_val:
-                                            fabric_name = mapped
-                                            break
+                                    mapped = FABRIC_MAP_UPPER.get(cat_val.upper())
+                                    if mapped:
+                                        fabric_name = mapped
                                     # 매핑 안 되면 기본값 "겉감" 사용
                                     if not fabric_name:
                                         fabric_name = "겉감"
 
                             # TIIP 형식: FABRIC 필드에서 원단명 추출
-                            elif text_upper.startswith('FABRIC:'):
+                            elif field == 'FABRIC':
                                 fab_val = text.split(':', 1)[1].strip()
                                 if fab_val:
                                     # 매핑된 원단명 찾기
-                                    for key, mapped in FABRIC_MAP.items():
-                                        if key.upper() == fab_val.upper() or key == fab_val:
-                                            fabric_name = mapped
-                                            break
+                                    mapped = FABRIC_MAP_UPPER.get(fab_val.upper())
+                                    if mapped:
+                                        fabric_name = mapped
                                     # 매핑 안 되면 원본값 사용 (빈 문자열이면 기본값)
                                     if not fabric_name and fab_val:
                                         fabric_name = fab_val
 
                             # ANNOTATION 필드 처리 (대소문자 무시)
-                            elif text_upper.startswith('ANNOTATION:'):
+                            elif field == 'ANNOTATION':
                                 val = text.split(':', 1)[1].strip()
                                 if not val:
                                     continue
@@ -1970,8 +2524,7 @@ def process_dxf(file_path, selected_sizes=None):
                                 if val[0].isdigit():
                                     continue
                                 # 원단명 (이미 위에서 처리됨)
-                                fabric_keywords = ['LINING', 'SHELL', 'INTERLINING', '안감', '겉감', '심지']
-                                if val.upper() in [f.upper() for f in fabric_keywords]:
+                                if val_upper in _ANNOTATION_FABRIC_KEYWORDS:
                                     continue
                                 # 배색 관련
                                 if '배색' in val:
@@ -1983,14 +2536,14 @@ def process_dxf(file_path, selected_sizes=None):
                                 if '(' in val or ')' in val:
                                     continue
                                 # 한글 부위명 우선 (한글이 포함되면 우선 선택)
-                                has_korean = any('\uac00' <= c <= '\ud7a3' for c in val)
+                                has_korean = _HANGUL_RE.search(val) is not None
                                 if has_korean:
                                     pattern_name = val  # 한글 부위명 덮어쓰기
                                 elif not pattern_name:
                                     pattern_name = val  # 영문 부위명 (한글 없을 때만)
 
                             # TIIP 형식: COMMENT 필드 처리 (ANNOTATION과 유사)
-                            elif text_upper.startswith('COMMENT:'):
+                            elif field == 'COMMENT':
                                 val = text.split(':', 1)[1].strip()
                                 if not val:
                                     continue
@@ -2008,13 +2561,28 @@ def process_dxf(file_path, selected_sizes=None):
                                 if len(val) > 15:  # COMMENT는 설명이 길 수 있음
                                     continue
                                 # 괄호 안 내용 제거 후 패턴명으로 사용
-                                clean_val = re.sub(r'\([^)]*\)', '', val).strip()
+                                clean_val = _PAREN_RE.sub('', val).strip()
                                 if clean_val and not pattern_name:
                                     # 한글이 포함된 짧은 이름만 패턴명으로
-                                    has_korean = any('\uac00' <= c <= '\ud7a3' for c in clean_val)
+                                    has_korean = _HANGUL_RE.search(clean_val) is not None
                                     if has_korean and len(clean_val) <= 10:
                                         pattern_name = clean_val
 
+                    if ring_parts:
+                        counts = [len(part) for part in ring_parts]
+                        rings = shapely.linearrings(np.concatenate(ring_parts),
+                                                    indices=np.repeat(np.arange(len(ring_parts)), counts))
+                        polys = shapely.polygons(rings)
+                        # 유효하지 않은 폴리곤은 buffer(0)으로 수정 시도
+                        invalid = ~shapely.is_valid(polys)
+                        if invalid.any():
+                            polys[invalid] = shapely.buffer(polys[invalid], 0)
+                        areas = np.where(shapely.is_valid(polys), shapely.area(polys), 0.0)
+                        best_idx = int(np.argmax(areas))
+                        if areas[best_idx] > max_area:
+                            max_area = float(areas[best_idx])
+                            max_poly = polys[best_idx]
+
                     # 닫힌 POLYLINE/LWPOLYLINE이 없으면 열린 선분들을 연결하여 폴리곤 생성
                     if not max_poly:
                         block_lines = []
@@ -2083,13 +2651,17 @@ def process_dxf(file_path, selected_sizes=None):
                                     rounded_coords = [(round(x, 2), round(y, 2)) for x, y in coords]
                                     rounded_lines.append(LineString(rounded_coords))
 
-                                polygons_from_lines = list(polygonize(rounded_lines))
-                                for poly in polygons_from_lines:
-                                    if not poly.is_valid:
-                                        poly = poly.buffer(0)
-                                    if poly.is_valid and poly.area > max_area:
-                                        max_area = poly.area
-                                        max_poly = poly
+                                polys = np.array(list(polygonize(rounded_lines)), dtype=object)
+                                if len(polys):
+                                    # 유효성/면적 일괄 계산 후 최대 면적 폴리곤 선택
+                                    invalid = ~shapely.is_valid(polys)
+                                    if invalid.any():
+                                        polys[invalid] = shapely.buffer(polys[invalid], 0)
+                                    areas = np.where(shapely.is_valid(polys), shapely.area(polys), 0.0)
+                                    best_idx = int(np.argmax(areas))
+                                    if areas[best_idx] > max_area:
+                                        max_area = float(areas[best_idx])
+                                        max_poly = polys[best_idx]
                             except Exception as e:
                                 pass  # 폴리곤 생성 실패
 
@@ -2251,24 +2823,22 @@ def process_dxf(file_path, selected_sizes=None):
                         # 그레인라인 감지 및 패턴 회전 (수직 정렬)
                         grainline_info = None  # (start, end) 좌표
                         rotation_applied = 0
-                        grainline_angle, gl_start, gl_end = detect_grainline(block, return_coords=True, polygon=max_poly)
+                        if block_name not in grain_cache:
+                            grain_cache[block_name] = detect_grainline(block, return_coords=True, polygon=max_poly)
+                        grainline_angle, gl_start, gl_end = grain_cache[block_name]
                         if grainline_angle is not None and gl_start and gl_end:
-                            # 패턴 회전
-                            centroid = (max_poly.centroid.x, max_poly.centroid.y)
-                            max_poly, rotation_applied = rotate_polygon_to_vertical_grain(max_poly, grainline_angle)
-                            # 그레인라인 좌표도 함께 회전
-                            gl_start, gl_end = rotate_grainline_coords(gl_start, gl_end, rotation_applied, centroid)
+                            # 패턴 회전 (같은 행렬을 그레인라인/내부선에 재사용)
+                            max_poly, rotation_applied, rot_matrix = rotate_polygon_to_vertical_grain(
+                                max_poly, grainline_angle, return_matrix=True
+                            )
+                            if rot_matrix is not None:
+                                # 그레인라인 좌표도 함께 회전
+                                gl_start, gl_end = apply_affine_to_points((gl_start, gl_end), rot_matrix)
+                                # 내부선도 함께 회전
+                                if interior_lines:
+                                    interior_lines = [apply_affine_to_points(line_coords, rot_matrix)
+                                                      for line_coords in interior_lines]
                             grainline_info = (gl_start, gl_end)
-                            # 내부선도 함께 회전
-                            if interior_lines and abs(rotation_applied) > 0.1:
-                                rotated_interior = []
-                                for line_coords in interior_lines:
-                                    rotated_line = []
-                                    for px, py in line_coords:
-                                        new_start, new_end = rotate_grainline_coords((px, py), (px, py), rotation_applied, centroid)
-                                        rotated_line.append(new_start)
-                                    rotated_interior.append(rotated_line)
-                                interior_lines = rotated_interior
 
                         # 단위 스케일 적용 (인치 → cm 변환)
                         if unit_scale != 1.0:
@@ -2296,17 +2866,38 @@ def process_dxf(file_path, selected_sizes=None):
         # 방법 2: INSERT가 없으면 기존 방식 (레거시 DXF 호환)
         if not final:
             lines = []
+            closed_polys = []  # 이미 닫힌 폴리라인은 polygonize 없이 바로 폴리곤으로
+            block_cache = {}  # 블록 이름 -> 평탄화된 선분 (블록 좌표계)
             for e in msp:
-                extract_lines(e, lines)
+                dxftype = e.dxftype()
+                if (dxftype == 'LWPOLYLINE' and e.closed) or (dxftype == 'POLYLINE' and e.is_closed):
+                    try:
+                        ring = [(round(pt[0], 1), round(pt[1], 1)) for pt in e.points()]
+                        if len(ring) >= 3:
+                            ring_poly = Polygon(ring)
+                            # 유효하지 않은 폴리곤은 buffer(0)으로 수정 시도
+                            if not ring_poly.is_valid:
+                                ring_poly = ring_poly.buffer(0)
+                            if ring_poly.is_valid and ring_poly.geom_type == 'Polygon' and ring_poly.area > 0:
+                                closed_polys.append(ring_poly)
+                                continue
+                    except Exception:
+                        pass  # 실패 시 선분 경로로 처리
+                extract_lines(e, lines, block_cache)
 
             rounded_lines = []
             for line in lines:
-                coords = list(line.coords)
-                rounded_coords = [(round(x, 1), round(y, 1)) for x, y in coords]
-                rounded_lines.append(LineString(rounded_coords))
+                coords = np.round(np.asarray(line.coords), 1)
+                rounded_lines.append(LineString(coords))
 
-            merged_lines = linemerge(rounded_lines)
-            raw_polys = list(polygonize(merged_lines))
+            # 열린 선분만 linemerge + polygonize (전역 면 분할 계산)
+            if rounded_lines:
+                merged_lines = linemerge(rounded_lines)
+                raw_polys = list(polygonize(merged_lines))
+            else:
+                merged_lines = None
+                raw_polys = []
+            raw_polys.extend(closed_polys)
 
             # 열린 선분 강제 닫기
             if hasattr(merged_lines, 'geoms'):
@@ -2332,32 +2923,408 @@ def process_dxf(file_path, selected_sizes=None):
             candidates.sort(key=lambda x: x.area, reverse=True)
 
             # 레거시 방식에서만 중복 제거 (패턴 이름/원단명/사이즈/그룹 없음 → 기본값)
-            added_polys = []
+            # 중심점 50 단위 격자 버킷: 인접 9칸만 검사하여 O(N²) 비교 제거
+            added_buckets = {}
+            line_index = build_line_index(msp)  # 그레인라인 검색용 LINE 공간 인덱스 (파일당 1회)
             for idx, p in enumerate(candidates):
-                if not any(p.centroid.distance(e.centroid) < 50 for e in added_polys):
+                c = p.centroid
+                gx, gy = int(math.floor(c.x / 50)), int(math.floor(c.y / 50))
+                is_dup = any(
+                    math.hypot(c.x - ex, c.y - ey) < 50
+                    for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                    for ex, ey in added_buckets.get((gx + dx, gy + dy), ())
+                )
+                if not is_dup:
                     # 그레인라인 감지 및 패턴 회전 (수직 정렬) - 레거시 방식
-                    grainline_angle = detect_grainline_for_polygon(msp, p)
+                    grainline_angle = detect_grainline_for_polygon(msp, p, line_index)
                     grainline_info = None
                     if grainline_angle is not None:
-                        centroid = (p.centroid.x, p.centroid.y)
                         p, _ = rotate_polygon_to_vertical_grain(p, grainline_angle)
                     # 단위 스케일 적용 (인치 → cm 변환)
                     if unit_scale != 1.0:
                         from shapely import affinity
                         p = affinity.scale(p, xfact=unit_scale, yfact=unit_scale, origin=(0, 0))
 
-                    added_polys.append(p)
+                    ac = p.centroid
+                    added_buckets.setdefault(
+                        (int(math.floor(ac.x / 50)), int(math.floor(ac.y / 50))), []
+                    ).append((ac.x, ac.y))
                     # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, piece_name, dxf_qty, grainline_info, interior_lines)
                     final.append((p, "", "겉감", "", str(idx + 1), "", 0, grainline_info, []))
 
-        # 면적 기준 정렬 (큰 것부터)
-        final.sort(key=lambda x: x[0].area, reverse=True)
+        # 면적 기준 정렬 (큰 것부터) - 면적은 일괄 계산, 동일 면적은 기존 순서 유지
+        if final:
+            areas = shapely.area(np.array([t[0] for t in final], dtype=object))
+            order = np.argsort(-areas, kind='stable')
+            final = [final[j] for j in order]
         return final, detected_base_size
 
     except Exception:
         return [], None
 
 
+def buffered_area_m2(df):
+    """
+    버퍼 포함 면적 (m² 단위) 열 계산
+    원본 면적(면적_raw) + 상하(가로 × 버퍼높이) + 좌우(세로 × 버퍼폭) + 모서리 4곳
+    버퍼 컬럼(mm)이 없으면 0으로 간주합니다.
+    """
+    def buf(col):
+        return df[col].to_numpy(dtype=float) if col in df.columns else 0.0
+
+    w_mm = df['가로(cm)'].to_numpy(dtype=float) * 10  # 가로 (mm)
+    h_mm = df['세로(cm)'].to_numpy(dtype=float) * 10  # 세로 (mm)
+    buf_top, buf_bottom = buf('버퍼_상'), buf('버퍼_하')
+    buf_left, buf_right = buf('버퍼_좌'), buf('버퍼_우')
+
+    # 버퍼 추가 면적 (mm²)
+    buffer_area_mm2 = (
+        w_mm * (buf_top + buf_bottom) +
+        h_mm * (buf_left + buf_right) +
+        buf_top * buf_left + buf_top * buf_right +
+        buf_bottom * buf_left + buf_bottom * buf_right
+    )
+    return df['면적_raw'].to_numpy(dtype=float) + buffer_area_mm2 / 1_000_000
+
+
+def _hash_frame(d):
+    """st.cache_data용 DataFrame 해시 (컬럼명 + 인덱스 포함 행 해시를 순서대로 연결 - 행 순서가 바뀌어도 구분)"""
+    row_hashes = pd.util.hash_pandas_object(d, index=True).to_numpy().tobytes()
+    return (tuple(d.columns), hashlib.blake2b(row_hashes, digest_size=16).digest())
+
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs={pd.DataFrame: _hash_frame})
+def compute_yield_table(df, fabric_settings, selected_sizes):
+    """
+    원단(·사이즈)별 필요 요척 표 계산
+
+    Args:
+        df: '원단', '사이즈', '면적_버퍼포함'(m²), '수량' 컬럼을 가진 DataFrame
+        fabric_settings: {원단명: {'width', 'unit', 'loss'}}
+        selected_sizes: 선택 사이즈 튜플 (비어 있으면 원단 전체 합산, 사이즈는 "")
+
+    Returns:
+        DataFrame [원단, 사이즈, 폭, 단위, 효율, YD]
+        - 원단 오름차순, 같은 원단 안에서는 selected_sizes 순서
+        - 사이즈별 모드에서는 해당 원단에 존재하는 사이즈만 포함
+    """
+    frame = pd.DataFrame({
+        '원단': df['원단'].to_numpy(),
+        '사이즈': df['사이즈'].to_numpy(),
+        '면적': df['면적_버퍼포함'].to_numpy() * df['수량'].to_numpy(),
+    })
+
+    if selected_sizes:
+        size_rank = {size: i for i, size in enumerate(selected_sizes)}
+        frame = frame[frame['사이즈'].isin(list(selected_sizes))]
+        table = frame.groupby(['원단', '사이즈'], sort=False)['면적'].sum().reset_index()
+        table['_rank'] = table['사이즈'].map(size_rank)
+        table = table.sort_values(['원단', '_rank'], kind='stable').drop(columns='_rank')
+    else:
+        table = frame.groupby('원단')['면적'].sum().reset_index()
+        table['사이즈'] = ""
+    table = table.reset_index(drop=True)
+
+    # 원단별 설정 (기본: 58in, 로스 15%)
+    settings = [fabric_settings.get(f, {}) for f in table['원단']]
+    width = np.array([s.get('width', 58.0) for s in settings], dtype=float)
+    unit = np.array([s.get('unit', 'in') for s in settings], dtype=object)
+    loss = np.array([s.get('loss', 15) for s in settings], dtype=float)
+
+    # 면적(m²) / 원단폭(m) / 효율 → 야드 변환 (폭이 0 이하면 0)
+    # 원단별 환산계수(YD/m²)를 먼저 만들고 면적 배열에 한 번 곱함
+    width_m = width * np.where(unit == "cm", 0.01, UNIT_SCALE_INCH_TO_CM / 100)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yd_per_m2 = (100 * YARDS_PER_METER) / (width_m * (100 - loss))
+    yd = np.where(width > 0, table['면적'].to_numpy(dtype=np.float64) * yd_per_m2, 0.0)
+
+    return pd.DataFrame({
+        '원단': table['원단'],
+        '사이즈': table['사이즈'],
+        '폭': width,
+        '단위': unit,
+        '효율': [100 - s.get('loss', 15) for s in settings],
+        'YD': yd,
+    })
+
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs={pd.DataFrame: _hash_frame})
+def build_yield_excel(detail_df, yield_df, file_name, style_no):
+    """
+    요척 엑셀 파일(bytes) 생성: 시트1 상세리스트, 시트2 요척결과
+    두 시트 모두 맨 앞에 파일명, 스타일번호 컬럼을 추가합니다.
+    """
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        for sheet_df, sheet_name in ((detail_df, '상세리스트'), (yield_df, '요척결과')):
+            sheet_df = sheet_df.copy()
+            sheet_df.insert(0, "스타일번호", style_no)
+            sheet_df.insert(0, "파일명", file_name)
+            sheet_df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return excel_buffer.getvalue()
+
+
+def build_display_df(patterns, df, base_indices):
+    """
+    상세 리스트 편집기용 표 생성 (기본 사이즈 행만)
+    형상 썸네일/버퍼 포함 면적(cm²) 추가, 사이즈·버퍼·원본 면적 열 숨김, 번호 순차 재설정
+    """
+    display_df = df.iloc[base_indices].copy()
+    # 썸네일은 세션 df에 저장하지 않고 표시할 때만 생성 (형상+색상 기준 캐시, 누락분만 병렬 렌더링)
+    display_df.insert(0, "형상", poly_to_base64_batch(
+        [patterns[i][0] for i in base_indices],
+        [get_fabric_color_hex(fabric) for fabric in display_df["원단"]]
+    ))
+
+    # 버퍼 포함 면적 계산 (mm² -> m², 열 단위 벡터 연산)
+    display_df["면적(cm²)"] = (buffered_area_m2(display_df) * 10000).round(1)
+    display_df = display_df.drop(columns=["면적_raw"])
+    # 사이즈 열 숨김 (사이즈선택 UI에서 이미 선택됨)
+    if "사이즈" in display_df.columns:
+        display_df = display_df.drop(columns=["사이즈"])
+    # 버퍼 컬럼 숨김
+    buffer_cols = ["버퍼_상", "버퍼_하", "버퍼_좌", "버퍼_우"]
+    display_df = display_df.drop(columns=[c for c in buffer_cols if c in display_df.columns])
+    display_df = display_df.reset_index(drop=True)
+    display_df["번호"] = range(1, len(display_df) + 1)  # 번호 순차 재설정
+    return display_df
+
+
+def get_display_df(patterns, df, base_indices):
+    """
+    build_display_df 결과를 세션에 저장해 두고, 기본 사이즈 패턴 튜플(같은 객체)과 df 내용이
+    그대로면 복사·썸네일·면적 계산 없이 재사용합니다. (df 내용은 행 해시로 비교,
+    회전/미러링은 패턴 튜플을 새로 만들므로 객체 비교로 감지)
+    """
+    base_patterns = [patterns[i] for i in base_indices]
+    sig = (tuple(base_indices), _hash_frame(df))
+    cached = st.session_state.get('_display_df')
+    if (cached is not None and cached[0] == sig
+            and all(a is b for a, b in zip(cached[1], base_patterns))):
+        return cached[2]
+    display_df = build_display_df(patterns, df, base_indices)
+    st.session_state._display_df = (sig, base_patterns, display_df)
+    return display_df
+
+
+@st.fragment
+def size_qty_inputs(selected_sizes):
+    """
+    사이즈별 벌수 입력 (가로 배치)
+    프래그먼트라서 벌수를 바꾸면 이 패널만 다시 실행되고, 전체 실행(네스팅 실행 버튼 등) 때
+    위젯 값으로 {사이즈: 벌수}를 반환합니다.
+    """
+    size_quantities = {}
+    size_cols = st.columns(len(selected_sizes))
+    for si, size in enumerate(selected_sizes):
+        with size_cols[si]:
+            size_quantities[size] = st.number_input(
+                size,
+                min_value=0, max_value=10, value=1,
+                key=f"size_qty_{si}",
+                help=f"{size} 사이즈 벌수 (0=제외)"
+            )
+    return size_quantities
+
+
+@st.fragment
+def yield_results_fragment(file_name):
+    """
+    [오른쪽] 요척 결과 카드 (Compact View) - 사이즈별 표시 + 엑셀 다운로드
+    프래그먼트라서 로스/엑셀 등 이 영역의 위젯 변경은 이 블록만 다시 실행됩니다. (썸네일 그리드·리스트는 건너뜀)
+    프래그먼트 재실행 때도 최신 값을 쓰도록 데이터는 모두 세션 상태에서 읽습니다.
+
+    Args:
+        file_name: 엑셀 파일명에 쓸 DXF 파일명 (확장자 제외)
+    """
+    st.markdown("#### 📊 요척 결과")
+
+    # 헤더 라벨 (가운데 정렬)
+    h1, h2, h_u, h3, h4 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
+    h1.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>원단/사이즈</div>", unsafe_allow_html=True)
+    h2.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>폭(W)</div>", unsafe_allow_html=True)
+    h_u.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>단위</div>", unsafe_allow_html=True)
+    h3.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>로스(%)</div>", unsafe_allow_html=True)
+    h4.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>필요요척(YD)</div>", unsafe_allow_html=True)
+
+    # 데이터 재계산 (필터링된 데이터 사용)
+    filtered_indices = st.session_state.get('filtered_indices', np.arange(len(st.session_state.df)))
+    calc_df = st.session_state.df.iloc[filtered_indices].copy()
+
+    # 버퍼 포함 면적 컬럼 추가
+    calc_df['면적_버퍼포함'] = buffered_area_m2(calc_df)
+
+    # 선택된 사이즈 목록
+    selected_sizes = st.session_state.get('selected_sizes', [])
+    all_sizes_in_file = st.session_state.get('all_sizes', [])
+
+    by_size = bool(all_sizes_in_file and selected_sizes)
+
+    # 원단 목록 (groupby 키 순서 = 오름차순)
+    fabric_names = list(calc_df.groupby("원단").groups)
+
+    fabric_settings = {}  # 원단별 설정 저장
+    yd_slots = {}         # 원단별 합계 표시 위치
+    size_slots = {}       # 원단별 사이즈 상세 표시 위치
+
+    # 1) 원단별 설정 입력 (결과 표시 자리는 예약만 해 두고 요척표 계산 후 채움)
+    for fabric_name in fabric_names:
+        color = get_fabric_color_hex(fabric_name)
+
+        # 원단 헤더 (설정 입력)
+        with st.container(border=True):
+            c1, c2, c_unit, c3, c4 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
+
+            with c1:
+                st.markdown(f"""
+                <div style='background-color:{color}; padding:5px 0px; border-radius:4px; text-align:center;'>
+                    <strong style='font-size:14px; color:#333;'>{fabric_name}</strong>
+                </div>""", unsafe_allow_html=True)
+
+            with c2:
+                input_width = st.number_input("W", value=58.00, min_value=10.0, step=0.1, format="%.2f", key=f"w_{fabric_name}", label_visibility="collapsed")
+
+            with c_unit:
+                unit = st.selectbox("U", ["in", "cm"], key=f"unit_{fabric_name}", label_visibility="collapsed")
+
+            with c3:
+                input_loss = st.number_input("L", value=15, min_value=0, key=f"l_{fabric_name}", label_visibility="collapsed")
+
+            # 설정 저장 (원단명 기반)
+            fabric_settings[fabric_name] = {
+                'width': input_width,
+                'unit': unit,
+                'loss': input_loss
+            }
+            yd_slots[fabric_name] = c4.empty()
+
+        # 사이즈별 상세 자리 (사이즈가 있는 경우만)
+        if by_size:
+            size_slots[fabric_name] = st.container()
+
+    # 2) 요척표 1회 계산 (화면 표시와 엑셀 내보내기가 공유)
+    yield_table = compute_yield_table(
+        calc_df[['원단', '사이즈', '면적_버퍼포함', '수량']],
+        fabric_settings,
+        tuple(selected_sizes) if by_size else ()
+    )
+    yield_by_fabric = {f: g for f, g in yield_table.groupby('원단', sort=False)}
+    empty_rows = yield_table.iloc[:0]
+    fabric_totals = yield_table.groupby('원단', sort=False)['YD'].sum()
+    total_yield_all = float(fabric_totals.sum())
+
+    # 3) 원단별 합계 및 사이즈별 상세 표시
+    for fabric_name in fabric_names:
+        fabric_total_yd = float(fabric_totals.get(fabric_name, 0.0))
+        font_size = 16 if by_size else 18
+        yd_slots[fabric_name].markdown(f"""
+            <div style='text-align:right; padding-top:5px;'>
+                <span style='font-size:{font_size}px; color:#0068c9; font-weight:bold;'>{fabric_total_yd:.2f} YD</span>
+            </div>""", unsafe_allow_html=True)
+
+        if by_size:
+            with size_slots[fabric_name]:
+                rows = yield_by_fabric.get(fabric_name, empty_rows)
+                for size, size_yd in zip(rows['사이즈'], rows['YD']):
+                    # 사이즈별 행 (들여쓰기)
+                    s1, s2, s3, s4, s5 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
+                    with s1:
+                        st.markdown(f"""
+                        <div style='padding-left:20px; color:#666;'>
+                            └ {size}
+                        </div>""", unsafe_allow_html=True)
+                    with s5:
+                        st.markdown(f"""
+                        <div style='text-align:right; color:#666;'>
+                            {size_yd:.2f} YD
+                        </div>""", unsafe_allow_html=True)
+
+    # 전체 합계 표시
+    st.markdown("---")
+    t1, t2, t3, t4, t5 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
+    with t1:
+        st.markdown("""
+        <div style='padding:5px 0px; text-align:center;'>
+            <strong style='font-size:14px;'>합계</strong>
+        </div>""", unsafe_allow_html=True)
+    with t5:
+        st.markdown(f"""
+        <div style='text-align:right; padding-top:5px;'>
+            <span style='font-size:20px; color:#d94a4a; font-weight:bold;'>{total_yield_all:.2f} YD</span>
+        </div>""", unsafe_allow_html=True)
+
+    # 설정값 세션에 저장 (엑셀 내보내기용)
+    st.session_state.fabric_settings = fabric_settings
+
+    # ----------------------------------------------------------------
+    # E. 엑셀 다운로드 버튼
+    # ----------------------------------------------------------------
+    st.divider()
+
+    # 요척 결과 데이터 수집 (위에서 계산한 yield_table 재사용)
+    yield_data = []
+    total_yield = total_yield_all
+
+    for fabric_name in fabric_names:
+        rows = yield_by_fabric.get(fabric_name, empty_rows)
+        for size, width, unit, eff, yd in zip(rows['사이즈'], rows['폭'], rows['단위'], rows['효율'], rows['YD']):
+            yield_data.append({
+                "원단명": fabric_name,
+                "사이즈": size,
+                "폭": width,
+                "단위": unit,
+                "효율(%)": eff,
+                "필요요척(YD)": round(yd, 2)
+            })
+
+        if by_size:
+            # 원단 소계
+            yield_data.append({
+                "원단명": f"{fabric_name} 소계",
+                "사이즈": "",
+                "폭": "",
+                "단위": "",
+                "효율(%)": "",
+                "필요요척(YD)": round(float(fabric_totals.get(fabric_name, 0.0)), 2)
+            })
+
+    # 전체 합계 행 추가
+    yield_data.append({
+        "원단명": "합계",
+        "사이즈": "",
+        "폭": "",
+        "단위": "",
+        "효율(%)": "",
+        "필요요척(YD)": round(total_yield, 2)
+    })
+
+    yield_df = pd.DataFrame(yield_data)
+
+    # 엑셀 파일 생성 (입력이 같으면 캐시된 바이트 재사용)
+    style_no = st.session_state.get('style_no', '')
+
+    # 시트1: 상세리스트 (선택된 모든 사이즈 포함)
+    detail_df = calc_df.drop(columns=["형상", "면적_raw"], errors='ignore')
+    detail_df["면적(cm²)"] = (calc_df["면적_raw"] * 10000).round(1)
+    excel_bytes = build_yield_excel(detail_df, yield_df, file_name, style_no)
+
+    st.download_button(
+        label="📥 엑셀 다운로드",
+        data=excel_bytes,
+        file_name=f"{file_name}_요척결과.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        width='stretch'
+    )
+
+    # 폭/단위는 네스팅 설정(F)에서도 쓰므로 값이 바뀌면 전체 다시 실행
+    # (원단명 변경/원단 추가·삭제는 이미 전체 실행 중이므로 이전에도 있던 원단의 폭/단위 값만 비교)
+    width_sig = {f: (v['width'], v['unit']) for f, v in fabric_settings.items()}
+    prev_width_sig = st.session_state.get('_yield_width_sig')
+    st.session_state._yield_width_sig = width_sig
+    if prev_width_sig and any(prev_width_sig[f] != w for f, w in width_sig.items() if f in prev_width_sig):
+        st.rerun()
+
+
 def sort_by_fabric():
     """
     세션 상태의 patterns와 df를 원단 우선으로 정렬합니다.
@@ -2369,17 +3336,193 @@ def sort_by_fabric():
     df = st.session_state.df
     patterns = st.session_state.patterns
 
-    # 원단, 번호 순으로 정렬
-    sort_indices = df.sort_values(by=['원단', '번호']).index.tolist()
-    st.session_state.patterns = [patterns[i] for i in sort_indices]
-    st.session_state.df = df.iloc[sort_indices].reset_index(drop=True)
-    st.session_state.df["번호"] = range(1, len(st.session_state.df) + 1)
+    # 원단, 번호 순으로 정렬 (lexsort: 마지막 키가 1순위, 안정 정렬)
+    # 원단은 정렬된 고유값 기준 정수 코드로 변환하여 문자열 비교 없이 정렬
+    fabric_codes, _ = pd.factorize(df['원단'].astype(str), sort=True)
+    order = np.lexsort((df['번호'].to_numpy(), fabric_codes))
+    st.session_state.patterns = [patterns[i] for i in order]
+    new_df = df.take(order)
+    new_df.index = pd.RangeIndex(len(new_df))
+    new_df["번호"] = np.arange(1, len(new_df) + 1)
+    st.session_state.df = new_df
 
     # 체크박스 상태 초기화
     for i in range(len(st.session_state.patterns)):
         st.session_state[f"chk_{i}"] = False
 
 
+def get_pattern_arrays(patterns):
+    """
+    patterns 튜플 리스트의 사이즈/그룹 열을 NumPy 배열(SoA)로 반환합니다.
+    같은 patterns 리스트 객체면 세션에 저장된 배열을 재사용합니다.
+
+    Returns:
+        {'size': 사이즈 배열, 'group': pattern_group 배열} (빈 값은 '')
+        'base'에는 get_base_indices 결과가 (사이즈 유무, 기준사이즈)별로 저장됩니다.
+    """
+    cached = st.session_state.get('pat_arr')
+    if cached is not None and cached['patterns'] is patterns and cached['n'] == len(patterns):
+        return cached
+    arr = {
+        'patterns': patterns,
+        'n': len(patterns),
+        'size': np.array([p_data[3] or '' for p_data in patterns], dtype=str),
+        'group': np.array([p_data[4] or '' for p_data in patterns], dtype=str),
+        'base': {},
+    }
+    st.session_state.pat_arr = arr
+    return arr
+
+
+def base_size_mask(sizes, all_sizes, base_size):
+    """기본 사이즈 패턴 마스크 (사이즈 없는 DXF면 전체, 아니면 기준사이즈 또는 사이즈 없는 패턴)"""
+    if not all_sizes:
+        return np.ones(len(sizes), dtype=bool)
+    return (sizes == (base_size or '')) | (sizes == '')
+
+
+def get_base_indices(patterns, all_sizes, base_size):
+    """
+    기본 사이즈 패턴 인덱스 목록 (오름차순)
+    patterns 리스트와 기준사이즈가 그대로면 세션에 저장된 목록을 재사용합니다. (읽기 전용으로 사용)
+    """
+    arr = get_pattern_arrays(patterns)
+    key = (bool(all_sizes), base_size or '')
+    base = arr['base'].get(key)
+    if base is None:
+        base = np.flatnonzero(base_size_mask(arr['size'], all_sizes, base_size)).tolist()
+        arr['base'][key] = base
+    return base
+
+
+def selected_size_mask(sizes, all_sizes, selected_sizes):
+    """선택된 사이즈 패턴 마스크 (사이즈 없는 DXF면 전체, 사이즈 없는 패턴은 항상 포함)"""
+    if not all_sizes:
+        return np.ones(len(sizes), dtype=bool)
+    return (sizes == '') | np.isin(sizes, list(selected_sizes or ()))
+
+
+def get_pattern_group_maps(patterns, df, all_sizes, base_size):
+    """
+    (pattern_group, 원단) → {사이즈: 인덱스} 매핑과 기본 사이즈 인덱스 집합을 반환합니다.
+    patterns 리스트, 원단 열, 기준사이즈가 그대로면 세션에 저장된 결과를 재사용합니다.
+    (복사/삭제 후에는 '_group_maps'를 지워 강제로 다시 만듭니다)
+
+    Returns:
+        (group_to_indices, base_indices_set)
+    """
+    fabrics = df['원단'].tolist() if df is not None and '원단' in df else []
+    # id()는 재사용될 수 있으므로 리스트 참조를 함께 저장해 객체 동일성(is)으로 비교
+    sig = (len(patterns), tuple(fabrics), bool(all_sizes), base_size)
+    cached = st.session_state.get('_group_maps')
+    if cached is not None and cached[0] is patterns and cached[1] == sig:
+        return cached[2], cached[3]
+
+    group_to_indices = {}  # {(pattern_group, fabric): {size: idx, ...}}
+    arr = get_pattern_arrays(patterns)
+    for idx in np.flatnonzero(arr['group'] != '').tolist():
+        p_data = patterns[idx]
+        fabric = fabrics[idx] if idx < len(fabrics) else ''
+        group_to_indices.setdefault((p_data[4], fabric), {})[p_data[3]] = idx
+    # 기본 사이즈 인덱스
+    base_indices_set = set(get_base_indices(patterns, all_sizes, base_size))
+
+    st.session_state._group_maps = (patterns, sig, group_to_indices, base_indices_set)
+    return group_to_indices, base_indices_set
+
+
+def get_overlay_groups(patterns, original_count, all_sizes, base_size):
+    """
+    사이즈 중첩 비교용 그룹 → 패턴 인덱스 목록을 한 번의 순회로 만듭니다.
+    그룹명은 기준 사이즈 패턴의 상세 리스트 순차 번호 (일괄 수정 도구와 동일),
+    없으면 pattern_group / 패턴명 / "기타" 순으로 사용합니다.
+    복사 패턴(original_count 이후)은 제외하며, 입력이 그대로면 세션 캐시를 재사용합니다.
+
+    Returns:
+        {그룹명: [패턴 인덱스, ...]}
+    """
+    # id()는 재사용될 수 있으므로 리스트 참조를 함께 저장해 객체 동일성(is)으로 비교
+    sig = (len(patterns), original_count, bool(all_sizes), base_size)
+    cached = st.session_state.get('_overlay_groups')
+    if cached is not None and cached[0] is patterns and cached[1] == sig:
+        return cached[2]
+
+    group_to_list_idx = {}  # pattern_group -> 상세 리스트 번호
+    by_group = {}  # pattern_group 또는 패턴명 -> 인덱스 (사이즈가 있는 패턴만)
+    list_idx = 0
+    for idx, p_data in enumerate(patterns[:original_count]):
+        # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, ...)
+        size_name = p_data[3]
+        pattern_group = p_data[4]
+        # 기준 사이즈이거나 사이즈 없는 패턴만 번호 부여
+        if not all_sizes or size_name == base_size or not size_name:
+            list_idx += 1
+            if pattern_group:
+                group_to_list_idx[pattern_group] = list_idx
+        if size_name:
+            raw_key = (True, pattern_group) if pattern_group else (False, p_data[1] or "기타")
+            by_group.setdefault(raw_key, []).append(idx)
+
+    # 번호 매핑은 전체 순회 후에 확정되므로 그룹명은 마지막에 결정
+    pattern_groups = {}
+    for (is_group, name), indices in by_group.items():
+        if is_group and name in group_to_list_idx:
+            group_key = f"{group_to_list_idx[name]}"
+        else:
+            group_key = f"{name}"
+        pattern_groups.setdefault(group_key, []).extend(indices)
+    for indices in pattern_groups.values():
+        indices.sort()  # 같은 그룹명으로 합쳐진 경우에도 원래 패턴 순서 유지
+
+    st.session_state._overlay_groups = (patterns, sig, pattern_groups)
+    return pattern_groups
+
+
+def get_overlay_figure(group_name, group_patterns, selected_sizes, all_sizes, global_max_dim, base_size):
+    """
+    사이즈 중첩 비교 Figure를 세션에 캐시하여 반환합니다.
+    Plotly Figure 생성(트레이스 검증)은 순수 파이썬 작업이라 스레드 병렬화 이득이 없으므로,
+    입력이 그대로인 리런에서는 이전 Figure를 그대로 재사용합니다.
+    (회전/뒤집기로 패턴 튜플이 교체되면 동일성 비교로 자동 재생성)
+    """
+    cache = st.session_state.setdefault('overlay_fig_cache', {})
+    key = (group_name, tuple(selected_sizes or ()), tuple(all_sizes or ()), global_max_dim, base_size)
+    p_datas = tuple(p_data for _, p_data in group_patterns)
+    cached = cache.get(key)
+    if cached is not None and len(cached[0]) == len(p_datas) and all(a is b for a, b in zip(cached[0], p_datas)):
+        return cached[1]
+
+    fig = create_overlay_visualization(list(p_datas), selected_sizes, all_sizes, global_max_dim, base_size)
+    if len(cache) >= 256:
+        cache.clear()
+    cache[key] = (p_datas, fig)
+    return fig
+
+
+def split_pattern_id(pattern_id):
+    """
+    Sparrow pattern_id "df인덱스:이름\n사이즈_수량인덱스"를 분해합니다.
+    수량 인덱스는 전체 문자열의 마지막 '_' 뒤, 사이즈는 첫 줄바꿈 뒤, df인덱스는 첫 ':' 앞입니다.
+
+    Returns:
+        (df인덱스 문자열, 사이즈, 수량 인덱스) - 없는 부분은 ""
+    """
+    # 수량 인덱스 분리 (마지막 _숫자)
+    if '_' in pattern_id:
+        base_part, qty_idx = pattern_id.rsplit('_', 1)
+    else:
+        base_part, qty_idx = pattern_id, ""
+
+    # 사이즈 분리
+    if '\n' in base_part:
+        idx_name_part, size_part = base_part.split('\n', 1)
+    else:
+        idx_name_part, size_part = base_part, ""
+
+    # df 인덱스 추출
+    return idx_name_part.split(':', 1)[0], size_part, qty_idx
+
+
 def update_nesting_pattern_names():
     """
     네스팅 결과의 패턴 이름을 상세리스트의 구분명으로 업데이트합니다.
@@ -2395,30 +3538,15 @@ def update_nesting_pattern_names():
 
     # 네스팅 결과의 pattern_id 업데이트
     for fabric, result in st.session_state.nesting_results.items():
-        if 'placements' not in result:
+        # Placement 객체는 Sparrow 결과에만 사용 (기본 엔진 결과는 'id' 키 딕셔너리)
+        if 'placements' not in result or not result.get('sparrow_mode'):
             continue
         for placement in result['placements']:
-            old_id = placement['pattern_id']
+            old_id = placement.pattern_id
             # pattern_id 형식: "df인덱스:이름\n사이즈_수량인덱스"
             # 예: "5:등판\nL_0" → df인덱스=5, 사이즈=L
 
-            # 수량 인덱스 분리 (마지막 _숫자)
-            if '_' in old_id:
-                base_part, qty_idx = old_id.rsplit('_', 1)
-            else:
-                base_part, qty_idx = old_id, ""
-
-            # 사이즈 분리
-            if '\n' in base_part:
-                idx_name_part, size_part = base_part.split('\n', 1)
-            else:
-                idx_name_part, size_part = base_part, ""
-
-            # df 인덱스 추출
-            if ':' in idx_name_part:
-                df_idx_str = idx_name_part.split(':')[0]
-            else:
-                df_idx_str = idx_name_part
+            df_idx_str, size_part, qty_idx = split_pattern_id(old_id)
 
             # df에서 새 이름 가져오기
             try:
@@ -2437,15 +3565,26 @@ def update_nesting_pattern_names():
                 new_base = f"{df_idx_str}:{new_name}"
 
             if qty_idx:
-                placement['pattern_id'] = f"{new_base}_{qty_idx}"
+                placement.pattern_id = f"{new_base}_{qty_idx}"
             else:
-                placement['pattern_id'] = new_base
+                placement.pattern_id = new_base
 
 
 # ==============================================================================
 # 4. UI 컴포넌트: 팝업 뷰어 (Dialog)
 # ==============================================================================
 
+# 상세 보기 차트 레이아웃 (CAD 스타일) - 슬라이더 조작마다 재구성하지 않도록 모듈 상수로 유지
+_VIEWER_LAYOUT = dict(
+    xaxis=dict(visible=False),
+    yaxis=dict(visible=False, scaleanchor="x", scaleratio=1),
+    plot_bgcolor='white',
+    margin=dict(l=10, r=10, t=10, b=10),
+    height=600,
+    dragmode='pan'  # 기본 도구를 '손바닥(이동)'으로 설정
+)
+
+
 @st.dialog("🔍 패턴 정밀 검토", width="large")
 def show_detail_viewer(idx, pattern, fabric_name):
     """상세 보기 팝업창을 띄웁니다. (확대/이동/회전 기능 포함)"""
@@ -2453,30 +3592,30 @@ def show_detail_viewer(idx, pattern, fabric_name):
     
     # 회전 컨트롤
     angle = st.slider("회전 각도 조절", 0, 360, 0, 90, label_visibility="collapsed")
-    rotated_poly = affinity.rotate(pattern, angle, origin='centroid')
+    # 중심점 기준 회전 행렬을 직접 구성하여 affine_transform 1회 적용 (90도 단위는 정확한 cos/sin)
+    cos_a, sin_a = _ROT_LUT.get(angle % 360) or (math.cos(math.radians(angle)), math.sin(math.radians(angle)))
+    c = pattern.centroid
+    cx, cy = c.x, c.y
+    rotated_poly = affinity.affine_transform(pattern, (
+        cos_a, -sin_a, sin_a, cos_a,
+        cx - cx * cos_a + cy * sin_a, cy - cx * sin_a - cy * cos_a,
+    ))
     
     # Plotly 데이터 준비
-    x, y = rotated_poly.exterior.xy
+    coords = np.asarray(rotated_poly.exterior.coords)
     fill_color = get_fabric_color_hex(fabric_name)
     
     # 차트 그리기
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=list(x), y=list(y),
+        x=coords[:, 0], y=coords[:, 1],
         fill="toself", fillcolor=fill_color,
         line=dict(color="black", width=2), mode='lines',
         name=f"Pattern {idx+1}"
     ))
     
     # 차트 레이아웃 설정 (CAD 스타일)
-    fig.update_layout(
-        xaxis=dict(visible=False), 
-        yaxis=dict(visible=False, scaleanchor="x", scaleratio=1),
-        plot_bgcolor='white', 
-        margin=dict(l=10, r=10, t=10, b=10),
-        height=600, 
-        dragmode='pan' # 기본 도구를 '손바닥(이동)'으로 설정
-    )
+    fig.update_layout(**_VIEWER_LAYOUT)
     st.plotly_chart(fig, width='stretch')
     
     # 하단 정보 표시
@@ -2511,25 +3650,22 @@ if uploaded_file is not None:
         st.session_state.patterns = None
         st.session_state.df = None
         st.session_state.loaded_file = file_key
+        discard_staged_upload()  # 이전 업로드의 임시 파일 삭제
         st.session_state.dxf_sizes = None  # 사이즈 목록 초기화
         st.session_state.size_selection_done = False  # 사이즈 선택 상태 초기화
         st.session_state.selected_load_sizes = None  # 선택 사이즈 초기화
         # 체크박스 상태도 초기화
-        for key in list(st.session_state.keys()):
-            if key.startswith("chk_") or key.startswith("size_chk_"):
-                del st.session_state[key]
-
-    # 임시 파일 생성 (사이즈 스캔 및 패턴 로딩에 공용 사용)
-    tmp_path = None
-    if st.session_state.dxf_sizes is None or st.session_state.patterns is None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".dxf") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_path = tmp_file.name
-
-    # 1단계: 사이즈 스캔 (파일 업로드 직후)
-    if st.session_state.dxf_sizes is None and tmp_path:
+        stale_keys = [key for key in st.session_state.keys() if key.startswith(("chk_", "size_chk_"))]
+        for key in stale_keys:
+            del st.session_state[key]
+
+    # 1단계: 사이즈 스캔 (파일 업로드 직후) - 파일 내용 기준 캐시
+    if st.session_state.dxf_sizes is None:
         with st.spinner("사이즈 목록 스캔 중..."):
-            scanned_sizes, scanned_base_size = scan_dxf_sizes(tmp_path)
+            upload_digest, upload_path = _stage_upload(uploaded_file)
+            scanned_sizes, scanned_base_size = _cached_scan_sizes(
+                uploaded_file.name, uploaded_file.size, upload_digest, upload_path
+            )
             st.session_state.dxf_sizes = scanned_sizes
             st.session_state.dxf_base_size = scanned_base_size  # 기준사이즈 저장
             # 사이즈가 1개 이하면 바로 선택 완료 처리 (선택 UI 불필요)
@@ -2559,67 +3695,45 @@ if uploaded_file is not None:
         </style>
         """, unsafe_allow_html=True)
 
-        # 사이즈 체크박스 (가로 배열)
-        st.markdown('<div class="size-select-container">', unsafe_allow_html=True)
-        cols = st.columns(min(6, len(st.session_state.dxf_sizes)))
-        for i, size in enumerate(st.session_state.dxf_sizes):
-            col_idx = i % len(cols)
-            with cols[col_idx]:
-                # 기본값: 기준사이즈만 선택
-                default_val = st.session_state.get(f"size_chk_{size}", size == base_size)
-                st.checkbox(size, value=default_val, key=f"size_chk_{size}")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-        # 선택 완료 버튼
-        selected_count = sum(1 for size in st.session_state.dxf_sizes if st.session_state.get(f"size_chk_{size}", size == base_size))
-        st.write(f"선택된 사이즈: **{selected_count}개** / 전체 {len(st.session_state.dxf_sizes)}개")
-
-        if st.button(f"🚀 선택한 {selected_count}개 사이즈 불러오기", type="primary", use_container_width=True, disabled=(selected_count == 0)):
+        # 사이즈 체크박스 (가로 배열) - 폼으로 묶어 체크 시마다 리런하지 않고 제출 시 1회만 실행
+        with st.form("size_select_form", clear_on_submit=False):
+            st.markdown('<div class="size-select-container">', unsafe_allow_html=True)
+            cols = st.columns(min(6, len(st.session_state.dxf_sizes)))
+            for i, size in enumerate(st.session_state.dxf_sizes):
+                col_idx = i % len(cols)
+                with cols[col_idx]:
+                    # 기본값: 기준사이즈만 선택
+                    default_val = st.session_state.get(f"size_chk_{size}", size == base_size)
+                    st.checkbox(size, value=default_val, key=f"size_chk_{size}")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+            st.write(f"전체 {len(st.session_state.dxf_sizes)}개 사이즈")
+            submitted = st.form_submit_button("🚀 선택한 사이즈 불러오기", type="primary", use_container_width=True)
+
+        if submitted:
             # 선택된 사이즈 목록 저장
             selected = [size for size in st.session_state.dxf_sizes if st.session_state.get(f"size_chk_{size}", size == base_size)]
-            st.session_state.selected_load_sizes = selected if selected else None
-            st.session_state.size_selection_done = True
-            st.rerun()
+            if selected:
+                st.session_state.selected_load_sizes = selected
+                st.session_state.size_selection_done = True
+                st.rerun()
+            st.warning("불러올 사이즈를 1개 이상 선택하세요.")
 
-        # 임시 파일 삭제 (사이즈 선택 전에는 패턴 로딩 안 함)
-        if tmp_path and os.path.exists(tmp_path):
-            os.remove(tmp_path)
         st.stop()  # 사이즈 선택 완료 전까지 아래 코드 실행 안 함
 
     # 3단계: 선택된 사이즈만 패턴 로딩
     if st.session_state.patterns is None and st.session_state.size_selection_done:
-        if tmp_path is None:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".dxf") as tmp_file:
-                tmp_file.write(uploaded_file.getvalue())
-                tmp_path = tmp_file.name
-
         with st.spinner("패턴 로딩 중..."):
             # 캐시 키용으로 리스트를 튜플로 변환
             sizes_tuple = tuple(st.session_state.selected_load_sizes) if st.session_state.selected_load_sizes else None
-            patterns, detected_base_size = process_dxf(tmp_path, sizes_tuple)
-            style_no = extract_style_no(tmp_path)
-
-            # 기준사이즈가 선택되지 않은 경우, 기준사이즈 패턴만 별도로 로드하여 수량/원단 정보 수집
-            base_size_quantities_cache = {}  # {pattern_group: quantity}
-            base_size_fabrics_cache = {}  # {pattern_group: fabric_name}
-
-            if detected_base_size and (sizes_tuple is None or detected_base_size not in sizes_tuple):
-                # 기준사이즈가 선택되지 않았으므로 별도 로드
-                base_patterns, _ = process_dxf(tmp_path, (detected_base_size,))
-                for p_data in base_patterns:
-                    pattern_group = p_data[4]
-                    fabric_name = p_data[2]
-                    dxf_quantity = p_data[6] if len(p_data) > 6 else 0
-                    if pattern_group:
-                        if dxf_quantity > 0:
-                            base_size_quantities_cache[pattern_group] = dxf_quantity
-                        if fabric_name:
-                            base_size_fabrics_cache[pattern_group] = fabric_name
-
+            upload_digest, upload_path = _stage_upload(uploaded_file)  # 사이즈 스캔 때 기록한 파일 재사용
+            (patterns, detected_base_size, style_no,
+             base_size_quantities_cache, base_size_fabrics_cache) = _cached_load_patterns(
+                uploaded_file.name, uploaded_file.size, upload_digest, upload_path, sizes_tuple
+            )
             st.session_state.base_size_quantities_cache = base_size_quantities_cache
             st.session_state.base_size_fabrics_cache = base_size_fabrics_cache
 
-        os.remove(tmp_path)  # 임시 파일 삭제
         st.session_state.patterns = patterns
         st.session_state.detected_base_size = detected_base_size  # DXF에서 추출한 기준사이즈
         st.session_state.style_no = style_no
@@ -2671,44 +3785,55 @@ if uploaded_file is not None:
         if all_sizes and st.session_state.base_size:
             base_size = st.session_state.base_size
 
-            # pattern_group별 사이즈 매핑
+            # pattern_group별 사이즈 매핑 + (그룹, 사이즈) 존재 여부 2차원 마스크
             group_size_map = {}  # {(pattern_group, fabric): {size: pattern_idx, ...}}
-            for idx, p_data in enumerate(patterns):
-                # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, piece_name, dxf_quantity)
+            group_row = {}  # (pattern_group, fabric) -> 마스크 행 번호
+            size_pos = {size: j for j, size in enumerate(all_sizes)}
+            rows, cols = [], []
+            pat_arr = get_pattern_arrays(patterns)
+            for idx in np.flatnonzero((pat_arr['group'] != '') & (pat_arr['size'] != '')).tolist():
+                # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, piece_name, dxf_quantity, ...)
+                p_data = patterns[idx]
                 pattern_group = p_data[4]
                 size_name = p_data[3]
                 fabric_name = p_data[2]
-                if pattern_group and size_name:
-                    key = (pattern_group, fabric_name if fabric_name else "겉감")
-                    if key not in group_size_map:
-                        group_size_map[key] = {}
-                    group_size_map[key][size_name] = idx
-
-            # 누락된 사이즈 찾아서 기준사이즈 패턴으로 채우기
+                key = (pattern_group, fabric_name if fabric_name else "겉감")
+                if key not in group_size_map:
+                    group_row[key] = len(group_size_map)
+                    group_size_map[key] = {}
+                group_size_map[key][size_name] = idx
+                if size_name in size_pos:
+                    rows.append(group_row[key])
+                    cols.append(size_pos[size_name])
+
+            # 누락된 사이즈 찾아서 기준사이즈 패턴으로 채우기 (누락 칸만 순회)
             added_patterns = []
             missing_info = []
-            for (pattern_group, fabric), size_dict in group_size_map.items():
-                if base_size in size_dict:
-                    # 기준사이즈 패턴이 있는 경우만 처리
-                    base_idx = size_dict[base_size]
-                    base_pattern = patterns[base_idx]
-
-                    for size in all_sizes:
-                        if size not in size_dict:
-                            # 누락된 사이즈 - 기준사이즈 패턴 복사 (9개 요소)
-                            new_pattern = (
-                                base_pattern[0],  # poly (기준사이즈 형상 사용)
-                                base_pattern[1],  # pattern_name
-                                base_pattern[2],  # fabric_name
-                                size,             # 새 사이즈
-                                pattern_group,    # pattern_group
-                                base_pattern[5] if len(base_pattern) > 5 else "",  # piece_name
-                                base_pattern[6] if len(base_pattern) > 6 else 0,   # dxf_quantity
-                                base_pattern[7] if len(base_pattern) > 7 else None, # grainline_info
-                                base_pattern[8] if len(base_pattern) > 8 else []   # interior_lines
-                            )
-                            added_patterns.append(new_pattern)
-                            missing_info.append(f"{pattern_group}_{size}")
+            group_keys = list(group_size_map)
+            present = np.zeros((len(group_keys), len(all_sizes)), dtype=bool)
+            present[np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)] = True
+            base_col = size_pos.get(base_size)
+            if base_col is not None and not present.all():
+                # 기준사이즈 패턴이 있는 그룹만 처리
+                present[~present[:, base_col]] = True
+                for g, j in np.argwhere(~present):
+                    pattern_group, fabric = group_keys[g]
+                    size = all_sizes[j]
+                    base_pattern = patterns[group_size_map[(pattern_group, fabric)][base_size]]
+                    # 누락된 사이즈 - 기준사이즈 패턴 복사 (9개 요소)
+                    new_pattern = (
+                        base_pattern[0],  # poly (기준사이즈 형상 사용)
+                        base_pattern[1],  # pattern_name
+                        base_pattern[2],  # fabric_name
+                        size,             # 새 사이즈
+                        pattern_group,    # pattern_group
+                        base_pattern[5],  # piece_name
+                        base_pattern[6],  # dxf_quantity
+                        base_pattern[7],  # grainline_info
+                        base_pattern[8]   # interior_lines
+                    )
+                    added_patterns.append(new_pattern)
+                    missing_info.append(f"{pattern_group}_{size}")
 
             if added_patterns:
                 patterns.extend(added_patterns)
@@ -2742,21 +3867,39 @@ if uploaded_file is not None:
 
         # 2. 선택된 패턴에서 기준사이즈 정보 수집 (캐시 덮어쓰기)
         if base_size:
-            for p_data in patterns:
-                size_name = p_data[3]
+            # 기준사이즈이고 pattern_group이 있는 패턴만 (사이즈/그룹 배열 마스크)
+            pat_arr = get_pattern_arrays(patterns)
+            for i in np.flatnonzero((pat_arr['size'] == base_size) & (pat_arr['group'] != '')).tolist():
+                p_data = patterns[i]
                 pattern_group = p_data[4]
                 fabric_name = p_data[2]
-                dxf_quantity = p_data[6] if len(p_data) > 6 else 0
-
-                # 기준사이즈이고 pattern_group이 있는 경우 저장
-                if size_name == base_size and pattern_group:
-                    if dxf_quantity > 0:
-                        base_size_quantities[pattern_group] = dxf_quantity
-                        base_size_has_any_quantity = True
-                    if fabric_name:
-                        base_size_fabrics[pattern_group] = fabric_name
-                        base_size_has_any_fabric = True
-
+                dxf_quantity = p_data[6]
+
+                if dxf_quantity > 0:
+                    base_size_quantities[pattern_group] = dxf_quantity
+                    base_size_has_any_quantity = True
+                if fabric_name:
+                    base_size_fabrics[pattern_group] = fabric_name
+                    base_size_has_any_fabric = True
+
+        # 패턴 DB 예측: 같은 폴리곤 객체(누락 사이즈 채우기로 공유된 형상 등)는 1회만 예측,
+        # 한 패턴에서 두 번 조회해도 재계산하지 않음
+        db_ready = bool(pattern_db and len(pattern_db.records) > 0)
+        db_predictions = {}  # id(poly) -> predict_quantity 결과
+
+        def predict_db(poly):
+            key = id(poly)
+            if key not in db_predictions:
+                db_predictions[key] = pattern_db.predict_quantity(poly)
+            return db_predictions[key]
+
+        shape_infer_idx = []  # 형상 기반 추론이 필요한 pattern_info 인덱스
+        # bounds/면적은 전체 패턴에 대해 1회 일괄 계산
+        all_polys = np.array([p_data[0] for p_data in patterns], dtype=object)
+        all_bounds = shapely.bounds(all_polys).reshape(-1, 4)
+        all_areas = shapely.area(all_polys)
+        all_w = (all_bounds[:, 2] - all_bounds[:, 0]) / 10
+        all_h = (all_bounds[:, 3] - all_bounds[:, 1]) / 10
         for i, p_data in enumerate(patterns):
             # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, piece_name, dxf_quantity)
             poly = p_data[0]
@@ -2764,11 +3907,10 @@ if uploaded_file is not None:
             fabric_name = p_data[2]
             size_name = p_data[3]
             pattern_group = p_data[4]
-            piece_name = p_data[5] if len(p_data) > 5 else ""
-            dxf_quantity = p_data[6] if len(p_data) > 6 else 0
+            piece_name = p_data[5]
+            dxf_quantity = p_data[6]
 
-            minx, miny, maxx, maxy = poly.bounds
-            w, h = (maxx - minx) / 10, (maxy - miny) / 10
+            w, h = float(all_w[i]), float(all_h[i])
 
             # 원단 결정: 기준사이즈 기준으로 전체 일관성 유지
             # 핵심 규칙:
@@ -2801,8 +3943,8 @@ if uploaded_file is not None:
                     db_used = True
                 else:
                     # pattern_group이 기준사이즈에 없는 경우: 패턴 DB 예측 또는 형상 추론 사용
-                    if pattern_db and len(pattern_db.records) > 0:
-                        pred_qty, pred_cat, confidence, refs = pattern_db.predict_quantity(poly)
+                    if db_ready:
+                        pred_qty, pred_cat, confidence, refs = predict_db(poly)
                         if confidence >= 0.5:
                             count = pred_qty
                             default_desc = pred_cat
@@ -2811,49 +3953,18 @@ if uploaded_file is not None:
             # 기준사이즈에 수량이 없거나, 위에서 수량을 결정하지 못한 경우: 추론 사용
             if not db_used:
                 # 패턴 DB 예측 시도
-                if pattern_db and len(pattern_db.records) > 0:
-                    pred_qty, pred_cat, confidence, refs = pattern_db.predict_quantity(poly)
+                if db_ready:
+                    pred_qty, pred_cat, confidence, refs = predict_db(poly)
                     if confidence >= 0.5:
                         count = pred_qty
                         default_desc = pred_cat
                         db_used = True
 
-                # 형상 기반 추론
+                # 형상 기반 추론 (루프 이후 일괄 처리)
                 if not db_used:
-                    is_symmetric, sym_reason = check_symmetry(poly)
-
-                    # 1. 좌우대칭 + 가로≥50cm + 세로≥45cm → BACK, 1개
-                    if sym_reason == "좌우대칭" and w >= 50 and h >= 45:
-                        count = 1
-                        default_desc = "BACK"
-                    # 2. 좌우대칭 + 가로≥50cm + 세로≥20cm + 세로<45cm → BACK YOKE, 1개
-                    elif sym_reason == "좌우대칭" and w >= 50 and h >= 20 and h < 45:
-                        count = 1
-                        default_desc = "BACK YOKE"
-                    # 3. 가로≥25cm + 세로≥40cm + 세로직선(≥35cm) 1개 이상 → FRONT, 2개
-                    elif w >= 25 and h >= 40 and check_vertical_straight_edge(poly, 35):
-                        count = 2
-                        default_desc = "FRONT"
-                    # 3. 좌우대칭 + 가로≥45cm + 세로≤15cm + 가로직선 1개 → BACK YOKE HEM, 1개
-                    elif sym_reason == "좌우대칭" and w >= 45 and h <= 15 and check_horizontal_straight_edge(poly):
-                        count = 1
-                        default_desc = "BACK YOKE HEM"
-                    # 5. 좌우대칭 + 가로≥50cm + 세로≤10cm + 평행선(85%) → BACK BOTTOM, 1개
-                    elif sym_reason == "좌우대칭" and w >= 50 and h <= 10 and check_parallel_edges(poly, 0.85):
-                        count = 1
-                        default_desc = "BACK BOTTOM"
-                    # 6. 좌우대칭 + 가로≤25cm + 세로≤15cm → FLAP, 4개
-                    elif sym_reason == "좌우대칭" and w <= 25 and h <= 15:
-                        count = 4
-                        default_desc = "FLAP"
-                    # 7. 상하대칭 + 가로≤26cm + 세로≤12cm → SLEEVE TAB, 4개
-                    elif sym_reason == "상하대칭" and w <= 26 and h <= 12:
-                        count = 4
-                        default_desc = "SLEEVE TAB"
-                    # 8. 나머지 → 확인, 2개
-                    else:
-                        count = 2
-                        default_desc = "확인"
+                    shape_infer_idx.append(len(pattern_info))
+                    count = None
+                    default_desc = None
 
             # 구분(패턴 이름) 결정: DXF 원본 부위명 우선
             if pattern_name:
@@ -2877,28 +3988,33 @@ if uploaded_file is not None:
             pattern_info.append({
                 'poly': poly, 'pattern_name': pattern_name, 'extracted_fabric': extracted_fabric,
                 'size_name': size_name, 'w': w, 'h': h, 'count': count, 'desc': desc,
-                'pattern_key': pattern_key
+                'pattern_key': pattern_key, 'bounds': all_bounds[i], 'area': float(all_areas[i])
             })
 
+        # 형상 기반 추론: 대상 패턴만 모아 규칙 1~8 일괄 적용
+        if shape_infer_idx:
+            infer_polys = [pattern_info[j]['poly'] for j in shape_infer_idx]
+            infer_bounds = np.array([pattern_info[j]['bounds'] for j in shape_infer_idx])
+            shape_counts, shape_descs = classify_pattern_shapes(infer_polys, infer_bounds)
+            for j, cnt, d in zip(shape_infer_idx, shape_counts, shape_descs):
+                pattern_info[j]['count'] = int(cnt)
+                if not pattern_info[j]['pattern_name']:
+                    pattern_info[j]['desc'] = d
+
         # 2단계: 데이터프레임 생성
         data_list = []
         for info in pattern_info:
             pattern_num = pattern_number_map[info['pattern_key']]
             data_list.append({
-                "형상": poly_to_base64(info['poly'], get_fabric_color_hex(info['extracted_fabric'])),
                 "번호": pattern_num, "사이즈": info['size_name'], "원단": info['extracted_fabric'],
                 "구분": info['desc'], "수량": info['count'],
                 "가로(cm)": round(info['w'], 1), "세로(cm)": round(info['h'], 1),
-                "면적_raw": info['poly'].area / 1000000,
+                "면적_raw": info['area'] / 1000000,
                 "버퍼_상": 0, "버퍼_하": 0, "버퍼_좌": 0, "버퍼_우": 0  # 패턴별 상하좌우 버퍼 (mm)
             })
         st.session_state.df = pd.DataFrame(data_list)
-        # 원단별 정렬 (기본 정렬) - patterns 리스트도 동기화
-        if not st.session_state.df.empty:
-            sort_indices = st.session_state.df.sort_values(by=['원단', '번호']).index.tolist()
-            st.session_state.patterns = [st.session_state.patterns[i] for i in sort_indices]
-            st.session_state.df = st.session_state.df.iloc[sort_indices].reset_index(drop=True)
-            st.session_state.df["번호"] = range(1, len(st.session_state.df) + 1)  # 번호 순차 재설정
+        # 원단별 정렬 (기본 정렬) - patterns 리스트도 동기화, 번호 순차 재설정
+        sort_by_fabric()
         # 체크박스 상태 초기화
         for i in range(len(patterns)): st.session_state[f"chk_{i}"] = False
 
@@ -2909,11 +4025,8 @@ if uploaded_file is not None:
     if patterns:
         # 썸네일 비율 고정용 Max값 계산 (현재 남아있는 패턴 기준)
         # 패턴 삭제 시 가장 큰 패턴 기준으로 자동 재설정됨
-        max_dim = 0
-        for p_data in patterns:
-            p = p_data[0]
-            minx, miny, maxx, maxy = p.bounds
-            max_dim = max(max_dim, maxx - minx, maxy - miny)
+        all_bounds = shapely.bounds(np.array([p_data[0] for p_data in patterns], dtype=object))
+        max_dim = max(0, float(np.max(all_bounds[:, 2:] - all_bounds[:, :2])))
         zoom_span = max_dim * 1.1 if max_dim > 0 else 100  # 기본값 설정
 
         # ----------------------------------------------------------------
@@ -2955,57 +4068,19 @@ if uploaded_file is not None:
             # 중첩 시각화
             with st.expander("🔍 사이즈 중첩 비교", expanded=True):
                 # 패턴 그룹별로 분류 (상세 리스트 번호 기준) - 복사 패턴 제외
-                from collections import defaultdict
                 original_count = st.session_state.get('original_pattern_count', len(patterns))
-                pattern_groups = defaultdict(list)
-
-                # 기준 사이즈 패턴의 순차 번호 매핑 (pattern_group -> list_idx)
                 base_size = st.session_state.get('base_size')
-                group_to_list_idx = {}
-                list_idx = 0
-                for idx, p_data in enumerate(patterns):
-                    if idx >= original_count:
-                        continue
-                    size_name = p_data[3]
-                    pattern_group = p_data[4]
-                    # 기준 사이즈이거나 사이즈 없는 패턴만 번호 부여
-                    if not all_sizes or size_name == base_size or not size_name:
-                        list_idx += 1
-                        if pattern_group:
-                            group_to_list_idx[pattern_group] = list_idx
-
-                for idx, p_data in enumerate(patterns):
-                    # 복사된 패턴은 제외 (원본 패턴 수 이후 인덱스)
-                    if idx >= original_count:
-                        continue
-
-                    # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, ...)
-                    size_name = p_data[3]
-                    pattern_group = p_data[4]
-                    pattern_name = p_data[1]
-                    if size_name:  # 사이즈가 있는 패턴만
-                        # 상세 리스트의 순차 번호 사용 (일괄 수정 도구와 동일)
-                        if pattern_group and pattern_group in group_to_list_idx:
-                            group_key = f"{group_to_list_idx[pattern_group]}"
-                        elif pattern_group:
-                            group_key = f"{pattern_group}"
-                        elif pattern_name:
-                            group_key = pattern_name
-                        else:
-                            group_key = "기타"
-                        # 인덱스와 함께 저장 (수량 조회용)
-                        pattern_groups[group_key].append((idx, p_data))
+                group_indices = get_overlay_groups(patterns, original_count, all_sizes, base_size)
+                # 인덱스와 함께 저장 (수량 조회용)
+                pattern_groups = {name: [(idx, patterns[idx]) for idx in indices]
+                                  for name, indices in group_indices.items()}
 
                 if pattern_groups:
                     # 전역 최대 크기 계산 (모든 패턴에 동일 비율 적용)
-                    global_max_dim = 0
-                    for group_patterns in pattern_groups.values():
-                        for idx, p_data in group_patterns:
-                            poly = p_data[0]
-                            minx, miny, maxx, maxy = poly.bounds
-                            max_dim = max(maxx - minx, maxy - miny)
-                            if max_dim > global_max_dim:
-                                global_max_dim = max_dim
+                    group_bounds = shapely.bounds(np.array(
+                        [patterns[idx][0] for indices in group_indices.values() for idx in indices], dtype=object
+                    ))
+                    global_max_dim = max(0, float(np.max(group_bounds[:, 2:] - group_bounds[:, :2])))
 
                     # 그룹 수에 따라 컬럼 조정 (최대 6열)
                     num_groups = len(pattern_groups)
@@ -3057,10 +4132,10 @@ if uploaded_file is not None:
                                 else:
                                     st.caption(f"**{group_name}번** ({sizes_display})")
 
-                                # create_overlay_visualization에는 p_data만 전달
-                                patterns_only = [p_data for idx, p_data in group_patterns]
-                                fig = create_overlay_visualization(
-                                    patterns_only,
+                                # 입력이 같으면 이전 리런의 Figure 재사용
+                                fig = get_overlay_figure(
+                                    group_name,
+                                    group_patterns,
                                     st.session_state.selected_sizes,
                                     all_sizes,
                                     global_max_dim,
@@ -3091,20 +4166,9 @@ if uploaded_file is not None:
 
         # group_to_indices: (pattern_group, 원단) 조합으로 구분
         # 복사된 패턴은 원단이 다르므로 원본과 별도 그룹으로 관리됨
-        group_to_indices = {}  # {(pattern_group, fabric): {size: idx, ...}}
-        base_indices_set = set()
-        for idx, p_data in enumerate(patterns):
-            size_name = p_data[3]
-            pattern_group = p_data[4]
-            fabric = st.session_state.df.loc[idx, '원단'] if idx < len(st.session_state.df) else ''
-            if pattern_group:
-                group_key = (pattern_group, fabric)
-                if group_key not in group_to_indices:
-                    group_to_indices[group_key] = {}
-                group_to_indices[group_key][size_name] = idx
-            # 기본 사이즈 인덱스
-            if not all_sizes or size_name == base_size or not size_name:
-                base_indices_set.add(idx)
+        group_to_indices, base_indices_set = get_pattern_group_maps(
+            patterns, st.session_state.df, all_sizes, base_size
+        )
 
         # 1. 전체 선택/해제/복사/삭제/회전/뒤집기
         with tool_col1:
@@ -3119,7 +4183,7 @@ if uploaded_file is not None:
                 sel_indices = [i for i in base_indices_set if st.session_state.get(f"chk_{i}")]
                 if sel_indices:
                     new_patterns = list(st.session_state.patterns)
-                    new_df = st.session_state.df.copy()
+                    new_df = st.session_state.df  # 복제 없이 참조 (concat이 새 DataFrame 생성)
                     selected_sizes = st.session_state.get('selected_sizes', [])
                     all_sizes = st.session_state.get('all_sizes', [])
 
@@ -3137,21 +4201,23 @@ if uploaded_file is not None:
                         else:
                             expanded_indices.add(idx)
 
+                    new_rows = []  # 복사 행은 모아서 마지막에 한 번만 concat
                     for idx in sorted(expanded_indices):
                         orig_fabric = new_df.iloc[idx]["원단"]
                         new_fabric = "복사_" + orig_fabric
-                        new_color = get_fabric_color_hex(new_fabric)
 
                         orig_pattern = st.session_state.patterns[idx]
                         new_patterns.append(orig_pattern)
                         new_row = new_df.iloc[idx].copy()
                         new_row["번호"] = len(new_patterns)
                         new_row["원단"] = new_fabric
-                        new_row["형상"] = poly_to_base64(orig_pattern[0], new_color)
-                        new_df = pd.concat([new_df, pd.DataFrame([new_row])], ignore_index=True)
+                        new_rows.append(new_row)
+                    if new_rows:
+                        new_df = pd.concat([new_df, pd.DataFrame(new_rows)], ignore_index=True)
 
                     st.session_state.patterns = new_patterns
                     st.session_state.df = new_df
+                    st.session_state.pop('_group_maps', None)  # 그룹 매핑 재생성
                     sort_by_fabric()  # 원단 우선 정렬
                     st.rerun()
             if c4.button("🗑삭제", width='stretch', help="선택 패턴 삭제"):
@@ -3159,7 +4225,6 @@ if uploaded_file is not None:
                 if sel_indices:
                     selected_sizes = st.session_state.get('selected_sizes', [])
                     all_sizes = st.session_state.get('all_sizes', [])
-                    new_df = st.session_state.df
 
                     # 선택한 패턴 + 모든 선택된 사이즈 확장하여 삭제
                     delete_indices = set()
@@ -3176,11 +4241,13 @@ if uploaded_file is not None:
 
                     keep_indices = [i for i in range(len(patterns)) if i not in delete_indices]
                     new_patterns = [st.session_state.patterns[i] for i in keep_indices]
-                    new_df = st.session_state.df.iloc[keep_indices].copy()
-                    new_df = new_df.reset_index(drop=True)
-                    new_df["번호"] = range(1, len(new_df) + 1)
+                    # drop 1회로 새 DataFrame 생성 (사전 복제/reset_index 복사 없음)
+                    new_df = st.session_state.df.drop(index=list(delete_indices))
+                    new_df.index = pd.RangeIndex(len(new_df))
+                    new_df["번호"] = np.arange(1, len(new_df) + 1)
                     st.session_state.patterns = new_patterns
                     st.session_state.df = new_df
+                    st.session_state.pop('_group_maps', None)  # 그룹 매핑 재생성
                     sort_by_fabric()  # 원단 우선 정렬
                     st.rerun()
 
@@ -3208,17 +4275,11 @@ if uploaded_file is not None:
                 for idx in expanded_indices:
                     p_data = list(st.session_state.patterns[idx])
                     poly = p_data[0]
-                    transformed_poly, transformed_interior = transform_func(poly, p_data[8] if len(p_data) > 8 else [])
+                    transformed_poly, transformed_interior = transform_func(poly, p_data[8])
                     p_data[0] = transformed_poly
-                    if len(p_data) > 8:
-                        p_data[8] = transformed_interior
+                    p_data[8] = transformed_interior
                     st.session_state.patterns[idx] = tuple(p_data)
 
-                    # 썸네일 갱신
-                    current_fabric = st.session_state.df.at[idx, "원단"]
-                    new_color = get_fabric_color_hex(current_fabric)
-                    st.session_state.df.at[idx, "형상"] = poly_to_base64(transformed_poly, new_color)
-
                     # 가로/세로 업데이트 (회전 시)
                     if update_dimensions:
                         minx, miny, maxx, maxy = transformed_poly.bounds
@@ -3301,7 +4362,6 @@ if uploaded_file is not None:
             if f2.button("원단적용", width='stretch'):
                 sel_indices = [i for i in base_indices_set if st.session_state.get(f"chk_{i}")]
                 if sel_indices and new_fabric:
-                    new_color = get_fabric_color_hex(new_fabric)
                     selected_sizes = st.session_state.get('selected_sizes', [])
                     all_sizes = st.session_state.get('all_sizes', [])
 
@@ -3318,9 +4378,8 @@ if uploaded_file is not None:
                         else:
                             expanded_indices.add(idx)
 
-                    for idx in expanded_indices:
-                        st.session_state.df.at[idx, "원단"] = new_fabric
-                        st.session_state.df.at[idx, "형상"] = poly_to_base64(patterns[idx][0], new_color)
+                    # 원단 열을 한 번에 기록 (행별 .at 대입 대신, 썸네일은 표시 시 생성)
+                    st.session_state.df.loc[sorted(expanded_indices), "원단"] = new_fabric
                     sort_by_fabric()  # 원단 우선 정렬
                     st.rerun()
 
@@ -3347,8 +4406,7 @@ if uploaded_file is not None:
                         else:
                             expanded_indices.add(idx)
 
-                    for idx in expanded_indices:
-                        st.session_state.df.at[idx, "수량"] = new_count
+                    st.session_state.df.loc[sorted(expanded_indices), "수량"] = new_count
                     st.rerun()
 
         # 4. 버퍼 설정 (선택 패턴의 상하좌우 버퍼) - 숨김 처리
@@ -3406,38 +4464,37 @@ if uploaded_file is not None:
         else:
             st.caption("💡 썸네일 아래 **[숫자 버튼]**을 누르면 확대 창이 열립니다.")
 
-        # 기본 사이즈만 필터링 (썸네일용)
-        filtered_patterns = []
-        for orig_idx, p_data in enumerate(patterns):
-            # 튜플: (poly, pattern_name, fabric_name, size_name, pattern_group, piece_name, dxf_qty, grainline_info)
-            poly = p_data[0]
-            pattern_name = p_data[1]
-            fabric_name = p_data[2]
-            size_name = p_data[3]
-            pattern_group = p_data[4]
-            grainline_info = p_data[7] if len(p_data) > 7 else None
-            if not all_sizes:  # 사이즈 없는 DXF
-                filtered_patterns.append((orig_idx, poly, pattern_name, fabric_name, size_name, pattern_group, grainline_info))
-            elif size_name == base_size:  # 기본 사이즈만
-                filtered_patterns.append((orig_idx, poly, pattern_name, fabric_name, size_name, pattern_group, grainline_info))
-            elif not size_name:  # 사이즈 없는 패턴
-                filtered_patterns.append((orig_idx, poly, pattern_name, fabric_name, size_name, pattern_group, grainline_info))
+        # 기본 사이즈만 필터링 (썸네일용) - 사이즈 배열 마스크로 구한 인덱스만 꺼냄
+        # 튜플: (orig_idx, poly, pattern_name, fabric_name, size_name, pattern_group, grainline_info)
+        filtered_patterns = [
+            (i, *patterns[i][:5], patterns[i][7])
+            for i in get_base_indices(patterns, all_sizes, base_size)
+        ]
 
         cols_per_row = 20
         rows = math.ceil(len(filtered_patterns) / cols_per_row)
 
+        # 원단명은 df에서 가져오기 (일괄수정 반영) - 열을 배열로 한 번만 꺼내 위치 인덱싱
+        fabric_col = st.session_state.df['원단'].to_numpy()
+        current_fabrics = [
+            fabric_col[fp[0]] if fp[0] < len(fabric_col) else "겉감"
+            for fp in filtered_patterns
+        ]
+        # 캐싱된 썸네일 미리 수집 (깜빡임 방지, 그레인라인 표시) - 그리드 루프는 배치만 담당
+        thumb_list = [
+            get_cached_thumbnail(fp[0], fp[1], fabric, zoom_span, fp[6])
+            for fp, fabric in zip(filtered_patterns, current_fabrics)
+        ]
+
         for row in range(rows):
             cols = st.columns(cols_per_row)
             for col_idx in range(cols_per_row):
                 list_idx = row * cols_per_row + col_idx
                 if list_idx < len(filtered_patterns):
                     orig_idx, p, pattern_name, _, size_name, pattern_group, grainline_info = filtered_patterns[list_idx]
-                    # 원단명은 df에서 가져오기 (일괄수정 반영)
-                    current_fabric = st.session_state.df.at[orig_idx, "원단"] if orig_idx < len(st.session_state.df) else "겉감"
+                    current_fabric = current_fabrics[list_idx]
                     with cols[col_idx]:
-                        # 캐싱된 썸네일 사용 (깜빡임 방지, 그레인라인 표시)
-                        thumbnail_data = get_cached_thumbnail(orig_idx, p, current_fabric, zoom_span, grainline_info)
-                        st.image(thumbnail_data, use_container_width=True)
+                        st.image(thumb_list[list_idx], use_container_width=True)
 
                         # 팝업 호출 버튼 (순차 번호 - 상세 리스트와 동일)
                         btn_label = f"{list_idx + 1}"
@@ -3466,35 +4523,21 @@ if uploaded_file is not None:
 
             # 패턴 그룹별 인덱스 매핑 (동일 패턴의 다른 사이즈 연결)
             # (pattern_group, 원단) 조합으로 구분 - 복사된 패턴은 다른 원단이므로 별도 그룹
-            group_to_indices = {}  # {(pattern_group, fabric): {size: idx, ...}}
-            for idx, p_data in enumerate(patterns):
-                size_name = p_data[3]
-                pattern_group = p_data[4]
-                fabric = st.session_state.df.loc[idx, '원단'] if idx < len(st.session_state.df) else ''
-                if pattern_group:
-                    group_key = (pattern_group, fabric)
-                    if group_key not in group_to_indices:
-                        group_to_indices[group_key] = {}
-                    group_to_indices[group_key][size_name] = idx
+            group_to_indices, _ = get_pattern_group_maps(
+                patterns, st.session_state.df, all_sizes, base_size
+            )
 
             # 기본 사이즈 인덱스만 추출 (편집용)
-            base_indices = []
-            for idx, p_data in enumerate(patterns):
-                size_name = p_data[3]
-                if not all_sizes:  # 사이즈 없는 DXF
-                    base_indices.append(idx)
-                elif size_name == base_size:
-                    base_indices.append(idx)
-                elif not size_name:  # 사이즈 없는 패턴
-                    base_indices.append(idx)
+            base_indices = get_base_indices(patterns, all_sizes, base_size)
 
             # 선택된 모든 사이즈의 인덱스 (요척 계산용) - DataFrame 기반
-            all_filtered_indices = []
-            for idx in range(len(st.session_state.df)):
-                size_val = st.session_state.df.at[idx, '사이즈'] if '사이즈' in st.session_state.df.columns else ''
-                if not all_sizes or not size_val or size_val in selected_sizes:
-                    all_filtered_indices.append(idx)
-            st.session_state.filtered_indices = all_filtered_indices
+            if all_sizes and '사이즈' in st.session_state.df.columns:
+                df_sizes = st.session_state.df['사이즈']
+                size_mask = (~df_sizes.astype(bool) | df_sizes.isin(list(selected_sizes or ()))).to_numpy()
+            else:
+                size_mask = np.ones(len(st.session_state.df), dtype=bool)
+            # 정수 배열 그대로 저장 (iloc에 바로 사용, 리스트 변환 생략)
+            st.session_state.filtered_indices = np.flatnonzero(size_mask)
 
             # 기본 사이즈 표시 (출처 표시)
             if base_size and all_sizes:
@@ -3502,44 +4545,8 @@ if uploaded_file is not None:
                 source_info = "(원본)" if detected and detected == base_size else "(중간)"
                 st.caption(f"✏️ **{base_size}** {source_info} 사이즈 편집 → 모든 사이즈에 적용")
 
-            # 데이터프레임 생성 (기본 사이즈만, 사이즈 열 숨김)
-            display_df = st.session_state.df.iloc[base_indices].copy()
-
-            # 버퍼 포함 면적 계산 (mm² -> m²)
-            def calc_buffered_area(row):
-                """버퍼 포함 면적 계산 (m² 단위)"""
-                base_area = row['면적_raw']  # 원본 면적 (m²)
-                w_mm = row['가로(cm)'] * 10  # 가로 (mm)
-                h_mm = row['세로(cm)'] * 10  # 세로 (mm)
-                buf_top = row.get('버퍼_상', 0) if '버퍼_상' in row else 0
-                buf_bottom = row.get('버퍼_하', 0) if '버퍼_하' in row else 0
-                buf_left = row.get('버퍼_좌', 0) if '버퍼_좌' in row else 0
-                buf_right = row.get('버퍼_우', 0) if '버퍼_우' in row else 0
-
-                # 버퍼 추가 면적 (mm²)
-                # 상하: 가로 * 버퍼높이
-                # 좌우: 세로 * 버퍼폭
-                # 모서리: 버퍼_상*버퍼_좌 + 버퍼_상*버퍼_우 + 버퍼_하*버퍼_좌 + 버퍼_하*버퍼_우
-                buffer_area_mm2 = (
-                    w_mm * (buf_top + buf_bottom) +
-                    h_mm * (buf_left + buf_right) +
-                    buf_top * buf_left + buf_top * buf_right +
-                    buf_bottom * buf_left + buf_bottom * buf_right
-                )
-                buffer_area_m2 = buffer_area_mm2 / 1_000_000
-                return base_area + buffer_area_m2
-
-            display_df["면적_버퍼포함"] = display_df.apply(calc_buffered_area, axis=1)
-            display_df["면적(cm²)"] = (display_df["면적_버퍼포함"] * 10000).round(1)
-            display_df = display_df.drop(columns=["면적_raw", "면적_버퍼포함"])
-            # 사이즈 열 숨김 (사이즈선택 UI에서 이미 선택됨)
-            if "사이즈" in display_df.columns:
-                display_df = display_df.drop(columns=["사이즈"])
-            # 버퍼 컬럼 숨김
-            buffer_cols = ["버퍼_상", "버퍼_하", "버퍼_좌", "버퍼_우"]
-            display_df = display_df.drop(columns=[c for c in buffer_cols if c in display_df.columns])
-            display_df = display_df.reset_index(drop=True)
-            display_df["번호"] = range(1, len(display_df) + 1)  # 번호 순차 재설정
+            # 데이터프레임 생성 (기본 사이즈만, 사이즈 열 숨김) - 입력이 같으면 세션에 저장된 표 재사용
+            display_df = get_display_df(patterns, st.session_state.df, base_indices)
 
             edited_df = st.data_editor(
                 display_df,
@@ -3560,360 +4567,57 @@ if uploaded_file is not None:
             if edited_df is not None:
                 selected_sizes = st.session_state.get('selected_sizes', [])
                 all_sizes = st.session_state.get('all_sizes', [])
-                any_change = False  # 변경 여부 플래그
-
-                for i in range(len(edited_df)):
-                    base_idx = base_indices[i] if i < len(base_indices) else i
-
-                    # 변경 확인
-                    old_fabric = st.session_state.df.at[base_idx, "원단"]
-                    new_fabric = edited_df.at[i, "원단"]
-                    old_qty = st.session_state.df.at[base_idx, "수량"]
-                    new_qty = edited_df.at[i, "수량"]
-                    old_cat = st.session_state.df.at[base_idx, "구분"]
-                    new_cat = edited_df.at[i, "구분"]
-
-                    # 버퍼 변경 확인
-                    old_buf_top = st.session_state.df.at[base_idx, "버퍼_상"] if "버퍼_상" in st.session_state.df.columns else 0
-                    new_buf_top = edited_df.at[i, "버퍼_상"] if "버퍼_상" in edited_df.columns else 0
-                    old_buf_bottom = st.session_state.df.at[base_idx, "버퍼_하"] if "버퍼_하" in st.session_state.df.columns else 0
-                    new_buf_bottom = edited_df.at[i, "버퍼_하"] if "버퍼_하" in edited_df.columns else 0
-                    old_buf_left = st.session_state.df.at[base_idx, "버퍼_좌"] if "버퍼_좌" in st.session_state.df.columns else 0
-                    new_buf_left = edited_df.at[i, "버퍼_좌"] if "버퍼_좌" in edited_df.columns else 0
-                    old_buf_right = st.session_state.df.at[base_idx, "버퍼_우"] if "버퍼_우" in st.session_state.df.columns else 0
-                    new_buf_right = edited_df.at[i, "버퍼_우"] if "버퍼_우" in edited_df.columns else 0
-
-                    buf_change = (old_buf_top != new_buf_top or old_buf_bottom != new_buf_bottom or
-                                  old_buf_left != new_buf_left or old_buf_right != new_buf_right)
-
-                    has_change = (old_fabric != new_fabric or old_qty != new_qty or old_cat != new_cat or buf_change)
-
-                    if has_change:
-                        any_change = True
-                        base_size = patterns[base_idx][3]
-                        base_area = st.session_state.df.at[base_idx, "면적_raw"]
-
-                        # 기본 사이즈 업데이트
-                        st.session_state.df.at[base_idx, "원단"] = new_fabric
-                        st.session_state.df.at[base_idx, "수량"] = new_qty
-                        st.session_state.df.at[base_idx, "구분"] = new_cat
-                        if old_fabric != new_fabric:
-                            st.session_state.df.at[base_idx, "형상"] = poly_to_base64(patterns[base_idx][0], get_fabric_color_hex(new_fabric))
-
-                        # 버퍼 업데이트
-                        if "버퍼_상" in st.session_state.df.columns:
-                            st.session_state.df.at[base_idx, "버퍼_상"] = new_buf_top
-                            st.session_state.df.at[base_idx, "버퍼_하"] = new_buf_bottom
-                            st.session_state.df.at[base_idx, "버퍼_좌"] = new_buf_left
-                            st.session_state.df.at[base_idx, "버퍼_우"] = new_buf_right
-
-                        # 동일 패턴의 다른 사이즈에도 적용 (pattern_group + 원단으로 매칭)
+                session_df = st.session_state.df
+                base_arr = np.asarray(base_indices, dtype=np.intp)
+
+                # 편집 컬럼 + (세션 df에 있는 경우) 버퍼 컬럼을 한 번에 비교
+                # 버퍼는 편집기에 표시되지 않으면 0으로 간주
+                edit_cols = ["원단", "수량", "구분"]
+                buf_cols = [c for c in ["버퍼_상", "버퍼_하", "버퍼_좌", "버퍼_우"] if c in session_df.columns]
+                sync_cols = edit_cols + buf_cols
+                new_cols = {
+                    c: (edited_df[c].to_numpy() if c in edited_df.columns else np.zeros(len(edited_df), dtype=session_df[c].dtype))
+                    for c in sync_cols
+                }
+                old_vals = session_df[sync_cols].to_numpy()[base_arr]
+                new_vals = np.column_stack([new_cols[c] for c in sync_cols]).astype(object)
+                changed_rows = np.flatnonzero((old_vals != new_vals).any(axis=1))
+
+                if len(changed_rows):
+                    # 변경된 기본 행 + 동일 패턴의 다른 사이즈 행 (pattern_group + 변경 전 원단으로 매칭)
+                    selected_set = set(selected_sizes or ())
+                    targets, sources = [], []
+                    for r in changed_rows.tolist():
+                        base_idx = base_indices[r]
+                        targets.append(base_idx)
+                        sources.append(r)
+
                         base_pattern_group = patterns[base_idx][4] if base_idx < len(patterns) else None
-                        base_fabric = st.session_state.df.loc[base_idx, '원단'] if base_idx < len(st.session_state.df) else ''
-                        group_key = (base_pattern_group, base_fabric)
-                        if base_pattern_group and group_key in group_to_indices:
-                            for size_name, j in group_to_indices[group_key].items():
-                                if j == base_idx:
-                                    continue
-                                # 선택된 사이즈인 경우만 적용
-                                if not all_sizes or not size_name or size_name in selected_sizes:
-                                    st.session_state.df.at[j, "원단"] = new_fabric
-                                    st.session_state.df.at[j, "수량"] = new_qty
-                                    st.session_state.df.at[j, "구분"] = new_cat
-                                    if old_fabric != new_fabric and j < len(patterns):
-                                        st.session_state.df.at[j, "형상"] = poly_to_base64(patterns[j][0], get_fabric_color_hex(new_fabric))
-                                    # 버퍼도 동일하게 적용
-                                    if "버퍼_상" in st.session_state.df.columns:
-                                        st.session_state.df.at[j, "버퍼_상"] = new_buf_top
-                                        st.session_state.df.at[j, "버퍼_하"] = new_buf_bottom
-                                        st.session_state.df.at[j, "버퍼_좌"] = new_buf_left
-                                        st.session_state.df.at[j, "버퍼_우"] = new_buf_right
-
-                        # 구분 변경 시 네스팅 결과의 패턴 이름도 업데이트
-                        if old_cat != new_cat:
-                            update_nesting_pattern_names()
-
-                # 변경이 있었을 때만 한 번 리렌더링
-                if any_change:
+                        if not base_pattern_group:
+                            continue
+                        members = group_to_indices.get((base_pattern_group, old_vals[r, 0]), {})
+                        for size_name, j in members.items():
+                            # 선택된 사이즈인 경우만 적용
+                            if j != base_idx and (not all_sizes or not size_name or size_name in selected_set):
+                                targets.append(j)
+                                sources.append(r)
+
+                    # 컬럼별 일괄 대입 (컬럼 dtype 유지)
+                    sources = np.asarray(sources, dtype=np.intp)
+                    for c in sync_cols:
+                        session_df.loc[targets, c] = new_cols[c][sources]
+
+                    # 구분 변경 시 네스팅 결과의 패턴 이름도 업데이트
+                    cat_col = sync_cols.index("구분")
+                    if (old_vals[changed_rows, cat_col] != new_vals[changed_rows, cat_col]).any():
+                        update_nesting_pattern_names()
+
+                    # 변경이 있었을 때만 한 번 리렌더링
                     st.rerun()
 
         # [오른쪽] 요척 결과 카드 (Compact View) - 사이즈별 표시
         with col2:
-            st.markdown("#### 📊 요척 결과")
-
-            # 헤더 라벨 (가운데 정렬)
-            h1, h2, h_u, h3, h4 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
-            h1.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>원단/사이즈</div>", unsafe_allow_html=True)
-            h2.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>폭(W)</div>", unsafe_allow_html=True)
-            h_u.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>단위</div>", unsafe_allow_html=True)
-            h3.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>로스(%)</div>", unsafe_allow_html=True)
-            h4.markdown("<div style='text-align: center; color: gray; font-size: 0.85rem;'>필요요척(YD)</div>", unsafe_allow_html=True)
-
-            # 데이터 재계산 (필터링된 데이터 사용)
-            filtered_indices = st.session_state.get('filtered_indices', list(range(len(st.session_state.df))))
-            calc_df = st.session_state.df.iloc[filtered_indices].copy()
-
-            # 버퍼 포함 면적 계산 함수
-            def calc_buffered_area_for_yield(row):
-                """요척 계산용 버퍼 포함 면적 (m² 단위)"""
-                base_area = row['면적_raw']  # 원본 면적 (m²)
-                w_mm = row['가로(cm)'] * 10  # 가로 (mm)
-                h_mm = row['세로(cm)'] * 10  # 세로 (mm)
-                buf_top = row.get('버퍼_상', 0) if '버퍼_상' in row else 0
-                buf_bottom = row.get('버퍼_하', 0) if '버퍼_하' in row else 0
-                buf_left = row.get('버퍼_좌', 0) if '버퍼_좌' in row else 0
-                buf_right = row.get('버퍼_우', 0) if '버퍼_우' in row else 0
-
-                # 버퍼 추가 면적 (mm²)
-                buffer_area_mm2 = (
-                    w_mm * (buf_top + buf_bottom) +
-                    h_mm * (buf_left + buf_right) +
-                    buf_top * buf_left + buf_top * buf_right +
-                    buf_bottom * buf_left + buf_bottom * buf_right
-                )
-                buffer_area_m2 = buffer_area_mm2 / 1_000_000
-                return base_area + buffer_area_m2
-
-            # 버퍼 포함 면적 컬럼 추가
-            calc_df['면적_버퍼포함'] = calc_df.apply(calc_buffered_area_for_yield, axis=1)
-
-            # 선택된 사이즈 목록
-            selected_sizes = st.session_state.get('selected_sizes', [])
-            all_sizes_in_file = st.session_state.get('all_sizes', [])
-
-            # 원단별 그룹
-            fabric_groups = calc_df.groupby("원단")
-
-            # 전체 합계 저장용
-            total_yield_all = 0.0
-            fabric_settings = {}  # 원단별 설정 저장
-
-            fab_idx = 0
-            for fabric_name, fabric_group in fabric_groups:
-                color = get_fabric_color_hex(fabric_name)
-
-                # 원단 헤더 (설정 입력)
-                with st.container(border=True):
-                    c1, c2, c_unit, c3, c4 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
-
-                    with c1:
-                        st.markdown(f"""
-                        <div style='background-color:{color}; padding:5px 0px; border-radius:4px; text-align:center;'>
-                            <strong style='font-size:14px; color:#333;'>{fabric_name}</strong>
-                        </div>""", unsafe_allow_html=True)
-
-                    with c2:
-                        input_width = st.number_input("W", value=58.00, min_value=10.0, step=0.1, format="%.2f", key=f"w_{fabric_name}", label_visibility="collapsed")
-
-                    with c_unit:
-                        unit = st.selectbox("U", ["in", "cm"], key=f"unit_{fabric_name}", label_visibility="collapsed")
-
-                    with c3:
-                        input_loss = st.number_input("L", value=15, min_value=0, key=f"l_{fabric_name}", label_visibility="collapsed")
-
-                    # 설정 저장 (원단명 기반)
-                    fabric_settings[fabric_name] = {
-                        'width': input_width,
-                        'unit': unit,
-                        'loss': input_loss
-                    }
-
-                    # 원단 전체 합계 계산
-                    if all_sizes_in_file and selected_sizes:
-                        # 사이즈가 있는 경우: 선택된 사이즈만 합산
-                        fabric_total_yd = 0.0
-                        for size in selected_sizes:
-                            size_data = fabric_group[fabric_group['사이즈'] == size]
-                            if not size_data.empty:
-                                size_area = sum(row['면적_버퍼포함'] * row['수량'] for _, row in size_data.iterrows())
-                                if input_width > 0:
-                                    width_m = input_width / 100 if unit == "cm" else (input_width * 2.54) / 100
-                                    size_yd = ((size_area / width_m) / ((100-input_loss)/100)) * 1.09361
-                                    fabric_total_yd += size_yd
-
-                        with c4:
-                            st.markdown(f"""
-                            <div style='text-align:right; padding-top:5px;'>
-                                <span style='font-size:16px; color:#0068c9; font-weight:bold;'>{fabric_total_yd:.2f} YD</span>
-                            </div>""", unsafe_allow_html=True)
-
-                        total_yield_all += fabric_total_yd
-                    else:
-                        # 사이즈 없는 경우: 전체 합산
-                        group_area = sum(row['면적_버퍼포함'] * row['수량'] for _, row in fabric_group.iterrows())
-                        if input_width > 0:
-                            width_m = input_width / 100 if unit == "cm" else (input_width * 2.54) / 100
-                            req_yd = ((group_area / width_m) / ((100-input_loss)/100)) * 1.09361
-                        else:
-                            req_yd = 0
-
-                        with c4:
-                            st.markdown(f"""
-                            <div style='text-align:right; padding-top:5px;'>
-                                <span style='font-size:18px; color:#0068c9; font-weight:bold;'>{req_yd:.2f} YD</span>
-                            </div>""", unsafe_allow_html=True)
-
-                        total_yield_all += req_yd
-
-                # 사이즈별 상세 (사이즈가 있는 경우만)
-                if all_sizes_in_file and selected_sizes:
-                    for size in selected_sizes:
-                        size_data = fabric_group[fabric_group['사이즈'] == size]
-                        if not size_data.empty:
-                            size_area = sum(row['면적_버퍼포함'] * row['수량'] for _, row in size_data.iterrows())
-
-                            if input_width > 0:
-                                width_m = input_width / 100 if unit == "cm" else (input_width * 2.54) / 100
-                                size_yd = ((size_area / width_m) / ((100-input_loss)/100)) * 1.09361
-                            else:
-                                size_yd = 0
-
-                            # 사이즈별 행 (들여쓰기)
-                            s1, s2, s3, s4, s5 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
-                            with s1:
-                                st.markdown(f"""
-                                <div style='padding-left:20px; color:#666;'>
-                                    └ {size}
-                                </div>""", unsafe_allow_html=True)
-                            with s5:
-                                st.markdown(f"""
-                                <div style='text-align:right; color:#666;'>
-                                    {size_yd:.2f} YD
-                                </div>""", unsafe_allow_html=True)
-
-                fab_idx += 1
-
-            # 전체 합계 표시
-            st.markdown("---")
-            t1, t2, t3, t4, t5 = st.columns([1.4, 0.9, 0.9, 0.9, 1.4])
-            with t1:
-                st.markdown("""
-                <div style='padding:5px 0px; text-align:center;'>
-                    <strong style='font-size:14px;'>합계</strong>
-                </div>""", unsafe_allow_html=True)
-            with t5:
-                st.markdown(f"""
-                <div style='text-align:right; padding-top:5px;'>
-                    <span style='font-size:20px; color:#d94a4a; font-weight:bold;'>{total_yield_all:.2f} YD</span>
-                </div>""", unsafe_allow_html=True)
-
-            # 설정값 세션에 저장 (엑셀 내보내기용)
-            st.session_state.fabric_settings = fabric_settings
-
-            # ----------------------------------------------------------------
-            # E. 엑셀 다운로드 버튼
-            # ----------------------------------------------------------------
-            st.divider()
-
-            # 요척 결과 데이터 수집 (사이즈별)
-            yield_data = []
-            total_yield = 0.0
-
-            # 설정값 가져오기
-            fabric_settings = st.session_state.get('fabric_settings', {})
-            selected_sizes = st.session_state.get('selected_sizes', [])
-            all_sizes_in_file = st.session_state.get('all_sizes', [])
-
-            for fabric_name, fabric_group in fabric_groups:
-                settings = fabric_settings.get(fabric_name, {})
-                input_width = settings.get('width', 58.0)
-                unit = settings.get('unit', 'in')
-                input_loss = settings.get('loss', 15)
-
-                if all_sizes_in_file and selected_sizes:
-                    # 사이즈별 행 추가
-                    fabric_total = 0.0
-                    for size in selected_sizes:
-                        size_data = fabric_group[fabric_group['사이즈'] == size]
-                        if not size_data.empty:
-                            size_area = sum(row['면적_버퍼포함'] * row['수량'] for _, row in size_data.iterrows())
-                            if input_width > 0:
-                                width_m = input_width / 100 if unit == "cm" else (input_width * 2.54) / 100
-                                size_yd = ((size_area / width_m) / ((100-input_loss)/100)) * 1.09361
-                            else:
-                                size_yd = 0
-
-                            yield_data.append({
-                                "원단명": fabric_name,
-                                "사이즈": size,
-                                "폭": input_width,
-                                "단위": unit,
-                                "효율(%)": 100 - input_loss,
-                                "필요요척(YD)": round(size_yd, 2)
-                            })
-                            fabric_total += size_yd
-
-                    # 원단 소계
-                    yield_data.append({
-                        "원단명": f"{fabric_name} 소계",
-                        "사이즈": "",
-                        "폭": "",
-                        "단위": "",
-                        "효율(%)": "",
-                        "필요요척(YD)": round(fabric_total, 2)
-                    })
-                    total_yield += fabric_total
-                else:
-                    # 사이즈 없는 경우
-                    group_area = sum(row['면적_버퍼포함'] * row['수량'] for _, row in fabric_group.iterrows())
-                    if input_width > 0:
-                        width_m = input_width / 100 if unit == "cm" else (input_width * 2.54) / 100
-                        req_yd = ((group_area / width_m) / ((100-input_loss)/100)) * 1.09361
-                    else:
-                        req_yd = 0
-
-                    yield_data.append({
-                        "원단명": fabric_name,
-                        "사이즈": "",
-                        "폭": input_width,
-                        "단위": unit,
-                        "효율(%)": 100 - input_loss,
-                        "필요요척(YD)": round(req_yd, 2)
-                    })
-                    total_yield += req_yd
-
-            # 전체 합계 행 추가
-            yield_data.append({
-                "원단명": "합계",
-                "사이즈": "",
-                "폭": "",
-                "단위": "",
-                "효율(%)": "",
-                "필요요척(YD)": round(total_yield, 2)
-            })
-
-            yield_df = pd.DataFrame(yield_data)
-
-            # 엑셀 파일 생성
-            excel_buffer = io.BytesIO()
-            file_name = uploaded_file.name.replace('.dxf', '').replace('.DXF', '')
-            style_no = st.session_state.get('style_no', '')
-
-            with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                # 시트1: 상세리스트 (선택된 모든 사이즈 포함)
-                export_df = calc_df.copy()
-                export_df["면적(cm²)"] = (export_df["면적_raw"] * 10000).round(1)
-                detail_df = export_df.drop(columns=["형상", "면적_raw"], errors='ignore')
-                # 파일명, 스타일번호 컬럼 추가
-                detail_df.insert(0, "스타일번호", style_no)
-                detail_df.insert(0, "파일명", file_name)
-                detail_df.to_excel(writer, sheet_name='상세리스트', index=False)
-
-                # 시트2: 요척결과 (사이즈별)
-                # 파일명, 스타일번호 컬럼 추가
-                yield_df.insert(0, "스타일번호", style_no)
-                yield_df.insert(0, "파일명", file_name)
-                yield_df.to_excel(writer, sheet_name='요척결과', index=False)
-
-            excel_buffer.seek(0)
-
-            st.download_button(
-                label="📥 엑셀 다운로드",
-                data=excel_buffer,
-                file_name=f"{file_name}_요척결과.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                width='stretch'
-            )
+            yield_results_fragment(uploaded_file.name.replace('.dxf', '').replace('.DXF', ''))
 
         # ----------------------------------------------------------------
         # F. 네스팅 시뮬레이션 (원단별) - 전체 폭 사용
@@ -4028,7 +4732,7 @@ if uploaded_file is not None:
                 unit_val = st.session_state.get(f"unit_{fabric}", "in")
                 # cm로 변환
                 if unit_val == "in":
-                    width_cm = width_val * 2.54
+                    width_cm = width_val * UNIT_SCALE_INCH_TO_CM
                 else:
                     width_cm = width_val
                 fabric_widths[fabric] = width_cm
@@ -4077,16 +4781,7 @@ if uploaded_file is not None:
                 st.markdown("---")
                 st.markdown("**📏 사이즈별 벌수**")
 
-                # 사이즈별 벌수 입력 (가로 배치)
-                size_cols = st.columns(len(selected_sizes))
-                for si, size in enumerate(selected_sizes):
-                    with size_cols[si]:
-                        size_quantities[size] = st.number_input(
-                            size,
-                            min_value=0, max_value=10, value=1,
-                            key=f"size_qty_{si}",
-                            help=f"{size} 사이즈 벌수 (0=제외)"
-                        )
+                size_quantities = size_qty_inputs(tuple(selected_sizes))
 
         if run_nesting:
             import time
@@ -4100,19 +4795,20 @@ if uploaded_file is not None:
                     all_sizes = st.session_state.get('all_sizes', [])
                     selected_sizes = st.session_state.get('selected_sizes', all_sizes)
 
-                    filtered_indices_for_nesting = []
-                    for idx, p_data in enumerate(patterns):
-                        size_name = p_data[3]  # (poly, pattern_name, fabric_name, size_name, pattern_group)
-                        if not all_sizes or not size_name or size_name in selected_sizes:
-                            filtered_indices_for_nesting.append(idx)
+                    filtered_indices_for_nesting = np.flatnonzero(selected_size_mask(
+                        get_pattern_arrays(patterns)['size'], all_sizes, selected_sizes
+                    ))
+
+                    # 행 단위 df.loc 조회 대신 열 배열/리스트를 한 번만 꺼내 위치 인덱싱
+                    fabric_arr = st.session_state.df['원단'].to_numpy()
+                    nest_cols = nesting_columns(st.session_state.df)
 
                     # 원단별로 네스팅 실행
                     for fabric in fabric_list:
                         # 해당 원단 + 선택된 사이즈의 패턴만 필터링
-                        fabric_indices = [
-                            idx for idx in filtered_indices_for_nesting
-                            if st.session_state.df.loc[idx, '원단'] == fabric
-                        ]
+                        fabric_indices = filtered_indices_for_nesting[
+                            fabric_arr[filtered_indices_for_nesting] == fabric
+                        ].tolist()
 
                         if len(fabric_indices) == 0:
                             continue
@@ -4123,39 +4819,33 @@ if uploaded_file is not None:
                         total_qty_debug = 0  # 디버그: 총 수량 추적
                         for idx in fabric_indices:
                             if idx < len(patterns):
-                                row = st.session_state.df.loc[idx]
                                 poly = patterns[idx][0]
                                 size_name = patterns[idx][3]  # 사이즈 정보
-                                grainline_info = patterns[idx][7] if len(patterns[idx]) > 7 else None  # 그레인라인 정보
-                                coords = list(poly.exterior.coords)[:-1]
-                                coords_cm = [(p[0] / 10, p[1] / 10) for p in coords]
-
+                                grainline_info = patterns[idx][7]  # 그레인라인 정보
+                                coords_cm = poly_coords_cm(poly)
                                 # 그레인라인 좌표도 cm로 변환
-                                grainline_cm = None
-                                if grainline_info:
-                                    gl_start, gl_end = grainline_info
-                                    grainline_cm = ((gl_start[0]/10, gl_start[1]/10), (gl_end[0]/10, gl_end[1]/10))
+                                grainline_cm = grainline_to_cm(grainline_info)
 
                                 # 사이즈별 벌수 적용 (사이즈 2개 이상일 때)
                                 if has_multiple_sizes and size_name:
                                     size_qty = size_quantities.get(size_name, 1)
                                     if size_qty == 0:  # 벌수 0이면 제외
                                         continue
-                                    quantity = int(row['수량']) * size_qty
+                                    quantity = int(nest_cols['수량'][idx]) * size_qty
                                 else:
-                                    quantity = int(row['수량']) * fabric_marker_qty
+                                    quantity = int(nest_cols['수량'][idx]) * fabric_marker_qty
 
                                 total_qty_debug += quantity  # 디버그: 수량 누적
 
                                 # 패턴ID: df인덱스(고유) + 이름(표시용) + 사이즈
                                 # df인덱스는 정렬 후에도 유지되는 고유 식별자
-                                pattern_name = str(row['구분'])[-10:] if row['구분'] else ""  # 표시용 이름 (뒤에서 10글자)
+                                pattern_name = str(nest_cols['구분'][idx])[-10:] if nest_cols['구분'][idx] else ""  # 표시용 이름 (뒤에서 10글자)
                                 pattern_id = f"{idx}:{pattern_name}\n{size_name[:4]}" if size_name else f"{idx}:{pattern_name}"
                                 # 패턴별 상하좌우 버퍼 (mm)
-                                buf_top = row.get('버퍼_상', 0) if '버퍼_상' in row else 0
-                                buf_bottom = row.get('버퍼_하', 0) if '버퍼_하' in row else 0
-                                buf_left = row.get('버퍼_좌', 0) if '버퍼_좌' in row else 0
-                                buf_right = row.get('버퍼_우', 0) if '버퍼_우' in row else 0
+                                buf_top = nest_cols['버퍼_상'][idx]
+                                buf_bottom = nest_cols['버퍼_하'][idx]
+                                buf_left = nest_cols['버퍼_좌'][idx]
+                                buf_right = nest_cols['버퍼_우'][idx]
 
                                 pattern_data.append({
                                     'coords_cm': coords_cm,
@@ -4171,8 +4861,8 @@ if uploaded_file is not None:
                                 })
 
                         # 디버그: 상세 리스트 수량 합계 계산
-                        df_fabric_indices = [i for i in range(len(st.session_state.df)) if st.session_state.df.loc[i, '원단'] == fabric]
-                        df_qty_sum = sum(int(st.session_state.df.loc[i, '수량']) for i in df_fabric_indices)
+                        df_fabric_indices = np.flatnonzero(fabric_arr == fabric).tolist()
+                        df_qty_sum = sum(int(nest_cols['수량'][i]) for i in df_fabric_indices)
 
                         # 사이즈별 벌수 적용한 예상 수량
                         if has_multiple_sizes:
@@ -4200,7 +4890,7 @@ if uploaded_file is not None:
                                 best_seed = 42
                                 test_seeds = [42, 123, 456, 789, 1024]
                                 for test_seed in test_seeds:
-                                    test_result = run_sparrow_nesting(
+                                    test_result = run_sparrow_nesting_cached(
                                         pattern_data, width_cm, sparrow_time // 2, nest_rotation, 0, nest_mirror, fabric_buffer, allow_90, test_seed, pattern_order
                                     )
                                     if test_result.get('efficiency', 0) > best_efficiency:
@@ -4211,7 +4901,7 @@ if uploaded_file is not None:
                                 result['used_seed'] = best_seed
                             else:
                                 # 단일 시도
-                                result = run_sparrow_nesting(
+                                result = run_sparrow_nesting_cached(
                                     pattern_data, width_cm, sparrow_time, nest_rotation, 0, nest_mirror, fabric_buffer, allow_90, nest_seed, pattern_order
                                 )
                                 result['used_seed'] = nest_seed
@@ -4314,12 +5004,20 @@ if uploaded_file is not None:
                                     # 시각화
                                     try:
                                         if result.get('sparrow_mode'):
-                                            fig = create_sparrow_visualization(result, result['width_cm'])
+                                            # 캐시된 PNG 바이트 표시 (배치가 같으면 재렌더링 생략)
+                                            png_bytes = _render_png(
+                                                _placements_digest(result, result['width_cm']),
+                                                result, result['width_cm'],
+                                                tuple(st.session_state.get('selected_sizes', st.session_state.get('all_sizes', [])))
+                                            )
+                                            if png_bytes:
+                                                st.image(png_bytes, use_container_width=True)
                                         else:
                                             fig = create_nesting_visualization(result, result['width_cm'])
-                                        if fig:
-                                            st.pyplot(fig)
-                                            plt.close(fig)
+                                            if fig:
+                                                # 래스터 경로(dpi=100)로 표시 후 Figure 해제
+                                                st.pyplot(fig, dpi=100, clear_figure=True)
+                                                plt.close(fig)
                                     except Exception as e:
                                         st.warning(f"시각화 오류: {str(e)}")
 
@@ -4371,59 +5069,17 @@ if uploaded_file is not None:
                                                     all_sizes = st.session_state.get('all_sizes', [])
                                                     selected_sizes = st.session_state.get('selected_sizes', all_sizes)
 
-                                                    fabric_indices = []
-                                                    for idx, p_data in enumerate(patterns):
-                                                        size_name = p_data[3]
-                                                        if st.session_state.df.loc[idx, '원단'] == fabric:
-                                                            if not all_sizes or not size_name or size_name in selected_sizes:
-                                                                fabric_indices.append(idx)
-
-                                                    # 패턴 데이터 수집
+                                                    # 패턴 데이터 (원단·사이즈별 캐시) + 벌수 적용
                                                     pattern_data = []
-                                                    for idx in fabric_indices:
-                                                        if idx < len(patterns):
-                                                            row = st.session_state.df.loc[idx]
-                                                            poly = patterns[idx][0]
-                                                            size_name = patterns[idx][3]
-                                                            grainline_info = patterns[idx][7] if len(patterns[idx]) > 7 else None
-                                                            coords = list(poly.exterior.coords)[:-1]
-                                                            coords_cm = [(p[0] / 10, p[1] / 10) for p in coords]
-
-                                                            # 그레인라인 좌표도 cm로 변환
-                                                            grainline_cm = None
-                                                            if grainline_info:
-                                                                gl_start, gl_end = grainline_info
-                                                                grainline_cm = ((gl_start[0]/10, gl_start[1]/10), (gl_end[0]/10, gl_end[1]/10))
-
-                                                            # 사이즈별 벌수 적용
-                                                            if re_has_multi and size_name:
-                                                                sz_qty = re_size_quantities.get(size_name, 1)
-                                                                if sz_qty == 0:
-                                                                    continue
-                                                                quantity = int(row['수량']) * sz_qty
-                                                            else:
-                                                                quantity = int(row['수량']) * new_qty
-
-                                                            base_id = str(row['구분'])[:12] if row['구분'] else f"P{idx+1}"
-                                                            pattern_id = f"{base_id}\n{size_name[:4]}" if size_name else base_id
-
-                                                            # 패턴별 상하좌우 버퍼 (mm)
-                                                            buf_top = row.get('버퍼_상', 0) if '버퍼_상' in row else 0
-                                                            buf_bottom = row.get('버퍼_하', 0) if '버퍼_하' in row else 0
-                                                            buf_left = row.get('버퍼_좌', 0) if '버퍼_좌' in row else 0
-                                                            buf_right = row.get('버퍼_우', 0) if '버퍼_우' in row else 0
-
-                                                            pattern_data.append({
-                                                                'coords_cm': coords_cm,
-                                                                'quantity': quantity,
-                                                                'pattern_id': pattern_id,
-                                                                'area_cm2': poly.area / 100,
-                                                                'grainline_cm': grainline_cm,
-                                                                'buffer_top': buf_top,
-                                                                'buffer_bottom': buf_bottom,
-                                                                'buffer_left': buf_left,
-                                                                'buffer_right': buf_right
-                                                            })
+                                                    for p in get_base_pattern_data(patterns, st.session_state.df, fabric, all_sizes, selected_sizes):
+                                                        # 사이즈별 벌수 적용
+                                                        if re_has_multi and p['size_name']:
+                                                            sz_qty = re_size_quantities.get(p['size_name'], 1)
+                                                            if sz_qty == 0:
+                                                                continue
+                                                            pattern_data.append(with_quantity(p, p['base_quantity'] * sz_qty))
+                                                        else:
+                                                            pattern_data.append(with_quantity(p, p['base_quantity'] * new_qty))
 
                                                     width_cm = result['width_cm']
                                                     # 원단별 패턴 버퍼 (저장된 값 또는 기본값 0)
@@ -4435,7 +5091,7 @@ if uploaded_file is not None:
                                                     used_seed = result.get('used_seed', st.session_state.get('nest_seed', 42))
                                                     used_order = st.session_state.get('pattern_order', 'default')
                                                     if SPARROW_AVAILABLE:
-                                                        new_result = run_sparrow_nesting(
+                                                        new_result = run_sparrow_nesting_cached(
                                                             pattern_data, width_cm,
                                                             st.session_state.get('sparrow_time', 30),
                                                             st.session_state.get('nest_rotation', True),
@@ -4511,68 +5167,17 @@ if uploaded_file is not None:
                                 all_sizes = st.session_state.get('all_sizes', [])
                                 selected_sizes = st.session_state.get('selected_sizes', all_sizes)
 
-                                fabric_indices = []
-                                for idx, p_data in enumerate(patterns):
-                                    size_name = p_data[3]
-                                    if st.session_state.df.loc[idx, '원단'] == fabric:
-                                        if not all_sizes or not size_name or size_name in selected_sizes:
-                                            fabric_indices.append(idx)
-
-                                base_pattern_data = []
-                                for idx in fabric_indices:
-                                    if idx < len(patterns):
-                                        row = st.session_state.df.loc[idx]
-                                        poly = patterns[idx][0]
-                                        size_name = patterns[idx][3]
-                                        grainline_info = patterns[idx][7] if len(patterns[idx]) > 7 else None
-                                        coords = list(poly.exterior.coords)[:-1]
-                                        coords_cm = [(p[0] / 10, p[1] / 10) for p in coords]
-
-                                        # 그레인라인 좌표도 cm로 변환
-                                        grainline_cm = None
-                                        if grainline_info:
-                                            gl_start, gl_end = grainline_info
-                                            grainline_cm = ((gl_start[0]/10, gl_start[1]/10), (gl_end[0]/10, gl_end[1]/10))
-
-                                        base_id = str(row['구분'])[:12] if row['구분'] else f"P{idx+1}"
-                                        pattern_id = f"{base_id}\n{size_name[:4]}" if size_name else base_id
-
-                                        # 패턴별 상하좌우 버퍼 (mm)
-                                        buf_top = row.get('버퍼_상', 0) if '버퍼_상' in row else 0
-                                        buf_bottom = row.get('버퍼_하', 0) if '버퍼_하' in row else 0
-                                        buf_left = row.get('버퍼_좌', 0) if '버퍼_좌' in row else 0
-                                        buf_right = row.get('버퍼_우', 0) if '버퍼_우' in row else 0
-
-                                        base_pattern_data.append({
-                                            'coords_cm': coords_cm,
-                                            'base_quantity': int(row['수량']),
-                                            'pattern_id': pattern_id,
-                                            'area_cm2': poly.area / 100,
-                                            'grainline_cm': grainline_cm,
-                                            'buffer_top': buf_top,
-                                            'buffer_bottom': buf_bottom,
-                                            'buffer_left': buf_left,
-                                            'buffer_right': buf_right
-                                        })
+                                base_pattern_data = get_base_pattern_data(
+                                    patterns, st.session_state.df, fabric, all_sizes, selected_sizes
+                                )
 
                                 # 원단별 패턴 버퍼 (저장된 값 또는 기본값 0)
                                 fabric_buffer = result.get('buffer', 0)
 
                                 # 벌수 2~5까지 시도하여 최적 효율 찾기
                                 for try_qty in range(2, 6):
-                                    pattern_data = []
-                                    for p in base_pattern_data:
-                                        pattern_data.append({
-                                            'coords_cm': p['coords_cm'],
-                                            'quantity': p['base_quantity'] * try_qty,
-                                            'pattern_id': p['pattern_id'],
-                                            'area_cm2': p['area_cm2'],
-                                            'grainline_cm': p.get('grainline_cm'),
-                                            'buffer_top': p.get('buffer_top', 0),
-                                            'buffer_bottom': p.get('buffer_bottom', 0),
-                                            'buffer_left': p.get('buffer_left', 0),
-                                            'buffer_right': p.get('buffer_right', 0)
-                                        })
+                                    # 좌표/그레인라인 등은 그대로 두고 수량만 다시 적용
+                                    pattern_data = [with_quantity(p, p['base_quantity'] * try_qty) for p in base_pattern_data]
 
                                     # 네스팅 실행 (버퍼로 패턴 둘레 확장)
                                     # 원단별 90도 회전 설정 가져오기 (저장된 값 사용)
@@ -4580,7 +5185,7 @@ if uploaded_file is not None:
                                     used_seed = original_result.get('used_seed', st.session_state.get('nest_seed', 42))
                                     used_order = st.session_state.get('pattern_order', 'default')
                                     if SPARROW_AVAILABLE:
-                                        test_result = run_sparrow_nesting(
+                                        test_result = run_sparrow_nesting_cached(
                                             pattern_data, width_cm,
                                             st.session_state.get('sparrow_time', 30),
                                             st.session_state.get('nest_rotation', True),
@@ -4669,6 +5274,9 @@ if uploaded_file is not None:
         st.info("💡 DXF 파일을 업로드하면 패턴 분석이 시작됩니다.")
 
 else:
+    # 업로드 파일을 지운 경우 세션 임시 파일 정리
+    discard_staged_upload()
+
     # 초기 화면 (파일 업로드 전)
     # 안내 문구
     st.markdown('''
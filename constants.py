@@ -4,6 +4,8 @@
 - 색상, 원단 매핑, 사이즈 순서 등 하드코딩된 값들을 중앙 관리
 """
 
+from functools import lru_cache
+
 # ==============================================================================
 # 원단 관련 상수
 # ==============================================================================
@@ -20,6 +22,10 @@ FABRIC_MAP = {
     '메쉬': '메쉬',
     '니트': '니트',
 }
+# 대소문자 무시 조회용 (키를 대문자로 정규화, 충돌 시 먼저 정의된 키 우선)
+FABRIC_MAP_UPPER = {}
+for _key, _mapped in FABRIC_MAP.items():
+    FABRIC_MAP_UPPER.setdefault(_key.upper(), _mapped)
 
 # 원단별 색상 (Tableau 팔레트 기반)
 FABRIC_COLORS = {
@@ -64,6 +70,7 @@ BASE_SIZE_PREFIXES = [
     'SAMPLE_SIZE:', 'SAMPLESIZE:', 'SAMPLE SIZE:',
     'MASTER_SIZE:', 'MASTERSIZE:', 'MASTER SIZE:'  # TIIP 형식
 ]
+BASE_SIZE_PREFIX_TUPLE = tuple(BASE_SIZE_PREFIXES)  # str.startswith() 일괄 비교용
 
 # 그레인라인 레이어 키워드
 GRAINLINE_KEYWORDS = ['GRAIN', 'GL', 'GRAINLINE', '결', '결방향', 'STRAIGHT']
@@ -71,6 +78,12 @@ GRAINLINE_LAYER_NUMBERS = ['7']  # 숫자 레이어도 그레인라인일 수 
 
 # 단위 변환 스케일
 UNIT_SCALE_INCH_TO_MM = 25.4
+UNIT_SCALE_INCH_TO_CM = 2.54
+YARDS_PER_METER = 1.09361  # 요척(YD) 환산
+
+# 곡선(SPLINE/ARC/CIRCLE/ELLIPSE) 평탄화 허용 오차 (DXF 단위)
+# 외곽선 면적(요척)에 직접 영향 - 값을 키우면 꼭짓점 수는 줄지만 면적 오차 증가
+FLATTEN_DISTANCE = 1.0
 
 # ==============================================================================
 # UI 관련 상수
@@ -89,14 +102,20 @@ SHEET_BACKGROUND_COLOR = "#e8f5e9"
 # 헬퍼 함수
 # ==============================================================================
 
+@lru_cache(maxsize=4096)
 def get_fabric_color(fabric_name: str) -> str:
     """원단 이름에 따른 색상 코드를 반환합니다."""
+    # 정확히 일치하는 원단명은 바로 반환 (부분 문자열 탐색 생략)
+    color = FABRIC_COLORS.get(fabric_name)
+    if color is not None:
+        return color
     for key, color in FABRIC_COLORS.items():
         if key in fabric_name:
             return color
     return DEFAULT_FABRIC_COLOR
 
 
+@lru_cache(maxsize=1024)
 def size_sort_key(size: str) -> tuple:
     """
     사이즈를 작은 것부터 큰 것 순으로 정렬하기 위한 키 함수
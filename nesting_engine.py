@@ -12,11 +12,31 @@ from shapely import affinity
 from shapely.strtree import STRtree
 import copy
 import math
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
 
 # pyclipper 스케일 (정수 변환용)
 CLIPPER_SCALE = 1000
 
 
+@dataclass(slots=True)
+class Placement:
+    """
+    Sparrow 배치 결과 1건 (시각화 좌표계: X=원단폭, Y=마카길이, 단위 cm)
+
+    좌표는 (N, 2) float64 배열로 보관하여 시각화에서 변환 없이 바로 사용합니다.
+    """
+    pattern_id: str
+    x: float
+    y: float
+    rotation: float
+    coords: np.ndarray                   # 버퍼 적용된 좌표
+    original_coords: np.ndarray          # 원본 좌표 (버퍼 전)
+    grainline: Optional[np.ndarray] = None  # 그레인라인 (2, 2) - 시작점, 끝점
+
+
 class NestingEngine:
     """전문가 마카 전략 기반 네스팅 엔진"""
 
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+check_symmetry 회귀 테스트
+
+app.py는 Streamlit 스크립트라 import 시 UI 전체가 실행되므로,
+check_symmetry 함수 정의만 AST로 꺼내 필요한 이름(np, affinity)과 함께 실행합니다.
+"""
+
+import ast
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+shapely = pytest.importorskip("shapely")
+from shapely import affinity  # noqa: E402
+from shapely.geometry import Polygon  # noqa: E402
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+
+def _load_check_symmetry():
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    func = next(
+        node for node in tree.body
+        if isinstance(node, ast.FunctionDef) and node.name == "check_symmetry"
+    )
+    namespace = {"np": np, "affinity": affinity}
+    exec(compile(ast.Module(body=[func], type_ignores=[]), str(APP_PATH), "exec"), namespace)
+    return namespace["check_symmetry"]
+
+
+check_symmetry = _load_check_symmetry()
+
+
+def test_side_notch_back_panel_is_left_right_symmetric():
+    """
+    60×50cm 뒤판 + 한쪽 옆선 가운데 작은 노치:
+    꼭짓점 기준으로는 정확히 상하대칭이지만, 2% 오차 내 좌우대칭이므로
+    원래 판정 순서대로 '좌우대칭'(BACK, 수량 1)이어야 함
+    """
+    poly = Polygon([
+        (0, 0), (600, 0), (600, 500),
+        (0, 500), (0, 260), (10, 250), (0, 240),  # 좌측 옆선 노치 (mm)
+    ])
+    assert check_symmetry(poly) == (True, "좌우대칭")
+
+
+def test_exact_left_right_symmetry():
+    poly = Polygon([(0, 0), (400, 0), (300, 300), (100, 300)])
+    assert check_symmetry(poly) == (True, "좌우대칭")
+
+
+def test_up_down_symmetry_checked_after_left_right():
+    # 좌우로는 2% 넘게 어긋나고 상하로는 정확히 대칭인 형상
+    poly = Polygon([(0, 0), (400, 100), (400, 200), (0, 300)])
+    assert check_symmetry(poly) == (True, "상하대칭")
+
+
+def test_asymmetric():
+    poly = Polygon([(0, 0), (500, 0), (400, 300), (0, 100)])
+    assert check_symmetry(poly) == (False, "비대칭")
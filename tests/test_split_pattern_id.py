@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+split_pattern_id 회귀 테스트
+
+app.py는 Streamlit 스크립트라 import 시 UI 전체가 실행되므로,
+split_pattern_id 함수 정의만 AST로 꺼내 실행합니다.
+"""
+
+import ast
+from pathlib import Path
+
+import pytest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+
+def _load_split_pattern_id():
+    tree = ast.parse(APP_PATH.read_text(encoding="utf-8"))
+    func = next(
+        node for node in tree.body
+        if isinstance(node, ast.FunctionDef) and node.name == "split_pattern_id"
+    )
+    namespace = {}
+    exec(compile(ast.Module(body=[func], type_ignores=[]), str(APP_PATH), "exec"), namespace)
+    return namespace["split_pattern_id"]
+
+
+split_pattern_id = _load_split_pattern_id()
+
+
+@pytest.mark.parametrize("pattern_id, expected", [
+    # 사이즈 있음
+    ("5:등판\nL_0", ("5", "L", "0")),
+    ("12:앞판_요크\nXL_3", ("12", "XL", "3")),
+    ("7:소매\nM", ("7", "M", "")),
+    # 사이즈 없음 - 수량 인덱스는 사이즈 줄이 없어도 분리
+    ("12_3", ("12", "", "3")),
+    ("12:앞판_2", ("12", "", "2")),
+    ("BACK_YOKE_0", ("BACK_YOKE", "", "0")),
+    ("9", ("9", "", "")),
+])
+def test_split_pattern_id(pattern_id, expected):
+    assert split_pattern_id(pattern_id) == expected
+
+
+def test_no_size_id_rebuilds_with_qty_suffix():
+    # update_nesting_pattern_names와 같은 방식으로 재조립: "BACK_YOKE_0" → "BACK_YOKE:_0"
+    df_idx_str, size_part, qty_idx = split_pattern_id("BACK_YOKE_0")
+    new_base = f"{df_idx_str}:\n{size_part}" if size_part else f"{df_idx_str}:"
+    assert f"{new_base}_{qty_idx}" == "BACK_YOKE:_0"